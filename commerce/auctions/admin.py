@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Bid, Category, Comment, Listing, User
+from .models import Bid, Category, Comment, Job, Listing, User
 
 # Register your models here.
 class WatcherInline(admin.TabularInline):
@@ -32,6 +32,16 @@ class ListingAdmin(admin.ModelAdmin):
         WatcherInline,
     ]
     exclude = ("watchers",)
+    readonly_fields = (
+        "image_variants",
+        "current_price",
+        "high_bid",
+        "bid_count",
+        "watcher_count",
+        "comment_count",
+        "proxy_bidder",
+        "proxy_max",
+    )
 
 
 admin.site.register(Listing, ListingAdmin)
@@ -56,3 +66,19 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Category, CategoryAdmin)
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        "name",
+        "status",
+        "attempts",
+        "run_at",
+        "created_at",
+        "started_at",
+        "finished_at",
+    )
+    list_filter = ("status", "name")
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,183 @@
+"""Read-only JSON API, version 1
+
+Responses are serialized straight from values() projections.  Every endpoint
+sends an ETag, computed before the response body is built, so clients polling
+with If-None-Match get a 304 without any serialization.
+"""
+
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+
+from .caching import category_registry, listings_version
+from .models import Listing
+from .pagination import paginate
+
+LISTING_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "image",
+    "price",
+    "current_price",
+    "bid_count",
+    "watcher_count",
+    "comment_count",
+    "active",
+    "created_at",
+    "updated_at",
+)
+
+
+def _category_id(request):
+    # The optional ?category= filter, or None; raises ValueError if unknown
+    category_id = request.GET.get("category")
+
+    if category_id is None:
+        return None
+
+    category = category_registry.get(int(category_id))
+
+    if category is None:
+        raise ValueError(category_id)
+
+    return category.pk
+
+
+def _serialize(row):
+    if "image" in row:
+        row["image"] = default_storage.url(row["image"]) if row["image"] else None
+
+    row["category"] = {"id": row.pop("category_id"), "name": row.pop("category_name")}
+
+    return row
+
+
+def listings_etag(request):
+    """The listings' page cache generation, with the category names they show
+
+    Like the page cache, it relies on the cache being shared by every worker
+    (see CACHES in the settings) for a purge in one to reach the others.
+    """
+    try:
+        category_id = _category_id(request)
+    except ValueError:
+        return None
+
+    return f"{listings_version(category_id)}.{category_registry.version}"
+
+
+def listing_etag(request, listing_id):
+    # Every change to a listing's JSON moves one of these columns, or the
+    # category version when its category is renamed
+    row = (
+        Listing.objects.filter(pk=listing_id)
+        .values_list(
+            "updated_at",
+            "current_price",
+            "bid_count",
+            "comment_count",
+            "watcher_count",
+            "category_id",
+            "high_bid_id",
+        )
+        .first()
+    )
+
+    if row is None:
+        return None
+
+    return "{}.{}.{}.{}.{}.{}.{}.{}".format(
+        row[0].timestamp(), *row[1:], category_registry.version
+    )
+
+
+def categories_etag(request):
+    return category_registry.version
+
+
+@require_GET
+@cache_control(no_cache=True)
+@condition(etag_func=listings_etag)
+def listings(request):
+    # Active listings, newest first, optionally limited to one category
+    try:
+        category_id = _category_id(request)
+    except ValueError:
+        return JsonResponse({"error": "Unknown category."}, status=400)
+
+    rows = Listing.objects.filter(active=True)
+
+    if category_id is not None:
+        rows = rows.filter(category_id=category_id)
+
+    page = paginate(
+        rows.values(
+            *LISTING_FIELDS,
+            "category_id",
+            category_name=F("category__name"),
+        ),
+        request.GET.get("cursor"),
+    )
+
+    return JsonResponse(
+        {
+            "results": [_serialize(row) for row in page],
+            "next_cursor": page.next_cursor,
+            "previous_cursor": page.previous_cursor,
+        }
+    )
+
+
+@require_GET
+@cache_control(no_cache=True)
+@condition(etag_func=listing_etag)
+def listing(request, listing_id):
+    row = (
+        Listing.objects.filter(pk=listing_id)
+        .values(
+            *LISTING_FIELDS,
+            "completed",
+            "category_id",
+            seller=F("user__username"),
+            category_name=F("category__name"),
+            high_bid_price=F("high_bid__price"),
+            high_bid_user=F("high_bid__user__username"),
+            high_bid_created_at=F("high_bid__created_at"),
+        )
+        .first()
+    )
+
+    if row is None:
+        return JsonResponse({"error": "Listing not found."}, status=404)
+
+    high_bid = {
+        "price": row.pop("high_bid_price"),
+        "user": row.pop("high_bid_user"),
+        "created_at": row.pop("high_bid_created_at"),
+    }
+    row["high_bid"] = high_bid if high_bid["price"] is not None else None
+
+    return JsonResponse(_serialize(row))
+
+
+@require_GET
+@cache_control(no_cache=True)
+@condition(etag_func=categories_etag)
+def categories(request):
+    return JsonResponse(
+        {
+            "results": [
+                {
+                    "id": category.pk,
+                    "name": category.name,
+                    "description": category.description,
+                    "icon": category.icon,
+                    "hex_color_code": category.hex_color_code,
+                }
+                for category in category_registry.all()
+            ]
+        }
+    )
@@ -0,0 +1,182 @@
+"""Async versions of the read-only views, for deployments served over ASGI
+
+Under commerce/asgi.py every sync view is run through a thread adapter, one
+request at a time per thread.  These views keep the request on the event loop
+and use the async ORM and cache APIs instead.  They are routed in place of the
+matching views in views.py when settings.AUCTIONS_ASYNC_VIEWS is enabled.
+
+Templates read the user, categories and cards synchronously, so each view
+resolves them before rendering and the templates never touch the database.
+"""
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseRedirect
+from django.shortcuts import render
+from django.urls import reverse
+
+from . import bidding, watchlist
+from .caching import (
+    arender_cards,
+    cache_anonymous_page,
+    category_registry,
+    category_scope,
+    conditional_listing_page,
+    index_scope,
+)
+from .models import Listing
+from .pagination import COMMENT_PAGE_SIZE, apaginate
+from .views import active_listings
+
+DEFAULT_IMAGE = settings.MEDIA_URL + "/images/default.jpg"
+
+
+async def _context(request, **context):
+    """Template context with everything the layout would otherwise load lazily"""
+    request.user = await request.auser()
+    context["categories"] = await category_registry.aall()
+    context["default_image"] = DEFAULT_IMAGE
+
+    if "listings" in context:
+        context["rendered_cards"] = await arender_cards(
+            context["listings"], DEFAULT_IMAGE
+        )
+
+    return context
+
+
+@cache_anonymous_page(index_scope)
+async def index(request):
+    listings = await apaginate(active_listings(), request.GET.get("cursor"))
+
+    return render(
+        request,
+        "auctions/index.html",
+        await _context(
+            request,
+            title="Current Listings",
+            listings=listings,
+            page=listings,
+            fragment_url=reverse("listing_cards"),
+        ),
+    )
+
+
+@cache_anonymous_page(index_scope)
+async def listing_cards(request):
+    # Render a page of the current listings as a bare card fragment
+    listings = await apaginate(active_listings(), request.GET.get("cursor"))
+
+    return render(
+        request,
+        "auctions/partial_card_items.html",
+        await _context(
+            request,
+            listings=listings,
+            page=listings,
+            fragment_url=reverse("listing_cards"),
+        ),
+    )
+
+
+async def categories(request):
+    return render(
+        request,
+        "auctions/categories.html",
+        await _context(request, current_category=None),
+    )
+
+
+@cache_anonymous_page(category_scope)
+async def view_category(request, category_id):
+    # Retrieve correct category name
+    category = await category_registry.aget(category_id)
+
+    if not category:
+        messages.error(
+            request,
+            "<strong>Error:</strong>  The provided category does not exist!",
+        )
+
+        return HttpResponseRedirect(reverse("categories"))
+
+    listings = await apaginate(active_listings(category_id), request.GET.get("cursor"))
+
+    return render(
+        request,
+        "auctions/categories.html",
+        await _context(
+            request,
+            title=category,
+            listings=listings,
+            page=listings,
+            fragment_url=reverse("category_cards", kwargs={"category_id": category_id}),
+            current_category=category_id,
+        ),
+    )
+
+
+@cache_anonymous_page(category_scope)
+async def category_cards(request, category_id):
+    # Render a page of a category's listings as a bare card fragment
+    listings = await apaginate(active_listings(category_id), request.GET.get("cursor"))
+
+    return render(
+        request,
+        "auctions/partial_card_items.html",
+        await _context(
+            request,
+            listings=listings,
+            page=listings,
+            fragment_url=reverse("category_cards", kwargs={"category_id": category_id}),
+        ),
+    )
+
+
+@conditional_listing_page
+async def view_listing(request, listing_id):
+    user = await request.auser()
+
+    try:
+        listing = await Listing.objects.select_related("user", "high_bid__user").aget(
+            pk=listing_id
+        )
+        watching = await listing.watchers.filter(id=user.id).afirst()
+        comments = await apaginate(
+            listing.comments.select_related("user"), per_page=COMMENT_PAGE_SIZE
+        )
+
+    except Listing.DoesNotExist:
+        messages.error(
+            request,
+            "<strong>Error:</strong>  The provided auction listing does not exist!",
+        )
+        return HttpResponseRedirect(reverse("index"))
+
+    return render(
+        request,
+        "auctions/view_listing.html",
+        await _context(
+            request,
+            listing=listing,
+            high_bid=listing.high_bid,
+            watching=watching,
+            comments=comments,
+            max_bid=bidding.proxy_max_for(listing, user),
+            live_updates=settings.AUCTIONS_ASYNC_VIEWS,
+        ),
+    )
+
+
+@login_required  # type: ignore
+async def view_watchlist(request):
+    # Listings watched by the current user, most recently watched first
+    user = await request.auser()
+    watched_listings = [listing async for listing in watchlist.watched_listings(user)]
+
+    return render(
+        request,
+        "auctions/view_cards.html",
+        await _context(request, title="Watched Listings", listings=watched_listings),
+    )
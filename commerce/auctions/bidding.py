@@ -0,0 +1,210 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import events
+from .models import Bid, Listing
+
+# Outcomes of a bid attempt
+ACCEPTED = "accepted"
+AUCTION_ENDED = "auction_ended"
+INVALID_AMOUNT = "invalid_amount"
+LISTING_CLOSED = "listing_closed"
+MAX_RAISED = "max_raised"
+OUTBID = "outbid"
+OWN_LISTING = "own_listing"
+TOO_LOW = "too_low"
+
+# Bids share the validation limits of Bid.price
+MIN_BID = 1
+MAX_BID = 100000
+
+# Amount a proxy bid goes over the bid it answers
+INCREMENT = 1
+
+
+@dataclass(frozen=True)
+class BidResult:
+    """Outcome of a call to place_bid()"""
+
+    reason: str
+    current_price: Optional[int] = None
+    bid: Optional[Bid] = None
+
+    @property
+    def accepted(self):
+        return self.reason == ACCEPTED
+
+    @property
+    def minimum_bid(self):
+        """Smallest amount that would have beaten the current price"""
+        if self.current_price is None:
+            return None
+
+        return self.current_price + 1
+
+
+def resolve(current_price, leader_id, leader_max, user_id, amount):
+    """Settle a new maximum bid against the leading one
+
+    The higher maximum leads, bidding INCREMENT over the lower one or its own
+    maximum if that is less.  Equal maximums go to the earlier bid.  Each side
+    places at most one visible bid: the losing side bids its maximum, unless
+    that is the price it already holds, and the leading side answers it.
+
+    Args:
+        current_price (int): Listing's visible price
+        leader_id (int): Leading bidder, or None if there are no bids
+        leader_max (int): Leading bidder's maximum
+        user_id (int): New bidder, not the leading bidder
+        amount (int): New bidder's maximum, above current_price
+
+    Returns:
+        tuple: Visible bids as (user_id, price) in the order placed, then the
+            leading bidder and their maximum
+    """
+    if leader_id is None:
+        return [(user_id, current_price + INCREMENT)], user_id, amount
+
+    if amount > leader_max:
+        bids = [(leader_id, leader_max)] if leader_max > current_price else []
+        bids.append((user_id, min(amount, leader_max + INCREMENT)))
+
+        return bids, user_id, amount
+
+    price = min(leader_max, amount + INCREMENT)
+    bids = [(user_id, amount)] if amount < price else []
+    bids.append((leader_id, price))
+
+    return bids, leader_id, leader_max
+
+
+def proxy_max_for(listing, user):
+    """A user's maximum bid on a listing, if they are its leading bidder"""
+    if user.is_authenticated and listing.proxy_bidder_id == user.pk:
+        return listing.proxy_max
+
+    return None
+
+
+def place_bid(listing_id, user, amount):
+    """Place a proxy bid: the most a user will pay, bid for them as needed
+
+    The listing holds the leading bidder's hidden maximum, and a new bid is
+    resolved against that one maximum with resolve(), so the cost per bid does
+    not grow with the bidding history.  Only the resulting visible bids are
+    written.  A leading bidder bidding again raises their maximum.
+
+    The resolution is computed from one read of the listing and applied with a
+    conditional UPDATE which only matches while the listing is still in that
+    state: active, before its end time, not owned by the bidder and with the
+    same price and leader.  The UPDATE takes the row's write lock, so a bid
+    which raced ahead makes the claim fail and the bid is resolved again
+    against the committed state instead of a stale read.
+
+    Args:
+        listing_id (int): Listing being bid on
+        user (User): Bidder
+        amount (int): Bidder's maximum in whole dollars
+
+    Returns:
+        BidResult: The outcome, with the listing's visible price and, when
+            bids were placed, the new high bid
+    """
+    if not MIN_BID <= amount <= MAX_BID:
+        return BidResult(INVALID_AMOUNT)
+
+    now = timezone.now()
+    listings = (
+        Listing.objects.filter(pk=listing_id, active=True)
+        .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+        .exclude(user=user)
+    )
+
+    while True:
+        with transaction.atomic():
+            state = listings.values(
+                "current_price",
+                "proxy_bidder_id",
+                "proxy_max",
+                "proxy_bidder__username",
+            ).first()
+
+            if state is None:
+                break
+
+            current_price = state["current_price"]
+            claim = listings.filter(
+                current_price=current_price,
+                proxy_bidder_id=state["proxy_bidder_id"],
+                proxy_max=state["proxy_max"],
+            )
+
+            if state["proxy_bidder_id"] == user.pk:
+                if amount <= state["proxy_max"]:
+                    return BidResult(TOO_LOW, current_price=state["proxy_max"])
+
+                if claim.update(proxy_max=amount, updated_at=now):
+                    return BidResult(MAX_RAISED, current_price=current_price)
+
+                continue
+
+            if amount <= current_price:
+                return BidResult(TOO_LOW, current_price=current_price)
+
+            bids, leader_id, leader_max = resolve(
+                current_price,
+                state["proxy_bidder_id"],
+                state["proxy_max"],
+                user.pk,
+                amount,
+            )
+            price = bids[-1][1]
+
+            if not claim.update(
+                current_price=price,
+                proxy_bidder_id=leader_id,
+                proxy_max=leader_max,
+                bid_count=F("bid_count") + len(bids),
+            ):
+                continue
+
+            bids = Bid.objects.bulk_create(
+                Bid(listing_id=listing_id, user_id=bidder_id, price=bid_price)
+                for bidder_id, bid_price in bids
+            )
+            Listing.objects.filter(pk=listing_id).update(high_bid=bids[-1])
+
+            leader = (
+                user.username
+                if leader_id == user.pk
+                else state["proxy_bidder__username"]
+            )
+            events.publish(
+                events.listing_channel(listing_id),
+                "bid",
+                {"price": price, "bidder": leader, "minimum_bid": price + 1},
+            )
+
+            if leader_id == user.pk:
+                return BidResult(ACCEPTED, current_price=price, bid=bids[-1])
+
+            return BidResult(OUTBID, current_price=price, bid=bids[-1])
+
+    # The listing can't be bid on, work out why from the committed state
+    listing = (
+        Listing.objects.filter(pk=listing_id)
+        .values("active", "ends_at", "user_id", "current_price")
+        .first()
+    )
+
+    if not listing or not listing["active"]:
+        return BidResult(LISTING_CLOSED)
+
+    if listing["ends_at"] and listing["ends_at"] <= now:
+        return BidResult(AUCTION_ENDED)
+
+    return BidResult(OWN_LISTING, current_price=listing["current_price"])
@@ -0,0 +1,498 @@
+import hashlib
+import threading
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+from django.utils.safestring import mark_safe
+
+from .models import Category, Listing
+from .queries import listing_validator
+
+CATEGORY_VERSION_KEY = "auctions:categories:version"
+CATEGORY_LIST_KEY = "auctions:categories:{version}"
+
+CARD_KEY = "auctions:card:{pk}:{version}"
+CARD_TIMEOUT = 60 * 60 * 24
+
+PAGE_GENERATION_KEY = "auctions:page:{scope}:generation"
+PAGE_KEY = "auctions:page:{scope}:{generation}:{path}"
+PAGE_STATS_KEY = "auctions:page:stats:{outcome}"
+PAGE_TIMEOUT = 60 * 10
+
+
+class CategoryRegistry:
+    """Process-local copy of the categories, shared between workers by version
+
+    Categories only change through the admin, so each worker keeps them in
+    memory and compares its copy against a version token held in Django's cache.
+    Saving or deleting a category replaces the token, after which every worker
+    reloads on its next request (from the shared cache when another worker has
+    already done so, otherwise from the database).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._categories = ()
+        self._by_id = {}
+
+    def _current_version(self):
+        version = cache.get(CATEGORY_VERSION_KEY)
+
+        if version is None:
+            cache.add(CATEGORY_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = cache.get(CATEGORY_VERSION_KEY)
+
+        return version
+
+    def _load(self, version):
+        key = CATEGORY_LIST_KEY.format(version=version)
+        categories = cache.get(key)
+
+        if categories is None:
+            categories = tuple(Category.objects.order_by("name"))
+            cache.set(key, categories, timeout=None)
+
+        return categories
+
+    @property
+    def version(self):
+        """Token identifying the current set of categories"""
+        self.all()
+
+        return self._version
+
+    def all(self):
+        """All categories ordered by name"""
+        version = self._current_version()
+
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    categories = self._load(version)
+                    self._by_id = {category.pk: category for category in categories}
+                    self._categories = categories
+                    self._version = version
+
+        return self._categories
+
+    def get(self, pk):
+        """Category with the given primary key, or None if it does not exist"""
+        self.all()
+
+        return self._by_id.get(pk)
+
+    async def aall(self):
+        """Async version of all(), which only leaves the event loop to reload"""
+        version = await cache.aget(CATEGORY_VERSION_KEY)
+
+        if version is None or version != self._version:
+            return await sync_to_async(self.all)()
+
+        return self._categories
+
+    async def aget(self, pk):
+        """Async version of get()"""
+        await self.aall()
+
+        return self._by_id.get(pk)
+
+    async def aversion(self):
+        """Async version of the version property"""
+        await self.aall()
+
+        return self._version
+
+    def invalidate(self):
+        """Force every worker to reload the categories on its next request"""
+        cache.set(CATEGORY_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+category_registry = CategoryRegistry()
+
+
+def card_key(listing, category_version):
+    """Cache key for a listing's card, which changes whenever the card would
+
+    The version combines the listing's last save with the activity counters that
+    the write views bump, plus the category version since the card shows the
+    category's name and colour.
+    """
+    version = "{}.{}.{}.{}.{}".format(
+        listing.updated_at.timestamp(),
+        listing.bid_count,
+        listing.comment_count,
+        listing.watcher_count,
+        category_version,
+    )
+
+    return CARD_KEY.format(pk=listing.pk, version=version)
+
+
+def _render_missing(cards, html, default_image):
+    return {
+        key: render_to_string(
+            "auctions/partial_card.html",
+            {"listing": listing, "default_image": default_image},
+        )
+        for key, listing in cards.items()
+        if key not in html
+    }
+
+
+def render_cards(listings, default_image):
+    """Render listing cards, reusing the cached HTML of any unchanged cards
+
+    All cards are fetched from the cache with a single get_many() and only the
+    misses are rendered, then stored with a single set_many().
+
+    Args:
+        listings (iterable): Listings selected with queries.card_listings()
+        default_image (str): Image URL for listings without an image
+    """
+    category_version = category_registry.version
+    cards = {card_key(listing, category_version): listing for listing in listings}
+    html = cache.get_many(cards.keys())
+    missing = _render_missing(cards, html, default_image)
+
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+        html.update(missing)
+
+    return mark_safe("".join(html[key] for key in cards))
+
+
+async def arender_cards(listings, default_image):
+    """Async version of render_cards()"""
+    category_version = await category_registry.aversion()
+    cards = {card_key(listing, category_version): listing for listing in listings}
+    html = await cache.aget_many(cards.keys())
+    missing = _render_missing(cards, html, default_image)
+
+    if missing:
+        await cache.aset_many(missing, CARD_TIMEOUT)
+        html.update(missing)
+
+    return mark_safe("".join(html[key] for key in cards))
+
+
+def index_scope(request, *args, **kwargs):
+    """Page cache scope of the current listings pages"""
+    return "index"
+
+
+def category_scope(request, category_id, *args, **kwargs):
+    """Page cache scope of a category's listings pages"""
+    return f"category:{category_id}"
+
+
+def has_pending_messages(request):
+    """Whether the request has flash messages waiting to be displayed"""
+    storage = getattr(request, "_messages", None)
+
+    return storage is not None and len(storage) > 0
+
+
+def is_anonymous_request(request):
+    """Whether the response to a request is the same for every logged-out visitor"""
+    return (
+        request.method in ("GET", "HEAD")
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and not has_pending_messages(request)
+    )
+
+
+def _page_generation(scope):
+    key = PAGE_GENERATION_KEY.format(scope=scope)
+    generation = cache.get(key)
+
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        generation = cache.get(key)
+
+    return generation
+
+
+async def _apage_generation(scope):
+    key = PAGE_GENERATION_KEY.format(scope=scope)
+    generation = await cache.aget(key)
+
+    if generation is None:
+        await cache.aadd(key, uuid.uuid4().hex, timeout=None)
+        generation = await cache.aget(key)
+
+    return generation
+
+
+def _record(outcome):
+    key = PAGE_STATS_KEY.format(outcome=outcome)
+
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+async def _arecord(outcome):
+    key = PAGE_STATS_KEY.format(outcome=outcome)
+
+    if not await cache.aadd(key, 1, timeout=None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            pass
+
+
+def _page_key(request, scope, generation):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+    return PAGE_KEY.format(scope=scope, generation=generation, path=path)
+
+
+def _cached_response(cached):
+    content, content_type = cached
+    response = HttpResponse(content, content_type=content_type)
+    response["X-Page-Cache"] = "HIT"
+
+    return response
+
+
+def _is_cacheable(request, response):
+    # Never store responses which set cookies or embed a CSRF token
+    return (
+        response.status_code == 200
+        and not response.cookies
+        and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+    )
+
+
+def page_cache_stats():
+    """Hit and miss totals of the anonymous page cache"""
+    stats = cache.get_many(
+        [PAGE_STATS_KEY.format(outcome=outcome) for outcome in ("hits", "misses")]
+    )
+
+    return {
+        outcome: stats.get(PAGE_STATS_KEY.format(outcome=outcome), 0)
+        for outcome in ("hits", "misses")
+    }
+
+
+def cache_anonymous_page(scope):
+    """Serve a view's full response from the cache to logged-out visitors
+
+    Requests carrying a session cookie or pending messages always run the view.
+    Cached pages are grouped by scope so that a change to one listing only
+    purges the pages that can show it (see purge_category_pages()).  Both sync
+    and async views can be decorated.
+
+    Args:
+        scope (callable): Called with the view's arguments to name its scope
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not is_anonymous_request(request):
+                    return await view(request, *args, **kwargs)
+
+                name = scope(request, *args, **kwargs)
+                key = _page_key(request, name, await _apage_generation(name))
+                cached = await cache.aget(key)
+
+                if cached is not None:
+                    await _arecord("hits")
+                    return _cached_response(cached)
+
+                await _arecord("misses")
+                response = await view(request, *args, **kwargs)
+
+                if _is_cacheable(request, response):
+                    await cache.aset(
+                        key, (response.content, response["Content-Type"]), PAGE_TIMEOUT
+                    )
+
+                response["X-Page-Cache"] = "MISS"
+
+                return response
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_anonymous_request(request):
+                return view(request, *args, **kwargs)
+
+            name = scope(request, *args, **kwargs)
+            key = _page_key(request, name, _page_generation(name))
+            cached = cache.get(key)
+
+            if cached is not None:
+                _record("hits")
+                return _cached_response(cached)
+
+            _record("misses")
+            response = view(request, *args, **kwargs)
+
+            if _is_cacheable(request, response):
+                cache.set(
+                    key, (response.content, response["Content-Type"]), PAGE_TIMEOUT
+                )
+
+            response["X-Page-Cache"] = "MISS"
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def listings_version(category_id=None):
+    """Token which changes whenever the active listings, or a category's, change
+
+    This is the page cache generation of the matching scope, so it is replaced
+    by the same purge_category_pages() calls that purge the cached pages.
+    """
+    return _page_generation(
+        "index" if category_id is None else f"category:{category_id}"
+    )
+
+
+def purge_category_pages(*category_ids):
+    """Purge the cached index pages and the pages of the given categories"""
+    scopes = ["index"] + [f"category:{category_id}" for category_id in category_ids]
+
+    cache.set_many(
+        {PAGE_GENERATION_KEY.format(scope=scope): uuid.uuid4().hex for scope in scopes},
+        timeout=None,
+    )
+
+
+def purge_listing_pages(*listing_ids):
+    """Purge the cached pages which can show any of the given listings"""
+    category_ids = (
+        Listing.objects.filter(pk__in=listing_ids)
+        .values_list("category_id", flat=True)
+        .distinct()
+    )
+
+    purge_category_pages(*category_ids)
+
+
+def listing_validators(request, row):
+    """ETag and Last-Modified of a listing page for the requesting user
+
+    The ETag also covers the user and their time zone cookie, which both change
+    what the page renders.  Last-Modified is only given to logged-out visitors,
+    because a user's watch state has no timestamp to compare.  Neither is given
+    while flash messages are waiting, so a page showing them is never reused.
+
+    Args:
+        request (HttpRequest): Request for the page, with the user resolved
+        row (dict): The listing's queries.listing_validator() row, or None
+
+    Returns:
+        tuple: The ETag and Last-Modified datetime, each of which may be None
+    """
+    if row is None or has_pending_messages(request):
+        return None, None
+
+    parts = (
+        row["updated_at"].timestamp(),
+        row["high_bid_id"],
+        row["comment_id"],
+        row["watching"],
+        request.user.pk,
+        request.COOKIES.get("time_zone", ""),
+    )
+    etag = quote_etag(hashlib.md5("|".join(map(str, parts)).encode()).hexdigest())
+
+    if request.user.is_authenticated:
+        return etag, None
+
+    last_modified = max(
+        changed_at
+        for changed_at in (row["updated_at"], row["high_bid_at"], row["comment_at"])
+        if changed_at is not None
+    )
+
+    return etag, last_modified
+
+
+def _not_modified(request, etag, last_modified):
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def _add_validators(response, etag, last_modified):
+    if etag:
+        response.headers.setdefault("ETag", etag)
+
+    if last_modified:
+        response.headers.setdefault(
+            "Last-Modified", http_date(last_modified.timestamp())
+        )
+
+    # Browsers must revalidate every time, and shared caches must not keep a
+    # page that differs per user
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Cookie",))
+
+    return response
+
+
+def conditional_listing_page(view):
+    """Answer conditional GETs of a listing page without running the view
+
+    The validators come from one queries.listing_validator() query.  When the
+    client's copy is current the view is skipped and a 304 Not Modified is
+    returned before any other query or template work.
+
+    Works on sync and async views taking a listing_id argument.
+    """
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, listing_id, *args, **kwargs):
+            request.user = await request.auser()
+            row = await listing_validator(listing_id, request.user).afirst()
+            etag, last_modified = listing_validators(request, row)
+            response = _not_modified(request, etag, last_modified)
+
+            if response is None:
+                response = await view(request, listing_id, *args, **kwargs)
+
+            return _add_validators(response, etag, last_modified)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, listing_id, *args, **kwargs):
+        row = listing_validator(listing_id, request.user).first()
+        etag, last_modified = listing_validators(request, row)
+        response = _not_modified(request, etag, last_modified)
+
+        if response is None:
+            response = view(request, listing_id, *args, **kwargs)
+
+        return _add_validators(response, etag, last_modified)
+
+    return wrapper
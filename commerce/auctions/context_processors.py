@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .caching import category_registry
+
+
+def categories(request):
+    """Expose the cached categories to every template as `categories`"""
+    return {"categories": SimpleLazyObject(category_registry.all)}
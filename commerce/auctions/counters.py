@@ -0,0 +1,49 @@
+from django.db.models import Case, Count, F, OuterRef, Subquery, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Bid, Comment, Listing
+
+
+def _count(queryset):
+    """Correlated COUNT(*) subquery for rows related to the outer listing"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(listing=OuterRef("pk"))
+            .order_by()
+            .values("listing")
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def rebuild_listing_counters(listings=None):
+    """Recalculate the denormalized Listing counters from their source tables
+
+    Args:
+        listings (QuerySet): Listings to rebuild (default: all listings)
+
+    Returns:
+        int: Number of listings updated
+    """
+    if listings is None:
+        listings = Listing.objects.all()
+
+    high_bids = Bid.objects.filter(listing=OuterRef("pk")).order_by("-price", "-pk")
+    high_bidder = Subquery(high_bids.values("user")[:1])
+    high_price = Subquery(high_bids.values("price")[:1])
+
+    return listings.update(
+        bid_count=_count(Bid.objects.all()),
+        comment_count=_count(Comment.objects.all()),
+        watcher_count=_count(Listing.watchers.through.objects.all()),
+        high_bid=Subquery(high_bids.values("pk")[:1]),
+        current_price=Coalesce(high_price, F("price")),
+        # The high bidder keeps their maximum if they still hold it
+        proxy_bidder=high_bidder,
+        proxy_max=Case(
+            When(proxy_bidder=high_bidder, then=Greatest("proxy_max", high_price)),
+            default=high_price,
+        ),
+    )
@@ -0,0 +1,229 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# Events buffered per subscriber before the oldest are dropped
+QUEUE_SIZE = 100
+
+# Idle streams send a comment this often so proxies keep the connection open
+KEEPALIVE_SECONDS = 15
+
+# How long browsers wait before reconnecting a dropped stream
+RETRY_MS = 3000
+
+
+def listing_channel(listing_id):
+    return f"listing:{listing_id}"
+
+
+class EventHub:
+    """Fans events out to the streaming responses subscribed in this process
+
+    Subscribers are asyncio queues owned by the event loop serving each
+    connection.  Events may be dispatched from any thread, such as a sync view
+    running in a worker thread, and are handed to each loop thread-safely.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def channels(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        """Async context manager yielding a queue of the channel's events"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(channel, set())
+                subscribers.discard(subscriber)
+
+                if not subscribers:
+                    self._subscribers.pop(channel, None)
+
+    def dispatch(self, channel, event):
+        """Deliver an event to every local subscriber of a channel"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_deliver, queue, event)
+            except RuntimeError:
+                # The subscriber's loop has closed, it will unsubscribe itself
+                pass
+
+
+def _deliver(queue, event):
+    # Slow consumers lose their oldest events rather than blocking publishers
+    if queue.full():
+        queue.get_nowait()
+
+    queue.put_nowait(event)
+
+
+class InProcessBackend:
+    """Delivers events to subscribers in the publishing process only
+
+    Suitable for a single worker process, such as the development server.
+    """
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, channel, event):
+        self.hub.dispatch(channel, event)
+
+
+class CacheBackend:
+    """Shares events between worker processes through Django's cache
+
+    Published events are appended to a per-channel sequence in the cache and
+    delivered locally straight away.  Each process polls the sequences of the
+    channels it has subscribers for and dispatches events published elsewhere,
+    so the cost is one cache read per subscribed channel per poll interval no
+    matter how many connections are open.  Requires a shared cache backend.
+    """
+
+    SEQUENCE_KEY = "auctions:events:{channel}:sequence"
+    EVENT_KEY = "auctions:events:{channel}:{sequence}"
+    EVENT_TIMEOUT = 60
+    POLL_INTERVAL = 0.5
+    # How long a poll waits for an event whose sequence number has been taken
+    # before skipping it, as its publisher may have failed before storing it
+    GAP_TIMEOUT = 5
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.origin = uuid.uuid4().hex
+        self._positions = {}
+        # Sequence number of the first event each channel is waiting for, and
+        # since when
+        self._gaps = {}
+        self._poller = None
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        key = self.SEQUENCE_KEY.format(channel=channel)
+        cache.add(key, 0, timeout=None)
+        sequence = cache.incr(key)
+        cache.set(
+            self.EVENT_KEY.format(channel=channel, sequence=sequence),
+            {"origin": self.origin, "event": event},
+            self.EVENT_TIMEOUT,
+        )
+        self.hub.dispatch(channel, event)
+
+    def start(self):
+        """Start polling for remote events in a daemon thread, once per process"""
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, daemon=True)
+                self._poller.start()
+
+    def _poll(self):
+        while True:
+            self.poll_once()
+            time.sleep(self.POLL_INTERVAL)
+
+    def _waiting(self, channel, sequence):
+        """Whether to wait for a missing event rather than skip it
+
+        A publisher takes its sequence number before storing its event, so an
+        event may be missing only because it is still being stored.
+        """
+        gap = self._gaps.get(channel)
+
+        if gap is None or gap[0] != sequence:
+            self._gaps[channel] = (sequence, time.monotonic())
+            return True
+
+        return time.monotonic() - gap[1] < self.GAP_TIMEOUT
+
+    def poll_once(self):
+        """Dispatch events published by other processes since the last poll
+
+        Events are dispatched in order, stopping at one which is missing until
+        it arrives or GAP_TIMEOUT passes.
+        """
+        channels = self.hub.channels()
+        sequences = cache.get_many(
+            [self.SEQUENCE_KEY.format(channel=channel) for channel in channels]
+        )
+
+        for channel in channels:
+            latest = sequences.get(self.SEQUENCE_KEY.format(channel=channel), 0)
+            seen = self._positions.setdefault(channel, latest)
+
+            if latest <= seen:
+                continue
+
+            keys = {
+                sequence: self.EVENT_KEY.format(channel=channel, sequence=sequence)
+                for sequence in range(seen + 1, latest + 1)
+            }
+            events = cache.get_many(keys.values())
+
+            for sequence, key in keys.items():
+                message = events.get(key)
+
+                if message is None and self._waiting(channel, sequence):
+                    break
+
+                self._positions[channel] = sequence
+
+                if message and message["origin"] != self.origin:
+                    self.hub.dispatch(channel, message["event"])
+
+        for channel in set(self._positions) - set(channels):
+            del self._positions[channel]
+            self._gaps.pop(channel, None)
+
+
+hub = EventHub()
+_backend = None
+
+
+def get_backend():
+    """The backend named by settings.AUCTIONS_EVENTS_BACKEND, created on first use"""
+    global _backend
+
+    if _backend is None:
+        path = getattr(
+            settings, "AUCTIONS_EVENTS_BACKEND", "auctions.events.InProcessBackend"
+        )
+        _backend = import_string(path)(hub)
+
+    return _backend
+
+
+def publish(channel, event_type, data):
+    """Publish an event once the current transaction, if any, commits"""
+    event = {"type": event_type, "data": data}
+
+    transaction.on_commit(lambda: get_backend().publish(channel, event))
+
+
+def format_event(event):
+    """Serialize an event in the text/event-stream format"""
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
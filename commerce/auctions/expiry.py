@@ -0,0 +1,101 @@
+import time
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from . import events, metrics
+from .caching import purge_category_pages
+from .models import Listing
+
+# Listings closed per transaction
+BATCH_SIZE = 1000
+
+# Whether a closing listing sold: it has a high bid above the opening price
+SOLD = Q(high_bid__isnull=False, current_price__gt=F("price"))
+
+
+def close_batch(now=None, batch_size=BATCH_SIZE):
+    """Close one batch of the active listings whose auctions have ended
+
+    Due listings are found through the partial index on the ends_at of active
+    listings, oldest first, and closed with a single UPDATE which marks them
+    completed if they sold.  place_bid() refuses bids once ends_at has passed,
+    but an owner may still cancel or accept a listing before the UPDATE, so
+    the listings it closed are read back by their new updated_at.  The cached
+    pages of their categories are purged and a close event is published for
+    each of them.
+
+    Args:
+        now (datetime): Close auctions which ended by this time (default: now)
+        batch_size (int): Most listings to close (default: BATCH_SIZE)
+
+    Returns:
+        int: Number of listings closed
+    """
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        due = list(
+            Listing.objects.filter(active=True, ends_at__lte=now)
+            .order_by("ends_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+
+        if not due:
+            return 0
+
+        Listing.objects.filter(pk__in=due, active=True).update(
+            active=False,
+            completed=Case(When(SOLD, then=True), default=False),
+            updated_at=now,
+        )
+        closed = list(
+            Listing.objects.filter(pk__in=due, active=False, updated_at=now).values(
+                "id", "category_id", "completed"
+            )
+        )
+
+        for listing in closed:
+            events.publish(
+                events.listing_channel(listing["id"]),
+                "close",
+                {"completed": listing["completed"]},
+            )
+
+    sold_count = sum(listing["completed"] for listing in closed)
+
+    if closed:
+        purge_category_pages(*{listing["category_id"] for listing in closed})
+
+    metrics.LISTINGS_CLOSED.inc(sold_count, reason="sold")
+    metrics.LISTINGS_CLOSED.inc(len(closed) - sold_count, reason="ended")
+
+    return len(closed)
+
+
+def close_expired(now=None, batch_size=BATCH_SIZE, pause=0):
+    """Close every auction which has ended, one batch per transaction
+
+    Committing each batch keeps the write lock short, so bids on other
+    listings are not held up while a large number of auctions close together.
+
+    Args:
+        now (datetime): Close auctions which ended by this time (default: now)
+        batch_size (int): Listings closed per transaction (default: BATCH_SIZE)
+        pause (float): Seconds to sleep between batches (default: 0)
+
+    Returns:
+        int: Number of listings closed
+    """
+    now = now or timezone.now()
+    total = 0
+
+    while True:
+        closed = close_batch(now, batch_size)
+        total += closed
+
+        if not closed:
+            return total
+
+        time.sleep(pause)
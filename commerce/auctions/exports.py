@@ -0,0 +1,182 @@
+"""Streaming exports of the bid history
+
+Rows are read with iterator(), which fetches CHUNK_SIZE rows at a time from
+an open cursor instead of loading the whole result, and are serialized a chunk
+at a time as they arrive.  Memory use stays flat however many rows match.
+"""
+
+import csv
+import datetime
+import io
+import json
+from itertools import islice
+
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .caching import category_registry
+from .models import Bid
+
+CHUNK_SIZE = 2000
+
+FORMATS = ("csv", "jsonl")
+
+CONTENT_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+# Exported columns, and the fields they are read from
+COLUMNS = {
+    "bid_id": "id",
+    "bid_created_at": "created_at",
+    "price": "price",
+    "bidder": "user__username",
+    "bidder_email": "user__email",
+    "listing_id": "listing_id",
+    "listing_title": "listing__title",
+    "category": "listing__category__name",
+    "seller": "listing__user__username",
+    "opening_price": "listing__price",
+    "listing_active": "listing__active",
+    "listing_completed": "listing__completed",
+}
+
+
+def _parse_time(value):
+    moment = parse_datetime(value)
+
+    if moment is None:
+        day = parse_date(value)
+
+        if day is None:
+            raise ValueError(f"Not a date or time: {value}")
+
+        moment = datetime.datetime.combine(day, datetime.time())
+
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+
+    return moment
+
+
+def parse_filters(since=None, until=None, category=None):
+    """Turn export filters given as text into bid_rows() arguments
+
+    Args:
+        since (str): ISO date or time of the first bids to include
+        until (str): ISO date or time to stop before
+        category (str): Category id or name
+
+    Returns:
+        dict: Keyword arguments for bid_rows()
+
+    Raises:
+        ValueError: If a date or the category is not recognised
+    """
+    filters = {}
+
+    if since:
+        filters["since"] = _parse_time(since)
+
+    if until:
+        filters["until"] = _parse_time(until)
+
+    if category:
+        match = [
+            option
+            for option in category_registry.all()
+            if str(option.pk) == category or option.name.lower() == category.lower()
+        ]
+
+        if not match:
+            raise ValueError(f"Unknown category: {category}")
+
+        filters["category_id"] = match[0].pk
+
+    return filters
+
+
+def bid_rows(since=None, until=None, category_id=None, sales_only=False):
+    """Bids joined to their bidder, listing, category and seller, oldest first
+
+    Args:
+        since (datetime): Only bids placed at or after this time
+        until (datetime): Only bids placed before this time
+        category_id (int): Only bids on listings in this category
+        sales_only (bool): Only the winning bids of completed listings
+
+    Returns:
+        QuerySet: Tuples of the COLUMNS values, ordered through the
+            (created_at) index
+    """
+    bids = Bid.objects.all()
+
+    if since is not None:
+        bids = bids.filter(created_at__gte=since)
+
+    if until is not None:
+        bids = bids.filter(created_at__lt=until)
+
+    if category_id is not None:
+        bids = bids.filter(listing__category_id=category_id)
+
+    if sales_only:
+        bids = bids.filter(Q(listing__completed=True, listing__high_bid=F("pk")))
+
+    return bids.order_by("created_at", "id").values_list(*COLUMNS.values())
+
+
+def _chunks(rows, chunk_size):
+    rows = rows.iterator(chunk_size=chunk_size)
+
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+
+def _values(row):
+    return [
+        value.isoformat() if hasattr(value, "isoformat") else value for value in row
+    ]
+
+
+def _csv_chunks(rows, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+
+    for chunk in _chunks(rows, chunk_size):
+        writer.writerows(_values(row) for row in chunk)
+        yield buffer.getvalue()
+
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Only the header is left when there were no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _jsonl_chunks(rows, chunk_size):
+    for chunk in _chunks(rows, chunk_size):
+        yield "".join(
+            json.dumps(dict(zip(COLUMNS, _values(row)))) + "\n" for row in chunk
+        )
+
+
+def stream(rows, format="csv", chunk_size=CHUNK_SIZE):
+    """Serialize rows from bid_rows() a chunk at a time
+
+    Args:
+        rows (QuerySet): Rows to export
+        format (str): One of FORMATS (default: csv)
+        chunk_size (int): Rows fetched and serialized at a time
+
+    Returns:
+        iterator: Strings of serialized rows, one per chunk
+    """
+    if format == "csv":
+        return _csv_chunks(rows, chunk_size)
+
+    if format == "jsonl":
+        return _jsonl_chunks(rows, chunk_size)
+
+    raise ValueError(f"Unknown export format: {format}")
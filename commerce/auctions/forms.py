@@ -1,10 +1,36 @@
+from datetime import timedelta
+
 from django import forms
+from django.utils import timezone
 from django.forms import ClearableFileInput, NumberInput, Select, Textarea, TextInput
 
 from .models import Bid, Category, Comment, Listing, User
 
 
+def auction_end(duration):
+    """End time of an auction starting now which runs for `duration` days, if any"""
+    if not duration:
+        return None
+
+    return timezone.now() + timedelta(days=duration)
+
+
 class CreateListingForm(forms.ModelForm):
+    duration = forms.TypedChoiceField(
+        choices=[
+            ("", "Until I close it"),
+            (1, "1 day"),
+            (3, "3 days"),
+            (7, "7 days"),
+            (14, "14 days"),
+        ],
+        coerce=int,
+        empty_value=None,
+        required=False,
+        help_text="How long should bidding stay open?",
+        widget=Select({"class": "form-control w-50"}),
+    )
+
     class Meta:
         model = Listing
         fields = ("title", "description", "category", "image", "price")
@@ -17,3 +43,8 @@ class CreateListingForm(forms.ModelForm):
             "price": NumberInput({"class": "form-control w-50"}),
             "category": Select({"class": "form-control"}),
         }
+
+    def save(self, commit=True):
+        self.instance.ends_at = auction_end(self.cleaned_data.get("duration"))
+
+        return super().save(commit)
@@ -0,0 +1,110 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Variants of each listing image, sized for where they are displayed.  Cards
+# are cropped to fill their fixed frame, the detail view keeps the full image.
+VARIANTS = {
+    "card": {"size": (350, 450), "crop": True, "sizes": "350px"},
+    "detail": {"size": (565, 565), "crop": False, "sizes": "565px"},
+}
+
+# Pixel densities to produce for each variant
+SCALES = (1, 2)
+
+# Output formats, in order of preference
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 6}),
+    "jpeg": (
+        "JPEG",
+        "image/jpeg",
+        {"quality": 82, "optimize": True, "progressive": True},
+    ),
+}
+
+
+def variant_name(name, variant, width, extension):
+    """Storage name of a variant, stored next to the original image
+
+    e.g. images/lamp.jpg -> images/lamp.card-700w.webp
+    """
+    root, _ = os.path.splitext(name)
+
+    return f"{root}.{variant}-{width}w.{extension}"
+
+
+def _covers(image, size, crop):
+    """Whether an image is large enough to produce a variant without upscaling"""
+    if crop:
+        return image.width >= size[0] and image.height >= size[1]
+
+    return image.width >= size[0] or image.height >= size[1]
+
+
+def _resize(image, size, crop):
+    if crop:
+        return ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+
+    resized = image.copy()
+    resized.thumbnail(size, Image.Resampling.LANCZOS)
+
+    return resized
+
+
+def generate_variants(listing, storage=default_storage):
+    """Create the resized variants of a listing's image and record them
+
+    Variants which would upscale the original are skipped, except for the 1x
+    size which is always produced.  Any previously generated variants are
+    replaced.
+
+    Args:
+        listing (Listing): Listing with an uploaded image
+        storage (Storage): Where images are stored (default: default_storage)
+
+    Returns:
+        dict: The listing's new image_variants
+    """
+    with storage.open(listing.image.name) as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image = image.convert("RGB")
+
+    delete_variants(listing.image_variants, storage)
+    variants = {}
+
+    for variant, options in VARIANTS.items():
+        width, height = options["size"]
+        generated = variants.setdefault(variant, {})
+
+        for scale in SCALES:
+            size = (width * scale, height * scale)
+
+            if scale > 1 and not _covers(image, size, options["crop"]):
+                break
+
+            resized = _resize(image, size, options["crop"])
+
+            for extension, (image_format, _, params) in FORMATS.items():
+                buffer = BytesIO()
+                resized.save(buffer, image_format, **params)
+                name = storage.save(
+                    variant_name(listing.image.name, variant, resized.width, extension),
+                    ContentFile(buffer.getvalue()),
+                )
+                generated.setdefault(extension, []).append([resized.width, name])
+
+    listing.image_variants = variants
+    listing.save(update_fields=["image_variants", "updated_at"])
+
+    return variants
+
+
+def delete_variants(variants, storage=default_storage):
+    """Remove the files recorded in a listing's image_variants"""
+    for formats in (variants or {}).values():
+        for widths in formats.values():
+            for _, name in widths:
+                storage.delete(name)
@@ -0,0 +1,213 @@
+"""Bulk import of listings from CSV or JSONL catalogues
+
+Rows are read one at a time, validated with the fields of create_listing's
+form and inserted with bulk_create() in batches, one transaction per batch.  Rows
+which fail validation are handed back to the caller with the reason instead
+of stopping the import.
+"""
+
+import csv
+import json
+import os
+from dataclasses import dataclass, field
+
+from django.core.files import File
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import metrics, tasks
+from .caching import category_registry, purge_category_pages
+from .forms import CreateListingForm, auction_end
+from .models import Listing
+
+BATCH_SIZE = 500
+
+FORMATS = ("csv", "jsonl")
+
+# Columns read from each row, the rest are ignored
+COLUMNS = ("title", "description", "category", "price", "image", "duration")
+
+# Columns validated by the matching create_listing form field.  The fields are
+# used directly, as creating a form instance per row costs more than the insert.
+# The image is validated by its field too, once its file has been found.
+FORM_FIELDS = ("title", "description", "price", "duration")
+
+
+@dataclass
+class ImportResult:
+    """Totals of a call to ListingImporter.run()"""
+
+    imported: int = 0
+    rejected: int = 0
+    category_ids: set = field(default_factory=set)
+
+
+def read_rows(stream, format):
+    """Rows of a catalogue as dicts, with their line numbers
+
+    Args:
+        stream (file): Open text file
+        format (str): One of FORMATS
+
+    Returns:
+        iterator: (line number, row) pairs, the row being None for a line
+            which could not be parsed
+    """
+    if format == "csv":
+        reader = csv.DictReader(stream)
+
+        for row in reader:
+            yield reader.line_num, row
+
+        return
+
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+
+        yield number, row if isinstance(row, dict) else None
+
+
+class ListingImporter:
+    """Validates catalogue rows and inserts them in batches
+
+    Categories are resolved by name, ignoring case, from a map built once from
+    the category registry.  Image files are copied into storage as their rows
+    are validated, and their variants are generated by the job queue.
+    """
+
+    def __init__(self, seller, image_dir=None, batch_size=BATCH_SIZE):
+        self.seller = seller
+        self.image_dir = image_dir
+        self.batch_size = batch_size
+        self.categories = {
+            category.name.lower(): category.pk for category in category_registry.all()
+        }
+
+    def build(self, row):
+        """Validate a row and build its unsaved listing
+
+        Raises:
+            ValueError: With the reasons the row was rejected
+        """
+        if row is None:
+            raise ValueError("Not a valid row")
+
+        data = {
+            column: str(row[column]).strip()
+            for column in COLUMNS
+            if row.get(column) not in (None, "")
+        }
+        category = data.get("category", "")
+        category_id = self.categories.get(category.lower())
+
+        if category_id is None:
+            raise ValueError(f"Unknown category: {category}")
+
+        values, errors = {}, []
+
+        for name in FORM_FIELDS:
+            try:
+                values[name] = CreateListingForm.base_fields[name].clean(data.get(name))
+
+                # And the model field's validators, as the form's model
+                # validation would
+                if name in CreateListingForm.Meta.fields:
+                    Listing._meta.get_field(name).run_validators(values[name])
+            except ValidationError as error:
+                errors.append(f"{name}: {' '.join(error.messages)}")
+
+        if errors:
+            raise ValueError("; ".join(errors))
+
+        listing = Listing(
+            title=values["title"],
+            description=values["description"],
+            price=values["price"],
+            current_price=values["price"],
+            ends_at=auction_end(values["duration"]),
+            user=self.seller,
+            category_id=category_id,
+        )
+
+        if "image" in data:
+            listing.image = self.store_image(data["image"])
+
+        return listing
+
+    def store_image(self, name):
+        if self.image_dir is None:
+            raise ValueError("Row has an image but no image directory was given")
+
+        path = os.path.join(self.image_dir, os.path.basename(name))
+
+        if not os.path.isfile(path):
+            raise ValueError(f"Image not found: {name}")
+
+        with open(path, "rb") as stream:
+            image = File(stream, name=os.path.basename(name))
+
+            # Verified by Pillow as an upload would be, so the variants job
+            # isn't left retrying a file which isn't an image
+            try:
+                CreateListingForm.base_fields["image"].clean(image)
+            except ValidationError as error:
+                raise ValueError(f"image: {' '.join(error.messages)}")
+
+            return default_storage.save(f"images/{image.name}", image)
+
+    def insert(self, listings, result):
+        with transaction.atomic():
+            listings = Listing.objects.bulk_create(listings)
+            tasks.generate_image_variants.enqueue_many(
+                {"listing_id": listing.pk} for listing in listings if listing.image
+            )
+
+        metrics.LISTINGS_CREATED.inc(len(listings))
+        result.imported += len(listings)
+        result.category_ids.update(listing.category_id for listing in listings)
+
+    def run(self, rows, reject=None, progress=None):
+        """Import rows from read_rows()
+
+        Args:
+            rows (iterable): (line number, row) pairs
+            reject (callable): Called with the line number, row and reason of
+                each rejected row
+            progress (callable): Called with the result after each batch
+
+        Returns:
+            ImportResult: Totals of the import
+        """
+        result = ImportResult()
+        batch = []
+
+        for number, row in rows:
+            try:
+                batch.append(self.build(row))
+            except ValueError as error:
+                result.rejected += 1
+
+                if reject:
+                    reject(number, row, str(error))
+
+            if len(batch) >= self.batch_size:
+                self.insert(batch, result)
+                batch = []
+
+                if progress:
+                    progress(result)
+
+        if batch:
+            self.insert(batch, result)
+
+        if result.category_ids:
+            purge_category_pages(*result.category_ids)
+
+        return result
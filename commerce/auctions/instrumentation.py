@@ -0,0 +1,234 @@
+"""Per-request timing of SQL, template rendering and the view
+
+The middleware keeps a RequestTimings for each request in a context variable,
+which follows the request into the threads its async views run queries in.
+SQL is timed by an execute wrapper added to every database connection, and
+rendering by the TimedDjangoTemplates backend, so neither needs the views to
+cooperate.
+
+The totals go out in a Server-Timing header, which browser developer tools
+show alongside the request.  Requests slower than AUCTIONS_SLOW_REQUEST_MS are
+logged with their costliest SQL statements grouped by shape, so an N+1 query
+shows up as one statement run once per row.
+"""
+
+import logging
+import re
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Statement shapes listed in the log of a slow request
+TOP_STATEMENTS = 5
+
+_current = ContextVar("request_timings", default=None)
+
+# Literals and placeholders, and lists of them, as they appear in SQL
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s|\?")
+_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """The shape of a statement, with its literals and value lists elided
+
+    Statements differing only in their values share a shape, so a query run
+    once per row of a page is counted as one shape run many times.
+    """
+    sql = _LITERAL.sub("?", _SPACE.sub(" ", sql.strip()))
+
+    return _LIST.sub("(...)", sql)
+
+
+class RequestTimings:
+    """Time spent by one request, added to as it runs"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.rendering = False
+        # Count and total time by statement
+        self.statements = defaultdict(lambda: [0, 0.0])
+
+    def add_query(self, sql, elapsed):
+        self.queries += 1
+        self.sql_time += elapsed
+        statement = self.statements[sql]
+        statement[0] += 1
+        statement[1] += elapsed
+
+    def top_statements(self, limit=TOP_STATEMENTS):
+        """Statement shapes costing the most time, as (shape, count, seconds)"""
+        shapes = defaultdict(lambda: [0, 0.0])
+
+        for sql, (count, elapsed) in self.statements.items():
+            shape = shapes[normalize_sql(sql)]
+            shape[0] += count
+            shape[1] += elapsed
+
+        ranked = sorted(shapes.items(), key=lambda item: item[1][1], reverse=True)
+
+        return [(shape, count, elapsed) for shape, (count, elapsed) in ranked[:limit]]
+
+    def server_timing(self, view_time):
+        return (
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries", '
+            f"render;dur={self.render_time * 1000:.1f}, "
+            f"view;dur={view_time * 1000:.1f}"
+        )
+
+
+def current_timings():
+    """Timings of the request being handled, or None outside a request"""
+    return _current.get()
+
+
+def record_sql(execute, sql, params, many, context):
+    """Execute wrapper adding each statement to the current request's timings"""
+    timings = _current.get()
+
+    if timings is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(sql, time.perf_counter() - started)
+
+
+def install(connection, **kwargs):
+    """Add record_sql() to a database connection, once
+
+    It goes first, as connection.execute_wrapper() blocks which may be open
+    meanwhile remove their wrapper by popping the last one.
+    """
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_sql)
+
+
+connection_created.connect(install)
+
+
+class TimedTemplate:
+    """Template adding its render time to the current request's timings
+
+    Only the outermost render is timed, as templates rendered while another
+    one renders, such as cached cards, are part of its time.
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timings = _current.get()
+
+        if timings is None or timings.rendering:
+            return self.template.render(context, request)
+
+        timings.rendering = True
+        started = time.perf_counter()
+
+        try:
+            return self.template.render(context, request)
+        finally:
+            timings.render_time += time.perf_counter() - started
+            timings.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django template backend whose templates are timed with TimedTemplate"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def _finish(request, response, timings):
+    view_time = time.perf_counter() - timings.started
+    match = request.resolver_match
+    metrics.VIEW_LATENCY.observe(
+        view_time, view=match.view_name if match else "unmatched"
+    )
+
+    if getattr(settings, "AUCTIONS_SERVER_TIMING", True):
+        response["Server-Timing"] = timings.server_timing(view_time)
+
+    threshold = getattr(settings, "AUCTIONS_SLOW_REQUEST_MS", None)
+
+    if threshold is not None and view_time * 1000 >= threshold:
+        statements = "".join(
+            f"\n  {count} x {elapsed * 1000:.1f}ms  {shape}"
+            for shape, count, elapsed in timings.top_statements()
+        )
+        logger.warning(
+            "Slow request %s %s: %.0fms, %d queries in %.0fms, render %.0fms%s",
+            request.method,
+            request.get_full_path(),
+            view_time * 1000,
+            timings.queries,
+            timings.sql_time * 1000,
+            timings.render_time * 1000,
+            statements,
+        )
+
+    return response
+
+
+@sync_and_async_middleware
+def request_timing_middleware(get_response):
+    """Time each request, adding a Server-Timing header and logging slow ones"""
+    # Connections opened before this module was imported missed the signal
+    for opened in connections.all(initialized_only=True):
+        install(opened)
+
+    if iscoroutinefunction(get_response):
+
+        async def async_middleware(request):
+            timings = RequestTimings()
+            token = _current.set(timings)
+            metrics.REQUESTS_IN_PROGRESS.inc()
+
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+                metrics.REQUESTS_IN_PROGRESS.dec()
+
+            return _finish(request, response, timings)
+
+        return async_middleware
+
+    def middleware(request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        metrics.REQUESTS_IN_PROGRESS.inc()
+
+        try:
+            response = get_response(request)
+        finally:
+            _current.reset(token)
+            metrics.REQUESTS_IN_PROGRESS.dec()
+
+        return _finish(request, response, timings)
+
+    return middleware
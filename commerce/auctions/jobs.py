@@ -0,0 +1,257 @@
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from functools import partial
+
+from django.db import close_old_connections
+from django.db.models import Count, F, Subquery
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Retry delays grow as BACKOFF_BASE * 2 ** (attempt - 1) seconds, up to BACKOFF_MAX
+BACKOFF_BASE = 5
+BACKOFF_MAX = 60 * 60
+
+# Running jobs whose worker has not finished them in this time are requeued
+STALE_AFTER = timedelta(minutes=15)
+
+_registry = {}
+
+
+def job(func):
+    """Register a function as a job, adding `func.enqueue()` and `enqueue_many()`"""
+    _registry[func.__name__] = func
+    func.enqueue = partial(enqueue, func.__name__)
+    func.enqueue_many = partial(enqueue_many, func.__name__)
+
+    return func
+
+
+def enqueue(name, delay=0, max_attempts=5, **payload):
+    """Queue a registered job to run in a worker process
+
+    The job row is written in the caller's transaction, so a job enqueued from
+    a request that later rolls back is never run.
+
+    Args:
+        name (str): Name of the registered job function
+        delay (int): Seconds to wait before the job may run (default: 0)
+        max_attempts (int): Attempts before giving up (default: 5)
+        payload: JSON serializable keyword arguments for the job function
+
+    Returns:
+        Job: The queued job
+    """
+    if name not in _registry:
+        raise ValueError(f"Unknown job: {name}")
+
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_many(name, payloads, delay=0, max_attempts=5):
+    """Queue a registered job once per payload with a single INSERT
+
+    Args:
+        name (str): Name of the registered job function
+        payloads (iterable): Dicts of keyword arguments, one per job
+
+    Returns:
+        list: The queued jobs
+    """
+    if name not in _registry:
+        raise ValueError(f"Unknown job: {name}")
+
+    run_at = timezone.now() + timedelta(seconds=delay)
+
+    return Job.objects.bulk_create(
+        Job(name=name, payload=payload, max_attempts=max_attempts, run_at=run_at)
+        for payload in payloads
+    )
+
+
+def claim(worker_id):
+    """Claim the next due job for a worker
+
+    The claim is one UPDATE of the oldest due job which only matches while the
+    job is still queued, so two workers can never claim the same job.  It needs
+    no row locking and so works on SQLite as well as server databases.
+
+    Returns:
+        Job: The claimed job, or None if no job is due
+    """
+    now = timezone.now()
+    token = f"{worker_id}:{uuid.uuid4().hex}"
+    due = (
+        Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        .order_by("run_at", "id")
+        .values("id")[:1]
+    )
+
+    claimed = Job.objects.filter(pk__in=Subquery(due), status=Job.QUEUED).update(
+        status=Job.RUNNING,
+        locked_by=token,
+        started_at=now,
+        attempts=F("attempts") + 1,
+    )
+
+    if not claimed:
+        return None
+
+    return Job.objects.get(locked_by=token)
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job which has failed `attempts` times"""
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+    return delay * random.uniform(0.8, 1.2)
+
+
+def run(job):
+    """Run a claimed job, then record its success or schedule a retry
+
+    Jobs manage their own transactions so that slow work, such as resizing an
+    image, does not hold the database's write lock while it runs.
+    """
+    try:
+        _registry[job.name](**job.payload)
+    except Exception:
+        now = timezone.now()
+        job.last_error = traceback.format_exc()
+        job.locked_by = ""
+
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = now + timedelta(seconds=backoff(job.attempts))
+        else:
+            job.status = Job.FAILED
+            job.finished_at = now
+
+        job.save(
+            update_fields=["status", "run_at", "finished_at", "locked_by", "last_error"]
+        )
+        logger.warning(
+            "Job %s (%s) failed on attempt %s", job.pk, job.name, job.attempts
+        )
+
+        return False
+
+    job.status = Job.DONE
+    job.finished_at = timezone.now()
+    job.locked_by = ""
+    job.save(update_fields=["status", "finished_at", "locked_by"])
+
+    logger.info(
+        "Job %s (%s) done in %.0fms after waiting %.0fms",
+        job.pk,
+        job.name,
+        (job.finished_at - job.started_at).total_seconds() * 1000,
+        (job.started_at - job.run_at).total_seconds() * 1000,
+    )
+
+    return True
+
+
+def requeue_stale(older_than=STALE_AFTER):
+    """Return jobs abandoned by a crashed worker to the queue
+
+    Returns:
+        int: Number of jobs requeued
+    """
+    return Job.objects.filter(
+        status=Job.RUNNING, started_at__lt=timezone.now() - older_than
+    ).update(status=Job.QUEUED, locked_by="", run_at=timezone.now())
+
+
+def work(worker_id=None, poll_interval=1.0, burst=False, should_stop=None):
+    """Claim and run jobs until stopped
+
+    Args:
+        worker_id (str): Name used in claim tokens (default: host and process id)
+        poll_interval (float): Seconds to sleep when no job is due
+        burst (bool): Return once no job is due instead of polling
+        should_stop (callable): Returns True when the worker should exit
+
+    Returns:
+        int: Number of jobs run
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    processed = 0
+
+    while not (should_stop and should_stop()):
+        close_old_connections()
+        job = claim(worker_id)
+
+        if job is None:
+            if burst:
+                break
+
+            time.sleep(poll_interval)
+            continue
+
+        run(job)
+        processed += 1
+
+    return processed
+
+
+def _percentile(values, percent):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+
+    return values[index]
+
+
+def latency_stats(since=timedelta(hours=1)):
+    """Queue and run time percentiles, in milliseconds, of recently finished jobs
+
+    Returns:
+        dict: Job counts by status, plus p50/p95/max of the time jobs waited
+            between becoming due and starting ("wait") and of their run time
+            ("run")
+    """
+    counts = {status: 0 for status, _ in Job.STATUS_CHOICES}
+    for status, count in (
+        Job.objects.order_by().values_list("status").annotate(count=Count("id"))
+    ):
+        counts[status] = count
+
+    finished = Job.objects.filter(
+        status=Job.DONE, finished_at__gte=timezone.now() - since
+    ).values_list("run_at", "started_at", "finished_at")
+
+    waits, runs = [], []
+    for run_at, started_at, finished_at in finished.iterator():
+        waits.append((started_at - run_at).total_seconds() * 1000)
+        runs.append((finished_at - started_at).total_seconds() * 1000)
+
+    waits.sort()
+    runs.sort()
+
+    return {
+        "counts": counts,
+        **{
+            name: {
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "max": values[-1] if values else None,
+            }
+            for name, values in (("wait", waits), ("run", runs))
+        },
+    }
@@ -0,0 +1,483 @@
+"""Synthetic data at production scale, for reproducing performance problems
+
+Activity is skewed the way it is on a live site: listing popularity follows
+Zipf's law over a shuffled order, so a few hot listings take most bids,
+comments and watchers while most get little or none.  Every value comes from
+one seeded random generator, so the same seed and sizes give the same data,
+with times relative to when it is generated.
+
+Rows are written with executemany() in large transactions, with ids assigned
+up front so that listings can be written with their final counters and high
+bids and no row is updated afterwards.  The search index triggers and the
+bid and comment indexes which would be written out of order are dropped during
+the load and rebuilt in one pass at the end, so it needs SQLite, as the search
+index does.
+"""
+
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import bidding, search
+from .caching import category_registry, purge_category_pages
+from .models import Bid, Category, Comment, Listing, User
+
+# Listings written per transaction, along with their bids, comments and
+# watches, ending the transaction early once it holds this many bids
+CHUNK_SIZE = 5000
+CHUNK_BIDS = 200000
+
+# Page cache of the connection during the load, in KiB when negative
+LOAD_CACHE_SIZE = -262144
+
+# Password of every generated user
+PASSWORD = "password"
+
+CATEGORY_NAMES = [
+    "Antiques",
+    "Art",
+    "Books",
+    "Cameras",
+    "Clothing",
+    "Collectibles",
+    "Computers",
+    "Electronics",
+    "Furniture",
+    "Garden",
+    "Jewellery",
+    "Music",
+    "Phones",
+    "Sports",
+    "Tools",
+    "Toys",
+    "Vehicles",
+    "Video Games",
+    "Watches",
+    "Wine",
+]
+
+WORDS = (
+    "vintage rare new used boxed signed original classic large small antique "
+    "handmade limited edition restored working spare parts bundle set pair "
+    "wooden brass silver leather glass steel blue red green black white gold"
+).split()
+
+
+@dataclass
+class Sizes:
+    """How much of everything to generate"""
+
+    users: int = 1000
+    categories: int = 10
+    listings: int = 10000
+    bids: int = 100000
+    comments: int = 20000
+    watches: int = 20000
+    # Exponent of the Zipf distribution of activity over listings
+    skew: float = 1.1
+    # Days over which listings were created
+    days: int = 90
+    # Share of listings which have closed
+    closed: float = 0.3
+
+
+@dataclass
+class Chunk:
+    """Rows written in one transaction"""
+
+    listings: list = field(default_factory=list)
+    bids: list = field(default_factory=list)
+    comments: list = field(default_factory=list)
+    watches: list = field(default_factory=list)
+
+
+LISTING_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "image",
+    "image_variants",
+    "price",
+    "current_price",
+    "user",
+    "category",
+    "active",
+    "completed",
+    "ends_at",
+    "created_at",
+    "updated_at",
+    "high_bid",
+    "proxy_bidder",
+    "proxy_max",
+    "bid_count",
+    "comment_count",
+    "watcher_count",
+)
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+
+
+def _insert(model, fields, rows):
+    """Insert tuples of field values with one executemany()"""
+    columns = [model._meta.get_field(name).column for name in fields]
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        model._meta.db_table,
+        ", ".join(connection.ops.quote_name(column) for column in columns),
+        ", ".join(["%s"] * len(columns)),
+    )
+
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _allocate(total, weights, limits):
+    """Split a total over listings in proportion to weight, up to each limit
+
+    Whatever the limits cut off is handed out again over the listings with
+    room left, so the total is met unless every listing is full.
+    """
+    counts = [0] * len(weights)
+    remaining = total
+
+    while remaining > 0:
+        open_weight = sum(
+            weight
+            for weight, count, limit in zip(weights, counts, limits)
+            if count < limit
+        )
+
+        if not open_weight:
+            break
+
+        handed_out = 0
+
+        for index, weight in enumerate(weights):
+            room = limits[index] - counts[index]
+
+            if room <= 0:
+                continue
+
+            share = min(room, int(remaining * weight / open_weight))
+            counts[index] += share
+            handed_out += share
+
+        if not handed_out:
+            # The rest are less than one each, give them to the heaviest first
+            for index in sorted(
+                range(len(weights)), key=weights.__getitem__, reverse=True
+            ):
+                if remaining - handed_out <= 0:
+                    break
+
+                if counts[index] < limits[index]:
+                    counts[index] += 1
+                    handed_out += 1
+
+        remaining -= handed_out
+
+    return counts
+
+
+class Generator:
+    """Generates and writes a synthetic dataset, see the module docstring"""
+
+    def __init__(self, sizes, seed=0, log=None):
+        self.sizes = sizes
+        self.rng = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+        self.bids_written = 0
+
+    def text(self, low, high):
+        return " ".join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def run(self):
+        with connection.cursor() as cursor:
+            for suffix in ("insert", "delete", "update"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {search.FTS_TABLE}_{suffix}")
+
+            # Bids and comments arrive in listing order, but their indexes on
+            # other columns are written all over, so those are built once at
+            # the end instead.  The listing indexes stay, as the deferred
+            # foreign key checks look up bids and comments by listing.
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+                "AND sql IS NOT NULL AND tbl_name IN (%s, %s)",
+                [Bid._meta.db_table, Comment._meta.db_table],
+            )
+            indexes = []
+
+            for name, sql in cursor.fetchall():
+                cursor.execute(f"PRAGMA index_info({connection.ops.quote_name(name)})")
+
+                if cursor.fetchone()[2] != "listing_id":
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+                    indexes.append(sql)
+
+            cursor.execute("PRAGMA cache_size")
+            (cache_size,) = cursor.fetchone()
+            cursor.execute(f"PRAGMA cache_size = {LOAD_CACHE_SIZE}")
+
+        try:
+            self.users = self.create_users()
+            self.categories = self.create_categories()
+            self.create_listings()
+        finally:
+            with connection.cursor() as cursor:
+                self.log("Rebuilding indexes...")
+
+                for sql in indexes:
+                    cursor.execute(sql)
+
+                cursor.execute(f"PRAGMA cache_size = {cache_size}")
+
+            self.log("Rebuilding the search index...")
+            search.rebuild()
+
+        purge_category_pages(*self.categories)
+
+    def create_users(self):
+        first = _next_id(User)
+        password = make_password(PASSWORD)
+        ids = range(first, first + self.sizes.users)
+
+        with transaction.atomic():
+            _insert(
+                User,
+                (
+                    "id",
+                    "username",
+                    "email",
+                    "password",
+                    "first_name",
+                    "last_name",
+                    "is_superuser",
+                    "is_staff",
+                    "is_active",
+                    "date_joined",
+                ),
+                (
+                    (
+                        pk,
+                        f"user{pk}",
+                        f"user{pk}@example.com",
+                        password,
+                        "",
+                        "",
+                        False,
+                        False,
+                        True,
+                        self.adapt(self.now),
+                    )
+                    for pk in ids
+                ),
+            )
+
+        self.log(f"Created {self.sizes.users} users.")
+
+        return list(ids)
+
+    def create_categories(self):
+        categories = Category.objects.bulk_create(
+            Category(
+                name=CATEGORY_NAMES[index % len(CATEGORY_NAMES)]
+                + (
+                    f" {index // len(CATEGORY_NAMES) + 1}"
+                    if index >= len(CATEGORY_NAMES)
+                    else ""
+                ),
+                icon="bi bi-tag",
+                description=self.text(8, 16),
+                hex_color_code=f"{self.rng.randrange(0x1000000):06X}",
+            )
+            for index in range(self.sizes.categories)
+        )
+        category_registry.invalidate()
+        self.log(f"Created {len(categories)} categories.")
+
+        return [category.pk for category in categories]
+
+    def create_listings(self):
+        sizes = self.sizes
+        count = sizes.listings
+
+        # Popularity by Zipf's law, over a shuffled order so hot listings are
+        # spread across ages and categories
+        ranks = list(range(1, count + 1))
+        self.rng.shuffle(ranks)
+        weights = [1 / rank**sizes.skew for rank in ranks]
+        prices = [self.rng.randint(1, 1000) for _ in range(count)]
+
+        # Each bid goes at least one dollar above the last
+        bid_counts = _allocate(
+            sizes.bids, weights, [bidding.MAX_BID - price for price in prices]
+        )
+        comment_counts = _allocate(sizes.comments, weights, [sizes.comments] * count)
+        watch_counts = _allocate(sizes.watches, weights, [len(self.users) - 1] * count)
+
+        first_listing = _next_id(Listing)
+        next_bid = _next_id(Bid)
+        next_comment = _next_id(Comment)
+        chunk = Chunk()
+
+        for index in range(count):
+            pk = first_listing + index
+            listing = self.listing(pk, prices[index])
+            bids = self.bids(listing, next_bid, bid_counts[index])
+            next_bid += len(bids)
+            comments = self.comments(listing, next_comment, comment_counts[index])
+            next_comment += len(comments)
+            watchers = [
+                user
+                for user in self.rng.sample(self.users, watch_counts[index] + 1)
+                if user != listing["user"]
+            ][: watch_counts[index]]
+
+            if bids:
+                _, _, bidder, price, _ = bids[-1]
+                listing.update(
+                    current_price=price,
+                    high_bid=bids[-1][0],
+                    proxy_bidder=bidder,
+                    proxy_max=price,
+                    completed=not listing["active"],
+                )
+
+            listing.update(
+                bid_count=len(bids),
+                comment_count=len(comments),
+                watcher_count=len(watchers),
+            )
+            chunk.listings.append(
+                [self.adapt(listing[name]) for name in LISTING_FIELDS]
+            )
+            chunk.bids.extend(bids)
+            chunk.comments.extend(comments)
+            chunk.watches.extend((pk, user) for user in watchers)
+
+            if len(chunk.listings) >= CHUNK_SIZE or len(chunk.bids) >= CHUNK_BIDS:
+                self.write(chunk, index + 1)
+                chunk = Chunk()
+
+        if chunk.listings:
+            self.write(chunk, count)
+
+    def write(self, chunk, listings):
+        with transaction.atomic():
+            _insert(Listing, LISTING_FIELDS, chunk.listings)
+            _insert(Bid, ("id", "listing", "user", "price", "created_at"), chunk.bids)
+            _insert(
+                Comment, ("id", "listing", "user", "text", "created_at"), chunk.comments
+            )
+            _insert(Listing.watchers.through, ("listing", "user"), chunk.watches)
+
+        self.bids_written += len(chunk.bids)
+        self.log(f"Created {listings} listings and {self.bids_written} bids.")
+
+    def adapt(self, value):
+        if isinstance(value, datetime):
+            return connection.ops.adapt_datetimefield_value(value)
+
+        return value
+
+    def listing(self, pk, price):
+        created_at = self.now - timedelta(
+            seconds=self.rng.uniform(0, self.sizes.days * 86400)
+        )
+        active = self.rng.random() >= self.sizes.closed
+        ends_at = None
+
+        # Some auctions are timed, the closed ones having ended already
+        if self.rng.random() < 0.5:
+            ends_at = (
+                self.now
+                - timedelta(
+                    seconds=self.rng.uniform(0, (self.now - created_at).total_seconds())
+                )
+                if not active
+                else self.now + timedelta(days=self.rng.uniform(0, 14))
+            )
+
+        return {
+            "id": pk,
+            "title": self.text(2, 6).capitalize()[:50],
+            "description": self.text(10, 60)[:500],
+            "image": "",
+            "image_variants": "{}",
+            "price": price,
+            "current_price": price,
+            "user": self.rng.choice(self.users),
+            "category": self.rng.choice(self.categories),
+            "active": active,
+            "completed": False,
+            "ends_at": ends_at,
+            "created_at": created_at,
+            "updated_at": created_at,
+            "high_bid": None,
+            "proxy_bidder": None,
+            "proxy_max": None,
+        }
+
+    def times(self, start, end, count):
+        """Evenly spaced times between start and end, as database values
+
+        Only the start is converted by the database backend, the rest are
+        offsets from it, which is most of the cost of generating a bid.
+        """
+        first = datetime.fromisoformat(self.adapt(start))
+        span = (end - start) / (count + 1)
+
+        return [str(first + span * number) for number in range(1, count + 1)]
+
+    def bids(self, listing, first_id, count):
+        if not count:
+            return []
+
+        # Bids come in between the listing being created and now or its end
+        times = self.times(
+            listing["created_at"], min(listing["ends_at"] or self.now, self.now), count
+        )
+        step = max(1, min(5, (bidding.MAX_BID - listing["price"]) // count))
+        increments = self.rng.choices(range(1, step + 1), k=count)
+        bidders = self.rng.choices(self.users, k=count)
+        seller = listing["user"]
+        # Stands in for the seller when they are picked to bid
+        substitute = self.users[0] if seller != self.users[0] else self.users[1]
+        price = listing["price"]
+        rows = []
+
+        for number in range(count):
+            price += increments[number]
+            bidder = bidders[number]
+            rows.append(
+                (
+                    first_id + number,
+                    listing["id"],
+                    bidder if bidder != seller else substitute,
+                    price,
+                    times[number],
+                )
+            )
+
+        return rows
+
+    def comments(self, listing, first_id, count):
+        times = self.times(listing["created_at"], self.now, count)
+
+        return [
+            (
+                first_id + number,
+                listing["id"],
+                self.rng.choice(self.users),
+                self.text(3, 20),
+                times[number],
+            )
+            for number in range(count)
+        ]
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions import expiry
+
+
+class Command(BaseCommand):
+    help = "Close the auctions which have passed their end time"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=expiry.BATCH_SIZE,
+            help=f"Listings closed per transaction (default: {expiry.BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to wait between batches (default: 0)",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep running, checking for ended auctions this often in seconds",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            closed = expiry.close_expired(
+                batch_size=options["batch_size"], pause=options["pause"]
+            )
+
+            if closed or not options["interval"]:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Closed {closed} ended auctions.")
+                )
+
+            if not options["interval"]:
+                return
+
+            time.sleep(options["interval"])
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from auctions.images import generate_variants
+from auctions.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Generate resized image variants for listings which do not have them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "listing_ids",
+            nargs="*",
+            type=int,
+            help="Only process these listings (default: all listings with images)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate variants which already exist",
+        )
+
+    def handle(self, *args, **options):
+        listings = Listing.objects.exclude(image="")
+
+        if options["listing_ids"]:
+            listings = listings.filter(pk__in=options["listing_ids"])
+
+        if not options["force"]:
+            listings = listings.filter(image_variants={})
+
+        generated = failed = 0
+
+        for listing in listings.iterator(chunk_size=100):
+            try:
+                generate_variants(listing)
+                generated += 1
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f"Listing {listing.pk} ({listing.image}): {error}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Generated variants for {generated} listings.")
+        )
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} listings failed."))
@@ -0,0 +1,65 @@
+import time
+from dataclasses import fields
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import load_data
+
+HELP = {
+    "users": 'Users to create, all with the password "password"',
+    "categories": "Categories to create",
+    "listings": "Listings to create",
+    "bids": "Bids to place across the listings",
+    "comments": "Comments to post across the listings",
+    "watches": "Watchlist entries to add across the listings",
+    "skew": "Exponent of the Zipf distribution of activity, higher is more "
+    "concentrated on the most popular listings",
+    "days": "Days over which the listings were created",
+    "closed": "Share of listings which have closed",
+}
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic users, listings, bids and activity"
+
+    def add_arguments(self, parser):
+        defaults = load_data.Sizes()
+
+        for size in fields(load_data.Sizes):
+            parser.add_argument(
+                f"--{size.name}",
+                type=size.type,
+                default=getattr(defaults, size.name),
+                help=f"{HELP[size.name]} (default: {getattr(defaults, size.name)})",
+            )
+
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the random generator, the same seed gives the same data "
+            "(default: 0)",
+        )
+
+    def handle(self, *args, **options):
+        sizes = load_data.Sizes(
+            **{size.name: options[size.name] for size in fields(load_data.Sizes)}
+        )
+
+        if sizes.users < 2:
+            raise CommandError("At least 2 users are needed to have bidders")
+
+        if sizes.categories < 1 and sizes.listings:
+            raise CommandError("At least 1 category is needed for the listings")
+
+        started = time.perf_counter()
+        generator = load_data.Generator(sizes, options["seed"], log=self.stderr.write)
+        generator.run()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {sizes.listings} listings and {generator.bids_written} bids "
+                f"in {elapsed:.1f}s."
+            )
+        )
@@ -0,0 +1,120 @@
+import csv
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import imports
+from auctions.models import User
+
+
+class Command(BaseCommand):
+    help = "Import listings for a seller from a CSV or JSONL catalogue"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Catalogue file")
+        parser.add_argument(
+            "--seller", required=True, help="Username the listings are created for"
+        )
+        parser.add_argument(
+            "--format",
+            choices=imports.FORMATS,
+            help="Catalogue format (default: from the file extension)",
+        )
+        parser.add_argument("--images", help="Directory of the images rows refer to")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=imports.BATCH_SIZE,
+            help=f"Listings inserted per transaction (default: {imports.BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--rejects",
+            help="File for rejected rows (default: the catalogue path with "
+            ".rejected before the extension)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        root, extension = os.path.splitext(path)
+        catalogue_format = options["format"] or extension.lstrip(".").lower()
+
+        if catalogue_format not in imports.FORMATS:
+            raise CommandError(f"Can't tell the format of {path}, use --format")
+
+        seller = User.objects.filter(username=options["seller"]).first()
+
+        if seller is None:
+            raise CommandError(f"Unknown seller: {options['seller']}")
+
+        rejects_path = options["rejects"] or f"{root}.rejected.{catalogue_format}"
+        rejects = RejectsFile(rejects_path, catalogue_format)
+        importer = imports.ListingImporter(
+            seller, options["images"], options["batch_size"]
+        )
+        started = time.perf_counter()
+
+        def progress(result):
+            elapsed = time.perf_counter() - started
+            self.stderr.write(
+                f"{result.imported} imported, {result.rejected} rejected "
+                f"({result.imported / elapsed:.0f} rows/sec)"
+            )
+
+        try:
+            with open(path, newline="", encoding="utf-8") as stream:
+                result = importer.run(
+                    imports.read_rows(stream, catalogue_format),
+                    reject=rejects.write,
+                    progress=progress,
+                )
+        finally:
+            rejects.close()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.imported} listings in {elapsed:.1f}s "
+                f"({result.imported / elapsed:.0f} rows/sec)."
+            )
+        )
+
+        if result.rejected:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Rejected {result.rejected} rows, see {rejects_path}."
+                )
+            )
+
+
+class RejectsFile:
+    """Rejected rows with their line number and reason, opened on first use"""
+
+    def __init__(self, path, format):
+        self.path = path
+        self.format = format
+        self._file = self._writer = None
+
+    def write(self, line, row, reason):
+        if self._file is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+
+            if self.format == "csv":
+                self._writer = csv.DictWriter(
+                    self._file,
+                    fieldnames=["line", "error", *imports.COLUMNS],
+                    extrasaction="ignore",
+                )
+                self._writer.writeheader()
+
+        record = {"line": line, "error": reason, **(row or {})}
+
+        if self._writer:
+            self._writer.writerow(record)
+        else:
+            self._file.write(json.dumps(record, default=str) + "\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
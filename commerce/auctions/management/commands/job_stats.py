@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from auctions.jobs import latency_stats
+
+
+class Command(BaseCommand):
+    help = "Show background job counts and latency percentiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--minutes",
+            type=int,
+            default=60,
+            help="Only include jobs finished within this many minutes (default: 60)",
+        )
+
+    def handle(self, *args, **options):
+        stats = latency_stats(since=timedelta(minutes=options["minutes"]))
+
+        for status, count in stats["counts"].items():
+            self.stdout.write(f"{status:>8}: {count}")
+
+        for name in ("wait", "run"):
+            values = ", ".join(
+                f"{key} {value:.0f}ms" if value is not None else f"{key} -"
+                for key, value in stats[name].items()
+            )
+            self.stdout.write(f"{name:>8}: {values}")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from auctions.counters import rebuild_listing_counters
+from auctions.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized bid, watcher and comment counters on listings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "listing_ids",
+            nargs="*",
+            type=int,
+            help="Only rebuild these listings (default: all listings)",
+        )
+
+    def handle(self, *args, **options):
+        listings = Listing.objects.all()
+
+        if options["listing_ids"]:
+            listings = listings.filter(pk__in=options["listing_ids"])
+
+        updated = rebuild_listing_counters(listings)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt counters for {updated} listings.")
+        )
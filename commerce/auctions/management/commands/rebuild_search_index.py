@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of listing titles and descriptions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--optimize",
+            action="store_true",
+            help="Merge the index into a single b-tree after rebuilding it",
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("Full-text search requires an SQLite database.")
+
+        search.rebuild(optimize=options["optimize"])
+
+        self.stdout.write(self.style.SUCCESS("Rebuilt the search index."))
@@ -0,0 +1,73 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from auctions import jobs
+
+
+def _worker(poll_interval, burst, stop):
+    # Leave shutdown to the parent, which sets `stop` on SIGINT/SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    jobs.work(poll_interval=poll_interval, burst=burst, should_stop=stop.is_set)
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Number of worker processes (default: 1)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between checks of an empty queue (default: 1)",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for new jobs",
+        )
+
+    def handle(self, *args, **options):
+        requeued = jobs.requeue_stale()
+
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale jobs.")
+
+        # Forked workers must open their own database connections
+        connections.close_all()
+
+        stop = multiprocessing.Event()
+        workers = [
+            multiprocessing.Process(
+                target=_worker,
+                args=(options["poll_interval"], options["burst"], stop),
+                daemon=True,
+            )
+            for _ in range(options["processes"])
+        ]
+
+        def shutdown(signum, frame):
+            self.stdout.write("Finishing current jobs before exiting...")
+            stop.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        for worker in workers:
+            worker.start()
+
+        self.stdout.write(f"Started {len(workers)} worker processes.")
+
+        for worker in workers:
+            worker.join()
+
+        self.stdout.write(self.style.SUCCESS("Workers stopped."))
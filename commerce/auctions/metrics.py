@@ -0,0 +1,421 @@
+"""Counters, gauges and histograms, aggregated across worker processes
+
+Metrics are declared once at module level and updated where things happen.
+Their values are kept by the backend named by settings.AUCTIONS_METRICS_BACKEND:
+
+* InProcessBackend keeps them in memory, which is enough for a single process
+  such as runserver.
+* FileBackend has each process write its values into its own memory-mapped
+  file in AUCTIONS_METRICS_DIR, and sums the files of every process when they
+  are read, so whichever worker serves the metrics page reports them all.
+
+The metrics page renders them in the Prometheus text format.  Counters and
+histograms keep counting across worker restarts, as the files of exited
+workers are still summed, while gauges only count processes still running.
+"""
+
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+class InProcessBackend:
+    """Values kept in this process's memory"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def add(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+    def read(self):
+        """(pid, key, value) of every value stored"""
+        pid = os.getpid()
+
+        with self._lock:
+            return [(pid, key, value) for key, value in self._values.items()]
+
+
+class ValueFile:
+    """Float values by key in a memory-mapped file written by one process
+
+    The file starts with the number of bytes in use, followed by entries of a
+    key's length, the key and its value, each entry padded so the value is
+    8-byte aligned.  An entry is written before the length in use is raised
+    to include it, so readers never see a partial entry.
+    """
+
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self._file = open(path, "a+b")
+
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(self.INITIAL_SIZE)
+
+        self._map()
+        self._used = struct.unpack_from("Q", self._mmap, 0)[0] or 8
+        self._offsets = {
+            key: offset for key, offset, _ in self.entries(self._mmap, self._used)
+        }
+
+    def _map(self):
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+
+    @staticmethod
+    def entries(data, used):
+        """(key, value offset, value) of each entry in the bytes of a file"""
+        position = 8
+
+        while position < used:
+            (length,) = struct.unpack_from("I", data, position)
+            key = bytes(data[position + 4 : position + 4 + length]).decode()
+            offset = position + 4 + length
+            offset += -offset % 8
+            yield key, offset, struct.unpack_from("d", data, offset)[0]
+            position = offset + 8
+
+    @classmethod
+    def read(cls, path):
+        with open(path, "rb") as stream:
+            data = stream.read()
+
+        if len(data) < 8:
+            return []
+
+        return [
+            (key, value)
+            for key, _, value in cls.entries(data, struct.unpack_from("Q", data)[0])
+        ]
+
+    def _offset(self, key):
+        offset = self._offsets.get(key)
+
+        if offset is not None:
+            return offset
+
+        encoded = key.encode()
+        offset = self._used + 4 + len(encoded)
+        offset += -offset % 8
+
+        if offset + 8 > len(self._mmap):
+            self._mmap.close()
+            self._file.truncate(
+                max(2 * os.fstat(self._file.fileno()).st_size, offset + 8)
+            )
+            self._map()
+
+        struct.pack_into("I", self._mmap, self._used, len(encoded))
+        self._mmap[self._used + 4 : self._used + 4 + len(encoded)] = encoded
+        struct.pack_into("d", self._mmap, offset, 0.0)
+        self._used = offset + 8
+        struct.pack_into("Q", self._mmap, 0, self._used)
+        self._offsets[key] = offset
+
+        return offset
+
+    def add(self, key, amount):
+        offset = self._offset(key)
+        value = struct.unpack_from("d", self._mmap, offset)[0]
+        struct.pack_into("d", self._mmap, offset, value + amount)
+
+    def set(self, key, value):
+        struct.pack_into("d", self._mmap, self._offset(key), value)
+
+
+class FileBackend:
+    """Values in a memory-mapped file per process, summed over all of them
+
+    Each process opens its own file on first use, including processes forked
+    from one which already had, so there is never more than one writer per
+    file.  Clear the directory when deploying, before the workers start.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or settings.AUCTIONS_METRICS_DIR
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+
+    def _values(self):
+        if self._pid != os.getpid():
+            os.makedirs(self.directory, exist_ok=True)
+            self._pid = os.getpid()
+            self._file = ValueFile(
+                os.path.join(self.directory, f"metrics-{self._pid}.db")
+            )
+
+        return self._file
+
+    def add(self, key, amount):
+        with self._lock:
+            self._values().add(key, amount)
+
+    def set(self, key, value):
+        with self._lock:
+            self._values().set(key, value)
+
+    def read(self):
+        """(pid, key, value) of every value stored by any process"""
+        values = []
+
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.db")):
+            pid = int(os.path.basename(path)[len("metrics-") : -len(".db")])
+            values.extend((pid, key, value) for key, value in ValueFile.read(path))
+
+        return values
+
+
+class Registry:
+    """The metrics to expose, and the backend keeping their values"""
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._metrics = {}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            path = getattr(
+                settings,
+                "AUCTIONS_METRICS_BACKEND",
+                "auctions.metrics.InProcessBackend",
+            )
+            self._backend = import_string(path)()
+
+        return self._backend
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+
+        self._metrics[metric.name] = metric
+
+    def collect(self):
+        """Values of every series, summed over the processes which count
+
+        Returns:
+            dict: Value by metric name, then series name and labels
+        """
+        totals = {}
+        alive = {}
+
+        for pid, key, value in self.backend.read():
+            name, series, labels = json.loads(key)
+            metric = self._metrics.get(name)
+
+            if metric is None:
+                continue
+
+            if metric.kind == "gauge":
+                if pid not in alive:
+                    alive[pid] = _process_alive(pid)
+
+                if not alive[pid]:
+                    continue
+
+            samples = totals.setdefault(name, {})
+            sample = (series, tuple(map(tuple, labels)))
+            samples[sample] = samples.get(sample, 0.0) + value
+
+        return totals
+
+    def exposition(self):
+        """Every metric in the Prometheus text format"""
+        totals = self.collect()
+        lines = []
+
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.samples(totals.get(name, {})))
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+
+    return f"{{{pairs}}}"
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+
+    return repr(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=(), registry=registry):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.registry = registry
+        self._keys = {}
+        registry.register(self)
+
+    def _key(self, series, labels):
+        """Backend key of a series of this metric, with labels in name order"""
+        cache_key = (series, tuple(sorted(labels.items())))
+        key = self._keys.get(cache_key)
+
+        if key is None:
+            if set(labels) != set(self.label_names):
+                raise ValueError(
+                    f"{self.name} takes the labels {', '.join(self.label_names)}"
+                )
+
+            key = json.dumps(
+                [
+                    self.name,
+                    series,
+                    [[name, str(labels[name])] for name in self.label_names],
+                ]
+            )
+            self._keys[cache_key] = key
+
+        return key
+
+    def samples(self, totals):
+        if not totals and not self.label_names:
+            return [f"{self.name} 0"]
+
+        return [
+            f"{series}{_format_labels(labels)} {_format_value(value)}"
+            for (series, labels), value in sorted(totals.items())
+        ]
+
+
+class Counter(Metric):
+    """A count which only goes up, such as bids placed"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        self.registry.backend.add(self._key(self.name, labels), amount)
+
+
+class Gauge(Metric):
+    """A value which goes up and down, summed over the running processes"""
+
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        self.registry.backend.add(self._key(self.name, labels), amount)
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        self.registry.backend.set(self._key(self.name, labels), value)
+
+
+class Histogram(Metric):
+    """Counts of observations in fixed buckets, with their count and sum
+
+    Each observation is added to the first bucket it fits and to the sum only,
+    and the cumulative bucket counts and total count are worked out when the
+    metric is read.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets, labels=(), registry=registry):
+        super().__init__(name, documentation, labels, registry)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        bucket = self.buckets[bisect_left(self.buckets, value)]
+        backend = self.registry.backend
+        backend.add(self._key(f"{self.name}_bucket:{bucket!r}", labels), 1)
+        backend.add(self._key(f"{self.name}_sum", labels), value)
+
+    def samples(self, totals):
+        series_by_labels = {}
+
+        for (series, labels), value in totals.items():
+            series_by_labels.setdefault(labels, {})[series] = value
+
+        lines = []
+
+        for labels, values in sorted(series_by_labels.items()):
+            count = 0
+
+            for bound in self.buckets:
+                count += values.get(f"{self.name}_bucket:{bound!r}", 0)
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(labels + (('le', le),))} "
+                    f"{_format_value(count)}"
+                )
+
+            lines.append(
+                f"{self.name}_sum{_format_labels(labels)} "
+                f"{_format_value(values.get(f'{self.name}_sum', 0))}"
+            )
+            lines.append(
+                f"{self.name}_count{_format_labels(labels)} {_format_value(count)}"
+            )
+
+        return lines
+
+
+# Metrics of the auctions app
+
+BIDS = Counter("auctions_bids_total", "Bid attempts by outcome", labels=("outcome",))
+COMMENTS = Counter("auctions_comments_total", "Comments posted")
+LISTINGS_CREATED = Counter("auctions_listings_created_total", "Listings created")
+LISTINGS_CLOSED = Counter(
+    "auctions_listings_closed_total",
+    "Listings closed, by whether they were sold, cancelled or ended",
+    labels=("reason",),
+)
+REQUESTS_IN_PROGRESS = Gauge("auctions_requests_in_progress", "Requests being handled")
+VIEW_LATENCY = Histogram(
+    "auctions_view_seconds",
+    "Time to respond, by view",
+    LATENCY_BUCKETS,
+    labels=("view",),
+)
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:10
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Listing = apps.get_model("auctions", "Listing")
+    Bid = apps.get_model("auctions", "Bid")
+    Comment = apps.get_model("auctions", "Comment")
+
+    def count(model):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(listing=OuterRef("pk"))
+                .order_by()
+                .values("listing")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+
+    high_bids = Bid.objects.filter(listing=OuterRef("pk")).order_by("-price", "-pk")
+
+    Listing.objects.update(
+        bid_count=count(Bid),
+        comment_count=count(Comment),
+        watcher_count=count(Listing.watchers.through),
+        high_bid=Subquery(high_bids.values("pk")[:1]),
+        current_price=Coalesce(Subquery(high_bids.values("price")[:1]), F("price")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0008_alter_bid_price"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="bid_count",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Number of bids placed on this listing"
+            ),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="comment_count",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Number of comments posted on this listing"
+            ),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="current_price",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Current high bid, or the starting price when there are no bids",
+            ),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="high_bid",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Current high bid",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="auctions.bid",
+            ),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="watcher_count",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Number of users watching this listing"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="listing",
+            name="price",
+            field=models.PositiveIntegerField(
+                help_text="What would you like to start the item price at (Whole dollars only, maximum of 100000)",
+                validators=[
+                    django.core.validators.MaxValueValidator(100000),
+                    django.core.validators.MinValueValidator(1),
+                ],
+            ),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0009_listing_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bid",
+            index=models.Index(
+                fields=["listing", "price"], name="bid_listing_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="category",
+            index=models.Index(fields=["name"], name="category_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["listing", "created_at"], name="comment_listing_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["-created_at", "-id"],
+                name="listing_active_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["category", "-created_at", "-id"],
+                name="listing_active_category_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="listing_user_recent_idx"
+            ),
+        ),
+    ]
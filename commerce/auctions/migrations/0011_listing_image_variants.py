@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0010_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="image_variants",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Resized copies of the image, by variant, format and width",
+            ),
+        ),
+    ]
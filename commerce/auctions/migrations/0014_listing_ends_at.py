@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0013_listing_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="ends_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When should bidding close? (Leave blank to close the auction yourself)",
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("active", True), ("ends_at__isnull", False)),
+                fields=["ends_at"],
+                name="listing_active_ends_idx",
+            ),
+        ),
+    ]
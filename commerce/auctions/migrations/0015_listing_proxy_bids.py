@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def populate_proxies(apps, schema_editor):
+    # Existing high bidders lead with their visible bid as their maximum
+    Listing = apps.get_model("auctions", "Listing")
+    Bid = apps.get_model("auctions", "Bid")
+
+    Listing.objects.filter(high_bid__isnull=False).update(
+        proxy_bidder=Subquery(
+            Bid.objects.filter(pk=OuterRef("high_bid")).values("user")[:1]
+        ),
+        proxy_max=F("current_price"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0014_listing_ends_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="proxy_bidder",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Leading bidder, who is bid for automatically up to their maximum",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="proxy_max",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Leading bidder's maximum bid, hidden from other users",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(populate_proxies, migrations.RunPython.noop),
+    ]
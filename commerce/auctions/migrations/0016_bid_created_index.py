@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0015_listing_proxy_bids"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bid",
+            index=models.Index(fields=["created_at"], name="bid_created_idx"),
+        ),
+    ]
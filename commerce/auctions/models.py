@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 
@@ -21,6 +22,11 @@ class Listing(models.Model):
         help_text="Do you have a photo of your item?",
         blank=True,
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Resized copies of the image, by variant, format and width",
+    )
     price = models.PositiveIntegerField(
         validators=[
             MaxValueValidator(100000),
@@ -44,6 +50,11 @@ class Listing(models.Model):
         default=True, help_text="Is this item still eavailable?"
     )
     completed = models.BooleanField(default=False, help_text="Was this item sold?")
+    ends_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When should bidding close? (Leave blank to close the auction yourself)",
+    )
     watchers = models.ManyToManyField(
         User,
         related_name="watching",
@@ -58,9 +69,82 @@ class Listing(models.Model):
         help_text="When was this item listing last updated?",
     )
 
+    # Denormalized activity counters, kept current by the write views and
+    # rebuilt from the source tables by `manage.py rebuild_counters`
+    current_price = models.PositiveIntegerField(
+        default=0,
+        help_text="Current high bid, or the starting price when there are no bids",
+    )
+    high_bid = models.ForeignKey(
+        "Bid",
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        blank=True,
+        help_text="Current high bid",
+    )
+    proxy_bidder = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        blank=True,
+        help_text="Leading bidder, who is bid for automatically up to their maximum",
+    )
+    proxy_max = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Leading bidder's maximum bid, hidden from other users",
+    )
+    bid_count = models.PositiveIntegerField(
+        default=0, help_text="Number of bids placed on this listing"
+    )
+    watcher_count = models.PositiveIntegerField(
+        default=0, help_text="Number of users watching this listing"
+    )
+    comment_count = models.PositiveIntegerField(
+        default=0, help_text="Number of comments posted on this listing"
+    )
+
+    class Meta:
+        indexes = [
+            # Current listings, newest first, overall and per category
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(active=True),
+                name="listing_active_recent_idx",
+            ),
+            models.Index(
+                fields=["category", "-created_at", "-id"],
+                condition=models.Q(active=True),
+                name="listing_active_category_idx",
+            ),
+            # Auctions due to be closed by `manage.py close_expired_auctions`.
+            # Partial on active like the indexes above, as Django filters on a
+            # bare boolean column which SQLite can't match to a leading index
+            # column.
+            models.Index(
+                fields=["ends_at"],
+                condition=models.Q(active=True, ends_at__isnull=False),
+                name="listing_active_ends_idx",
+            ),
+            # A seller's own listings, newest first
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="listing_user_recent_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.id} - {self.title} (Active: {self.active})"  # type: ignore
 
+    def save(self, *args, **kwargs):
+        # New listings start out priced at their opening offer
+        if self._state.adding and not self.current_price:
+            self.current_price = self.price
+
+        super().save(*args, **kwargs)
+
 
 class Bid(models.Model):
     listing = models.ForeignKey(
@@ -87,6 +171,13 @@ class Bid(models.Model):
         help_text="Bid creation time",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["listing", "price"], name="bid_listing_price_idx"),
+            # Bid history exports, oldest first
+            models.Index(fields=["created_at"], name="bid_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user} @ {self.price}"
 
@@ -112,6 +203,13 @@ class Comment(models.Model):
         help_text="Comment creation time",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["listing", "created_at"], name="comment_listing_created_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user} ({self.created_at}): {self.text}"
 
@@ -133,5 +231,80 @@ class Category(models.Model):
         help_text="The 6 digit hex color code for the category background (https://htmlcolorcodes.com/)",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["name"], name="category_name_idx"),
+        ]
+
     def __str__(self):
         return self.name
+
+
+class Job(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    name = models.CharField(
+        max_length=100,
+        help_text="Name of the registered job function to run",
+    )
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Keyword arguments for the job function",
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+        help_text="Where the job is in its lifecycle",
+    )
+    attempts = models.PositiveIntegerField(
+        default=0, help_text="Number of times the job has been started"
+    )
+    max_attempts = models.PositiveIntegerField(
+        default=5, help_text="Number of attempts before the job is marked as failed"
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Earliest time the job may run",
+    )
+    locked_by = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Claim token of the worker running the job",
+    )
+    last_error = models.TextField(
+        blank=True, help_text="Traceback of the most recent failure"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="When was this job enqueued?",
+    )
+    started_at = models.DateTimeField(
+        null=True, blank=True, help_text="When did the latest attempt start?"
+    )
+    finished_at = models.DateTimeField(
+        null=True, blank=True, help_text="When did the job complete or fail?"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["run_at", "id"],
+                condition=models.Q(status="queued"),
+                name="job_queued_idx",
+            ),
+            models.Index(fields=["status", "started_at"], name="job_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.id} - {self.name} ({self.status})"  # type: ignore
@@ -0,0 +1,140 @@
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Q
+
+PAGE_SIZE = 24
+
+# Comments shown per page of a listing's thread
+COMMENT_PAGE_SIZE = 20
+
+NEXT = "n"
+PREVIOUS = "p"
+
+_SALT = "auctions.pagination"
+
+
+class KeysetPage:
+    """One page of rows and the cursors to the pages either side of it
+
+    Built by paginate() for keyset pages, and reused for ranked search results.
+    """
+
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def encode_cursor(row, direction):
+    """Create an opaque token pointing just past a row in the given direction
+
+    Rows may be model instances or dictionaries from values().
+    """
+    if isinstance(row, dict):
+        created_at, pk = row["created_at"], row["id"]
+    else:
+        created_at, pk = row.created_at, row.pk
+
+    return signing.dumps(
+        [created_at.isoformat(), pk, direction], salt=_SALT, compress=True
+    )
+
+
+def decode_cursor(cursor):
+    """Unpack a token from encode_cursor()
+
+    Returns:
+        tuple: (created_at, pk, direction), or None if the token is missing or invalid
+    """
+    if not cursor:
+        return None
+
+    try:
+        created_at, pk, direction = signing.loads(cursor, salt=_SALT)
+        return datetime.fromisoformat(created_at), int(pk), direction
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def _page_rows(queryset, position, per_page):
+    """Rows from a cursor position in fetch order, with one extra to detect more"""
+    if position is None:
+        return queryset.order_by("-created_at", "-pk")[: per_page + 1]
+
+    created_at, pk, direction = position
+
+    if direction == PREVIOUS:
+        return queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+        ).order_by("created_at", "pk")[: per_page + 1]
+
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+    ).order_by("-created_at", "-pk")[: per_page + 1]
+
+
+def _make_page(rows, position, per_page):
+    if position is None:
+        has_next, has_previous = len(rows) > per_page, False
+        items = rows[:per_page]
+
+    elif position[2] == PREVIOUS:
+        has_next, has_previous = True, len(rows) > per_page
+        items = rows[:per_page][::-1]
+
+    else:
+        has_next, has_previous = len(rows) > per_page, True
+        items = rows[:per_page]
+
+    if not items:
+        return KeysetPage(items)
+
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1], NEXT) if has_next else None,
+        previous_cursor=encode_cursor(items[0], PREVIOUS) if has_previous else None,
+    )
+
+
+def paginate(queryset, cursor=None, per_page=PAGE_SIZE):
+    """Fetch a page of rows ordered by (created_at, id), newest first
+
+    Rather than an OFFSET, each page continues from the (created_at, id) position
+    recorded in its cursor, so fetching a deep page costs the same index seek as
+    the first one.  An invalid or missing cursor returns the first page.
+
+    Args:
+        queryset (QuerySet): Rows to paginate, which must select created_at
+        cursor (str): Token from a previous page's next_cursor or previous_cursor
+        per_page (int): Rows per page (default: PAGE_SIZE)
+
+    Returns:
+        KeysetPage: Rows on the page and the cursors to either side of it
+    """
+    position = decode_cursor(cursor)
+    rows = list(_page_rows(queryset, position, per_page))
+
+    return _make_page(rows, position, per_page)
+
+
+async def apaginate(queryset, cursor=None, per_page=PAGE_SIZE):
+    """Async version of paginate()"""
+    position = decode_cursor(cursor)
+    rows = [row async for row in _page_rows(queryset, position, per_page)]
+
+    return _make_page(rows, position, per_page)
@@ -0,0 +1,65 @@
+from django.db.models import Exists, F, OuterRef, Subquery
+
+from .models import Comment, Listing
+
+# Columns rendered by partial_listing_cards.html
+CARD_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "image",
+    "image_variants",
+    "price",
+    "active",
+    "completed",
+    "bid_count",
+    "watcher_count",
+    "comment_count",
+    "created_at",
+    "updated_at",
+    "category__name",
+    "category__hex_color_code",
+)
+
+
+def card_listings(listings):
+    """Prepare a listing queryset for rendering as cards in a single query
+
+    The category is joined in and the selected columns are limited to what the
+    card template renders.  Bid, watcher and comment totals come from the
+    denormalized counters on Listing so no per-card aggregate queries are needed.
+
+    Args:
+        listings (QuerySet): Filtered listing queryset
+    """
+    return listings.select_related("category").only(*CARD_FIELDS)
+
+
+def listing_validator(listing_id, user):
+    """Select the columns a listing's detail page changes with, in a single query
+
+    Saving the listing moves updated_at, an accepted bid replaces high_bid, and
+    the newest comment is read through the (listing, created_at) index.  Whether
+    the user watches the listing is included because watching it does not save
+    the listing row.
+
+    Args:
+        listing_id (int): Listing shown on the page
+        user (User): User viewing the page, may be anonymous
+    """
+    latest_comment = Comment.objects.filter(listing=OuterRef("pk")).order_by(
+        "-created_at", "-id"
+    )
+
+    return Listing.objects.filter(pk=listing_id).values(
+        "updated_at",
+        "high_bid_id",
+        high_bid_at=F("high_bid__created_at"),
+        comment_id=Subquery(latest_comment.values("id")[:1]),
+        comment_at=Subquery(latest_comment.values("created_at")[:1]),
+        watching=Exists(
+            Listing.watchers.through.objects.filter(
+                listing=OuterRef("pk"), user_id=user.pk
+            )
+        ),
+    )
@@ -0,0 +1,205 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Listing
+from .pagination import PAGE_SIZE, KeysetPage
+from .queries import card_listings
+
+FTS_TABLE = "auctions_listing_fts"
+
+# Ranked results are paged by offset, so stop offering pages past this many
+MAX_RESULTS = PAGE_SIZE * 10
+
+# Weights given to matches in the title and description when ranking
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Search terms considered per query, the rest are ignored
+MAX_TERMS = 10
+
+# Only the newest this many matches are ranked.  bm25 has to score every match
+# before it can sort them, which for a word found in most listings means
+# reading most of the index, whereas the newest matches are read first.
+CANDIDATES = 2000
+
+# The index is an external-content FTS5 table: it stores only the tokens and
+# reads title and description back from the listing table by rowid.  Triggers
+# keep it in step with every write, including bulk_create() and update().
+# Prefix indexes on the first 2 and 3 characters keep prefix searches from
+# expanding into every matching term.
+SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description,
+        content='auctions_listing', content_rowid='id',
+        tokenize='porter unicode61', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON auctions_listing
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON auctions_listing
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF title, description ON auctions_listing
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+SEARCH_SQL = f"""
+    SELECT id FROM (
+        SELECT
+            listing.id,
+            bm25({FTS_TABLE}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}) AS score
+        FROM {FTS_TABLE}
+        JOIN auctions_listing AS listing ON listing.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s AND listing.active {{category}}
+        ORDER BY {FTS_TABLE}.rowid DESC
+        LIMIT {CANDIDATES}
+    )
+    ORDER BY score, id DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+def is_available(using=connection):
+    """Whether the database supports the FTS5 index (SQLite only)"""
+    return using.vendor == "sqlite"
+
+
+def install(using=connection):
+    """Create the search index and its triggers if they are missing
+
+    SQLite drops a table's triggers when Django rebuilds the table during a
+    migration, so this runs after every migrate.  Migration 0013 creates the
+    index with its own copy of this schema.
+    """
+    if not is_available(using):
+        return
+
+    with using.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+
+def rebuild(optimize=False, using=connection):
+    """Repopulate the search index from the listing table
+
+    Args:
+        optimize (bool): Also merge the index into a single b-tree afterwards
+    """
+    install(using)
+
+    with using.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+        if optimize:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 query matching listings containing every word
+
+    Words are quoted so that FTS5 operators and punctuation typed by users are
+    searched for rather than interpreted, and the last word matches as a prefix
+    so partially typed words still find results.
+
+    Returns:
+        str: The MATCH expression, or None if the query has no words
+    """
+    terms = re.findall(r"\w+", query)[:MAX_TERMS]
+
+    if not terms:
+        return None
+
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+def _ranked_ids(expression, category_id, limit, offset):
+    params = [expression]
+    category = ""
+
+    if category_id is not None:
+        category = "AND listing.category_id = %s"
+        params.append(category_id)
+
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_SQL.format(category=category), params + [limit, offset])
+
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_ids(query, category_id, limit, offset):
+    # Unranked substring search for databases without FTS5
+    listings = Listing.objects.filter(active=True)
+
+    for term in re.findall(r"\w+", query)[:MAX_TERMS]:
+        listings = listings.filter(
+            Q(title__icontains=term) | Q(description__icontains=term)
+        )
+
+    if category_id is not None:
+        listings = listings.filter(category_id=category_id)
+
+    return list(
+        listings.order_by("-created_at", "-id").values_list("id", flat=True)[
+            offset : offset + limit
+        ]
+    )
+
+
+def search_listings(query, category_id=None, cursor=None, per_page=PAGE_SIZE):
+    """Find active listings matching a search, best matches first
+
+    Matches are ranked by bm25 with title matches weighted above description
+    matches.  Words common enough to match more than CANDIDATES listings rank
+    only the newest of them.  Ranking orders by score rather than a column, so
+    pages are found by offset and results stop after MAX_RESULTS.
+
+    Args:
+        query (str): Words to search for
+        category_id (int): Only search this category (default: all categories)
+        cursor (str): Token from a previous page's next_cursor
+        per_page (int): Results per page (default: PAGE_SIZE)
+
+    Returns:
+        KeysetPage: Listings on the page, selected with queries.card_listings()
+    """
+    try:
+        offset = max(0, min(int(cursor or 0), MAX_RESULTS))
+    except ValueError:
+        offset = 0
+
+    limit = min(per_page, MAX_RESULTS - offset)
+    expression = match_expression(query)
+
+    if expression is None or limit <= 0:
+        return KeysetPage([])
+
+    if is_available():
+        ids = _ranked_ids(expression, category_id, limit + 1, offset)
+    else:
+        ids = _fallback_ids(query, category_id, limit + 1, offset)
+
+    listings = card_listings(Listing.objects.all()).in_bulk(ids[:limit])
+    items = [listings[pk] for pk in ids[:limit] if pk in listings]
+    has_next = len(ids) > limit and offset + limit < MAX_RESULTS
+
+    return KeysetPage(items, next_cursor=str(offset + limit) if has_next else None)
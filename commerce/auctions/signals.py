@@ -0,0 +1,102 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import search, tasks
+from .caching import category_registry, purge_category_pages
+from .images import delete_variants
+from .models import Category, Listing
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, **kwargs):
+    # Once committed, or a request meanwhile would cache the categories as they
+    # were under the new version, where they would stay
+    transaction.on_commit(category_registry.invalidate)
+
+
+@receiver(pre_save, sender=Listing)
+def remember_stored_listing(sender, instance, update_fields=None, **kwargs):
+    # The stored category and image, which a save may be replacing
+    instance._stored_category_id = None
+    instance._replaced_variants = None
+
+    if not instance.pk or not (
+        update_fields is None or {"category", "image"} & set(update_fields)
+    ):
+        return
+
+    stored = (
+        Listing.objects.filter(pk=instance.pk)
+        .values("category_id", "image", "image_variants")
+        .first()
+    )
+
+    if stored is None:
+        return
+
+    instance._stored_category_id = stored["category_id"]
+
+    if (stored["image"] or "") != (instance.image.name or ""):
+        instance._replaced_variants = stored["image_variants"]
+
+
+@receiver(post_save, sender=Listing)
+def replace_image_variants(sender, instance, created, **kwargs):
+    # Generate the variants of a new listing's image, however it was created.
+    # Variants of a replaced image would otherwise be shown instead of the new
+    # one, so clear them and generate the new image's.
+    if created:
+        if instance.image:
+            tasks.generate_image_variants.enqueue(listing_id=instance.pk)
+
+        return
+
+    replaced = getattr(instance, "_replaced_variants", None)
+
+    if replaced is None:
+        return
+
+    instance._replaced_variants = None
+    instance.image_variants = {}
+    Listing.objects.filter(pk=instance.pk).update(image_variants={})
+
+    if instance.image:
+        tasks.generate_image_variants.enqueue(listing_id=instance.pk)
+
+    transaction.on_commit(lambda: delete_variants(replaced))
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def purge_pages_of_listing(sender, instance, **kwargs):
+    # Saves made anywhere, such as the admin, purge the pages and the API's list
+    # ETags.  Only once committed, or a request meanwhile would cache the pages
+    # as they were under the new generation.
+    category_ids = {
+        instance.category_id,
+        getattr(instance, "_stored_category_id", None),
+    }
+    category_ids.discard(None)
+
+    transaction.on_commit(lambda: purge_category_pages(*category_ids))
+
+
+@receiver(post_delete, sender=Listing)
+def delete_image_variants(sender, instance, **kwargs):
+    # Only once committed, as a rollback would bring the listing back
+    variants = instance.image_variants
+
+    transaction.on_commit(lambda: delete_variants(variants))
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using, **kwargs):
+    # Restore the index triggers if a migration rebuilt the listing table
+    connection = connections[using]
+
+    if sender.name == "auctions" and search.FTS_TABLE in (
+        connection.introspection.table_names()
+    ):
+        search.install(connection)
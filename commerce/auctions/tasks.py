@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.urls import reverse
+
+from . import counters, images
+from .jobs import job
+from .models import Bid, Listing
+
+
+@job
+def generate_image_variants(listing_id):
+    listing = Listing.objects.filter(pk=listing_id).exclude(image="").first()
+
+    if listing:
+        images.generate_variants(listing)
+
+
+@job
+def rebuild_listing_counters(listing_ids=None):
+    listings = Listing.objects.all()
+
+    if listing_ids is not None:
+        listings = listings.filter(pk__in=listing_ids)
+
+    counters.rebuild_listing_counters(listings)
+
+
+@job
+def notify_new_high_bid(bid_id):
+    """Email the outbid bidder and the listing's watchers about a new high bid"""
+    bid = Bid.objects.select_related("listing").filter(pk=bid_id).first()
+
+    if not bid:
+        return
+
+    listing = bid.listing
+    outbid = (
+        Bid.objects.filter(listing=listing, price__lt=bid.price)
+        .order_by("-price")
+        .values_list("user__email", flat=True)
+        .first()
+    )
+    watchers = listing.watchers.exclude(pk=bid.user_id).values_list("email", flat=True)
+    recipients = {email for email in [outbid, *watchers] if email}
+    recipients.discard(bid.user.email)
+
+    path = reverse("view_listing", kwargs={"listing_id": listing.pk})
+    subject = f"New high bid on {listing.title}"
+    body = f"The current bid on {listing.title} is now ${bid.price}.\n\n{path}"
+
+    send_mass_mail(
+        [(subject, body, settings.DEFAULT_FROM_EMAIL, [email]) for email in recipients]
+    )
@@ -1,35 +1,42 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from django import template
 from django.contrib.humanize.templatetags import humanize
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
 from django.template.defaultfilters import stringfilter
+from django.utils.html import format_html, format_html_join
+
+from auctions.caching import render_cards
+from auctions.images import FORMATS, VARIANTS
 
 register = template.Library()
 
 
 @register.filter
-@stringfilter
-def nt_plus(timestamp: str, format: str = ""):
+def nt_plus(timestamp, format: str = ""):
     """Convert datetime to humanized format if within the past hour or no strftime is provided
 
     Args:
-        timestamp (str): ISO format datetime string
+        timestamp (datetime | str): Aware datetime, or an ISO format datetime string
         format (str): strftime format (default: "")
     """
-    try:
-        new_datetime = datetime.fromisoformat(timestamp)
-        days_since = datetime.now().astimezone() - new_datetime
-    except:
-        return timestamp
+    new_datetime = timestamp
 
-    if days_since.seconds < 60 * 60 or not format:
-        # if days_since.days == 0 or not format:
+    if not isinstance(new_datetime, datetime):
         try:
-            humanized = humanize.naturaltime(new_datetime)
-            return humanized.strip()
-        except:
+            new_datetime = datetime.fromisoformat(str(timestamp))
+        except ValueError:
             return timestamp
 
+    try:
+        time_since = datetime.now().astimezone() - new_datetime
+    except TypeError:
+        return timestamp
+
+    if time_since < timedelta(hours=1) or not format:
+        return humanize.naturaltime(new_datetime).strip()
+
     return new_datetime.strftime(format)
 
 
@@ -45,3 +52,63 @@ def return_max_value(first, second):
 @stringfilter
 def space_safe(words: str):
     return words.replace(" ", "_")
+
+
+@register.simple_tag(takes_context=True)
+def cached_cards(context, listings):
+    """Render listing cards through the per-card fragment cache
+
+    Async views render the cards ahead of time with arender_cards() and pass
+    them in as `rendered_cards`, keeping cache access out of the template.
+    """
+    if context.get("rendered_cards") is not None:
+        return context["rendered_cards"]
+
+    return render_cards(listings, context.get("default_image"))
+
+
+@register.simple_tag
+def listing_image(listing, variant, default_image="", **attributes):
+    """Render a listing's image, offering its resized variants through srcset
+
+    Listings without generated variants fall back to the original upload, or to
+    the default image when there is no upload.
+
+    Args:
+        listing (Listing): Listing to show the image of
+        variant (str): Name of the variant in auctions.images.VARIANTS
+        default_image (str): URL used when the listing has no image
+        attributes: Extra attributes for the <img> element
+    """
+    variants = (listing.image_variants or {}).get(variant)
+
+    if not variants:
+        src = listing.image.url if listing.image else default_image
+        return format_html('<img src="{}"{}>', src, flatatt(attributes))
+
+    sizes = VARIANTS[variant]["sizes"]
+    srcsets = {
+        extension: ", ".join(
+            f"{default_storage.url(name)} {width}w" for width, name in widths
+        )
+        for extension, widths in variants.items()
+    }
+    fallback = variants["jpeg"][0][1]
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (mime_type, srcsets[extension], sizes)
+            for extension, (_, mime_type, _) in FORMATS.items()
+            if extension != "jpeg" and extension in srcsets
+        ),
+    )
+
+    return format_html(
+        '<picture class="listing-image">{}<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        sources,
+        default_storage.url(fallback),
+        srcsets["jpeg"],
+        sizes,
+        flatatt(attributes),
+    )
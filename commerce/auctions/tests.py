@@ -1,3 +1,1845 @@
-from django.test import TestCase
+import asyncio
+import csv
+import importlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from benchmarks import views as view_benchmark
+from commerce import urls as root_urls
+
+from . import (
+    bidding,
+    events,
+    exports,
+    expiry,
+    imports,
+    instrumentation,
+    jobs,
+    load_data,
+    metrics,
+    search,
+    urls,
+)
+from .caching import category_registry, page_cache_stats, purge_category_pages
+from .counters import rebuild_listing_counters
+from .pagination import COMMENT_PAGE_SIZE, PAGE_SIZE, paginate
+from .models import Bid, Category, Comment, Job, Listing, User
+
+
+class AuctionTestCase(TestCase):
+    """Shared fixtures: a seller, a bidder and a category to list items in"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(
+            name="Toys",
+            icon="bi bi-controller",
+            description="Toys",
+            hex_color_code="1F84EB",
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def create_listing(self, **kwargs):
+        fields = {
+            "title": "Item",
+            "description": "An item",
+            "price": 10,
+            "user": self.seller,
+            "category": self.category,
+        }
+        fields.update(kwargs)
+
+        return Listing.objects.create(**fields)
+
+
+class ListingCounterTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.listing = self.create_listing()
+        self.client.force_login(self.bidder)
+
+    def test_new_listing_starts_at_opening_price(self):
+        self.assertEqual(self.listing.current_price, 10)
+        self.assertEqual(self.listing.bid_count, 0)
+        self.assertIsNone(self.listing.high_bid)
+
+    def test_write_views_update_counters(self):
+        self.client.post(
+            reverse("create_bid", args=[self.listing.pk]), {"bid_amount": 15}
+        )
+        self.client.post(
+            reverse("create_comment", args=[self.listing.pk]), {"comment": "Nice!"}
+        )
+        self.client.get(reverse("watch", args=[self.listing.pk]))
+
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 1)
+        self.assertEqual(self.listing.comment_count, 1)
+        self.assertEqual(self.listing.watcher_count, 1)
+        self.assertEqual(self.listing.current_price, 11)
+        self.assertEqual(self.listing.high_bid.user, self.bidder)
+
+        self.client.get(reverse("watch", args=[self.listing.pk]))
+
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.watcher_count, 0)
+
+    def test_rebuild_counters_command(self):
+        bid = Bid.objects.create(listing=self.listing, user=self.bidder, price=20)
+        Comment.objects.create(listing=self.listing, user=self.bidder, text="Hi")
+        self.listing.watchers.add(self.bidder)
+
+        call_command("rebuild_counters", stdout=StringIO())
+
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 1)
+        self.assertEqual(self.listing.comment_count, 1)
+        self.assertEqual(self.listing.watcher_count, 1)
+        self.assertEqual(self.listing.current_price, 20)
+        self.assertEqual(self.listing.high_bid, bid)
+
+
+class CardQueryCountTests(AuctionTestCase):
+    """Card pages must cost the same number of queries regardless of size"""
+
+    def assertCardPageQueries(self, url, expected, login=False):
+        if login:
+            self.client.force_login(self.seller)
+
+        for total in (1, 10):
+            Listing.objects.all().delete()
+            for i in range(total):
+                listing = self.create_listing(title=f"Item {i}")
+                listing.watchers.add(self.seller)
+
+            # Warm the category registry, but not the page cache, before counting
+            self.client.get(url)
+            purge_category_pages(self.category.pk)
+
+            with self.assertNumQueries(expected):
+                response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "card listing", count=total)
+
+    def test_index(self):
+        self.assertCardPageQueries(reverse("index"), 1)
+
+    def test_view_category(self):
+        self.assertCardPageQueries(reverse("view_category", args=[self.category.pk]), 1)
+
+    def test_view_watchlist(self):
+        self.assertCardPageQueries(reverse("view_watchlist"), 3, login=True)
+
+    def test_view_user_listings(self):
+        self.assertCardPageQueries(reverse("view_user_listings"), 3, login=True)
+
+
+class PlaceBidTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.listing = self.create_listing()
+
+    def test_accepts_higher_bid(self):
+        result = bidding.place_bid(self.listing.pk, self.bidder, 11)
+
+        self.assertTrue(result.accepted)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, 11)
+        self.assertEqual(self.listing.high_bid, result.bid)
+        self.assertEqual(self.listing.bid_count, 1)
+
+    def test_rejects_bid_not_above_current_price(self):
+        other = User.objects.create_user("other")
+        bidding.place_bid(self.listing.pk, self.bidder, 12)
+        bidding.place_bid(self.listing.pk, other, 12)
+        result = bidding.place_bid(self.listing.pk, other, 12)
+
+        self.assertEqual(result.reason, bidding.TOO_LOW)
+        self.assertEqual(result.minimum_bid, 13)
+        self.assertEqual(Bid.objects.count(), 2)
+
+    def test_proxy_bids_for_the_leader_up_to_their_maximum(self):
+        other = User.objects.create_user("other")
+
+        first = bidding.place_bid(self.listing.pk, self.bidder, 50)
+        self.assertEqual((first.reason, first.current_price), (bidding.ACCEPTED, 11))
+
+        # A lower maximum is answered by the leader's proxy one dollar above it
+        result = bidding.place_bid(self.listing.pk, other, 30)
+        self.assertEqual((result.reason, result.current_price), (bidding.OUTBID, 31))
+        self.assertEqual(result.bid.user, self.bidder)
+
+        # Raising the leader's own maximum places no visible bid
+        result = bidding.place_bid(self.listing.pk, self.bidder, 60)
+        self.assertEqual(result.reason, bidding.MAX_RAISED)
+
+        # A higher maximum takes the lead one dollar over the old maximum
+        result = bidding.place_bid(self.listing.pk, other, 100)
+        self.assertEqual((result.reason, result.current_price), (bidding.ACCEPTED, 61))
+
+        bids = list(
+            self.listing.bids.order_by("pk").values_list("user__username", "price")
+        )
+        self.assertEqual(
+            bids,
+            [
+                ("bidder", 11),
+                ("other", 30),
+                ("bidder", 31),
+                ("bidder", 60),
+                ("other", 61),
+            ],
+        )
+
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 5)
+        self.assertEqual(self.listing.high_bid, result.bid)
+        self.assertEqual(
+            (self.listing.proxy_bidder, self.listing.proxy_max), (other, 100)
+        )
+
+    def test_equal_maximums_go_to_the_earlier_bid(self):
+        other = User.objects.create_user("other")
+        bidding.place_bid(self.listing.pk, self.bidder, 40)
+
+        result = bidding.place_bid(self.listing.pk, other, 40)
+
+        self.assertEqual((result.reason, result.current_price), (bidding.OUTBID, 40))
+        self.assertEqual(result.bid.user, self.bidder)
+        self.assertEqual(Bid.objects.count(), 2)
+
+    def test_bid_queries_do_not_grow_with_history(self):
+        users = [User.objects.create_user(f"user{i}") for i in range(20)]
+
+        for i, user in enumerate(users[:-1]):
+            bidding.place_bid(self.listing.pk, user, 20 + i * 5)
+
+        # Savepoint, read, claim, both visible bids, high bid, release
+        with self.assertNumQueries(6):
+            bidding.place_bid(self.listing.pk, users[-1], 500)
+
+    def test_rejects_bid_on_own_listing(self):
+        result = bidding.place_bid(self.listing.pk, self.seller, 50)
+
+        self.assertEqual(result.reason, bidding.OWN_LISTING)
+
+    def test_rejects_bid_on_closed_listing(self):
+        self.listing.active = False
+        self.listing.save()
+
+        result = bidding.place_bid(self.listing.pk, self.bidder, 50)
+
+        self.assertEqual(result.reason, bidding.LISTING_CLOSED)
+
+    def test_rejects_bid_after_auction_ends(self):
+        self.listing.ends_at = timezone.now() - timedelta(seconds=1)
+        self.listing.save()
+
+        result = bidding.place_bid(self.listing.pk, self.bidder, 50)
+
+        self.assertEqual(result.reason, bidding.AUCTION_ENDED)
+        self.assertFalse(Bid.objects.exists())
+
+    def test_rejects_out_of_range_amount(self):
+        result = bidding.place_bid(self.listing.pk, self.bidder, 100001)
+
+        self.assertEqual(result.reason, bidding.INVALID_AMOUNT)
+        self.assertFalse(Bid.objects.exists())
+
+
+class KeysetPaginationTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.listings = [self.create_listing(title=f"Item {i}") for i in range(7)]
+        self.newest_first = [listing.pk for listing in reversed(self.listings)]
+
+    def test_pages_forward_and_back(self):
+        seen = []
+        page = paginate(Listing.objects.all(), per_page=3)
+        seen.extend(listing.pk for listing in page)
+
+        while page.has_next:
+            page = paginate(Listing.objects.all(), page.next_cursor, per_page=3)
+            seen.extend(listing.pk for listing in page)
+
+        self.assertEqual(seen, self.newest_first)
+        self.assertEqual([listing.pk for listing in page], self.newest_first[6:])
+
+        page = paginate(Listing.objects.all(), page.previous_cursor, per_page=3)
+        self.assertEqual([listing.pk for listing in page], self.newest_first[3:6])
+        self.assertTrue(page.has_previous)
+
+    def test_invalid_cursor_returns_first_page(self):
+        page = paginate(Listing.objects.all(), "not-a-cursor", per_page=3)
+
+        self.assertEqual([listing.pk for listing in page], self.newest_first[:3])
+        self.assertFalse(page.has_previous)
+
+    def test_card_fragment_endpoint(self):
+        page = paginate(Listing.objects.all(), per_page=3)
+        response = self.client.get(
+            reverse("listing_cards"), {"cursor": page.next_cursor}
+        )
+
+        self.assertNotContains(response, "<html")
+        self.assertContains(response, "card listing", count=7 - 3)
+
+
+class QueryPlanTests(AuctionTestCase):
+    """Every query a view runs must be answered from an index, not a table scan"""
+
+    def setUp(self):
+        super().setUp()
+        self.listing = self.create_listing()
+        self.closing = self.create_listing(title="Closing")
+        self.listing.watchers.add(self.bidder)
+        Comment.objects.create(listing=self.listing, user=self.bidder, text="Hi")
+        bidding.place_bid(self.closing.pk, self.bidder, 20)
+        rebuild_listing_counters()
+
+    def assertIndexedQueries(self, method, url, data=None, user=None):
+        if user:
+            self.client.force_login(user)
+
+        # Served from the page, card or category caches a view runs no queries
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as context:
+            getattr(self.client, method)(url, data)
+
+        statements = [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith(("SELECT", "UPDATE", "DELETE"))
+        ]
+        self.assertTrue(statements, f"No queries captured for {url}")
+
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+
+                for row in cursor.fetchall():
+                    detail = row[-1]
+                    self.assertFalse(
+                        detail.startswith("SCAN") and " USING " not in detail,
+                        f"{url} scans a table ({detail}): {sql}",
+                    )
+
+    def test_read_views(self):
+        urls = [
+            reverse("index"),
+            reverse("listing_cards"),
+            reverse("categories"),
+            reverse("view_category", args=[self.category.pk]),
+            reverse("category_cards", args=[self.category.pk]),
+            reverse("view_listing", args=[self.listing.pk]),
+            reverse("listing_comments", args=[self.listing.pk]),
+            reverse("api_listings"),
+            reverse("api_listing", args=[self.listing.pk]),
+        ]
+
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIndexedQueries("get", url)
+
+    def test_user_views(self):
+        for name, user in [
+            ("view_watchlist", self.bidder),
+            ("view_user_listings", self.seller),
+        ]:
+            with self.subTest(view=name):
+                self.assertIndexedQueries("get", reverse(name), user=user)
+
+    def test_write_views(self):
+        pk = self.listing.pk
+        requests = [
+            ("post", reverse("create_bid", args=[pk]), {"bid_amount": 15}, self.bidder),
+            (
+                "post",
+                reverse("create_comment", args=[pk]),
+                {"comment": "Hi"},
+                self.bidder,
+            ),
+            ("get", reverse("watch", args=[pk]), None, self.bidder),
+            ("get", reverse("cancel_listing", args=[pk]), None, self.seller),
+            ("get", reverse("accept_bid", args=[self.closing.pk]), None, self.seller),
+        ]
+
+        for method, url, data, user in requests:
+            with self.subTest(url=url):
+                self.assertIndexedQueries(method, url, data, user)
+
+
+class CategoryRegistryTests(AuctionTestCase):
+    def test_served_from_cache_after_first_load(self):
+        category_registry.all()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(list(category_registry.all()), [self.category])
+            self.assertEqual(category_registry.get(self.category.pk), self.category)
+
+    def test_invalidated_when_categories_change(self):
+        category_registry.all()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            books = Category.objects.create(
+                name="Books",
+                icon="bi bi-book",
+                description="Books",
+                hex_color_code="000000",
+            )
+
+        # Not before the change is committed, or the old list could be cached
+        # again under the new version
+        self.assertEqual(list(category_registry.all()), [self.category])
+
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(list(category_registry.all()), [books, self.category])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            books.delete()
+
+        self.assertEqual(list(category_registry.all()), [self.category])
+        self.assertIsNone(category_registry.get(books.pk))
+
+
+class CardFragmentCacheTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.listing = self.create_listing()
+        self.client.force_login(self.bidder)
+
+    def test_unchanged_cards_are_not_rendered_again(self):
+        response = self.client.get(reverse("index"))
+        self.assertTemplateUsed(response, "auctions/partial_card.html")
+
+        response = self.client.get(reverse("index"))
+        self.assertTemplateNotUsed(response, "auctions/partial_card.html")
+        self.assertContains(response, "card listing", count=1)
+
+    def test_activity_invalidates_card(self):
+        self.client.get(reverse("index"))
+        self.client.post(
+            reverse("create_comment", args=[self.listing.pk]), {"comment": "Hi"}
+        )
+
+        response = self.client.get(reverse("index"))
+        self.assertTemplateUsed(response, "auctions/partial_card.html")
+        self.assertContains(response, '<i class="bi bi-chat-left-fill"></i> 1')
+
+
+class AnonymousPageCacheTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.listing = self.create_listing()
+        self.urls = [
+            reverse("index"),
+            reverse("view_category", args=[self.category.pk]),
+        ]
+
+    def test_repeat_anonymous_requests_hit_cache(self):
+        for url in self.urls:
+            self.assertEqual(self.client.get(url)["X-Page-Cache"], "MISS")
+
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+
+            self.assertEqual(response["X-Page-Cache"], "HIT")
+            self.assertContains(response, "card listing", count=1)
+
+    def test_logged_in_requests_bypass_cache(self):
+        self.client.force_login(self.bidder)
+
+        for url in self.urls:
+            self.assertNotIn("X-Page-Cache", self.client.get(url))
+
+    def test_bid_purges_listing_pages(self):
+        other = Category.objects.create(
+            name="Other", icon="bi bi-box", description="", hex_color_code="000000"
+        )
+        other_url = reverse("view_category", args=[other.pk])
+
+        for url in self.urls + [other_url]:
+            self.client.get(url)
+
+        bidder = self.client_class()
+        bidder.force_login(self.bidder)
+        bidder.post(reverse("create_bid", args=[self.listing.pk]), {"bid_amount": 20})
+
+        for url in self.urls:
+            self.assertEqual(self.client.get(url)["X-Page-Cache"], "MISS")
+
+        self.assertEqual(self.client.get(other_url)["X-Page-Cache"], "HIT")
+        self.assertEqual(page_cache_stats(), {"hits": 1, "misses": 5})
+
+    def test_moving_a_listing_purges_both_categories(self):
+        other = Category.objects.create(
+            name="Other", icon="bi bi-box", description="", hex_color_code="000000"
+        )
+        urls = self.urls + [reverse("view_category", args=[other.pk])]
+
+        for url in urls:
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.category = other
+            self.listing.save()
+
+        for url in urls:
+            self.assertEqual(self.client.get(url)["X-Page-Cache"], "MISS")
+
+
+class ImageVariantTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def upload(self, size):
+        buffer = BytesIO()
+        Image.new("RGB", size, "red").save(buffer, "PNG")
+        self.client.force_login(self.seller)
+        self.client.post(
+            reverse("create_listing"),
+            {
+                "title": "Lamp",
+                "description": "A lamp",
+                "price": 10,
+                "category": self.category.pk,
+                "image": SimpleUploadedFile("lamp.png", buffer.getvalue()),
+            },
+        )
+        jobs.work(burst=True)
+
+        return Listing.objects.get()
+
+    def test_upload_generates_variants(self):
+        listing = self.upload((1200, 1200))
+
+        self.assertEqual(
+            [width for width, _ in listing.image_variants["card"]["webp"]], [350, 700]
+        )
+        self.assertEqual(
+            [width for width, _ in listing.image_variants["detail"]["jpeg"]],
+            [565, 1130],
+        )
+        for _, name in listing.image_variants["card"]["jpeg"]:
+            self.assertTrue(default_storage.exists(name))
+            self.assertEqual(Image.open(default_storage.open(name)).height % 450, 0)
+
+        response = self.client.get(reverse("view_listing", args=[listing.pk]))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, "lamp.detail-1130w.jpeg 1130w")
+
+    def test_small_images_are_not_upscaled(self):
+        listing = self.upload((400, 500))
+
+        self.assertEqual(len(listing.image_variants["card"]["jpeg"]), 1)
+
+    def test_backfill_command(self):
+        listing = self.upload((800, 800))
+        listing.image_variants = {}
+        listing.save()
+
+        call_command("generate_image_variants", stdout=StringIO())
+
+        listing.refresh_from_db()
+        self.assertIn("card", listing.image_variants)
+
+    def test_listings_created_with_an_image_get_variants(self):
+        buffer = BytesIO()
+        Image.new("RGB", (800, 800), "red").save(buffer, "PNG")
+        listing = self.create_listing(
+            image=SimpleUploadedFile("lamp.png", buffer.getvalue())
+        )
+        self.create_listing(title="No image")
+
+        self.assertEqual(
+            list(Job.objects.values_list("name", "payload")),
+            [("generate_image_variants", {"listing_id": listing.pk})],
+        )
+
+        jobs.work(burst=True)
+
+        listing.refresh_from_db()
+        self.assertIn("card", listing.image_variants)
+
+    def test_variants_are_deleted_once_the_deletion_commits(self):
+        listing = self.upload((800, 800))
+        names = [name for _, name in listing.image_variants["card"]["jpeg"]]
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            listing.delete()
+
+        self.assertTrue(all(default_storage.exists(name) for name in names))
+
+        for callback in callbacks:
+            callback()
+
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+    def test_replacing_the_image_replaces_its_variants(self):
+        listing = self.upload((800, 800))
+        old_names = [name for _, name in listing.image_variants["card"]["jpeg"]]
+        buffer = BytesIO()
+        Image.new("RGB", (800, 800), "blue").save(buffer, "PNG")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.image = SimpleUploadedFile("shade.png", buffer.getvalue())
+            listing.save()
+
+        self.assertEqual(Listing.objects.get().image_variants, {})
+        self.assertFalse(any(default_storage.exists(name) for name in old_names))
+
+        jobs.work(burst=True)
+
+        listing.refresh_from_db()
+        self.assertIn("shade.card-350w", listing.image_variants["card"]["jpeg"][0][1])
+
+
+@jobs.job
+def failing_job(message):
+    raise RuntimeError(message)
+
+
+class JobQueueTests(AuctionTestCase):
+    def test_bid_notifies_watchers_in_background(self):
+        listing = self.create_listing()
+        watcher = User.objects.create_user("watcher", "watcher@example.com", "pw")
+        listing.watchers.add(watcher)
+        self.client.force_login(self.bidder)
+
+        self.client.post(reverse("create_bid", args=[listing.pk]), {"bid_amount": 20})
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(jobs.work(burst=True), 1)
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertEqual(mail.outbox[0].to, ["watcher@example.com"])
+
+    def test_job_is_claimed_once(self):
+        failing_job.enqueue(message="boom")
+
+        self.assertIsNotNone(jobs.claim("first"))
+        self.assertIsNone(jobs.claim("second"))
+
+    def test_failed_job_is_retried_with_backoff_then_given_up(self):
+        job = failing_job.enqueue(message="boom", max_attempts=2)
+
+        jobs.run(jobs.claim("worker"))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_at, job.started_at)
+        self.assertIn("RuntimeError: boom", job.last_error)
+        self.assertIsNone(jobs.claim("worker"))
+
+        Job.objects.update(run_at=job.started_at)
+        jobs.run(jobs.claim("worker"))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+
+class EventHubTests(SimpleTestCase):
+    def test_dispatch_reaches_channel_subscribers_only(self):
+        hub = events.EventHub()
+
+        async def scenario():
+            async with hub.subscribe("listing:1") as first:
+                async with hub.subscribe("listing:2") as second:
+                    hub.dispatch("listing:1", {"type": "bid", "data": {}})
+                    received = await asyncio.wait_for(first.get(), 1)
+
+                    self.assertEqual(received["type"], "bid")
+                    self.assertTrue(second.empty())
+
+            self.assertEqual(hub.channels(), [])
+
+        asyncio.run(scenario())
+
+
+class CacheEventBackendTests(SimpleTestCase):
+    class Hub:
+        def __init__(self, channels=()):
+            self.subscribed = list(channels)
+            self.dispatched = []
+
+        def channels(self):
+            return self.subscribed
+
+        def dispatch(self, channel, event):
+            self.dispatched.append(event["type"])
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.channel = events.listing_channel(1)
+        self.hub = self.Hub([self.channel])
+        self.backend = events.CacheBackend(self.hub)
+        self.publisher = events.CacheBackend(self.Hub())
+        self.backend.poll_once()
+
+    def take_sequence(self):
+        # A publisher which has taken a sequence number but not stored its event
+        key = events.CacheBackend.SEQUENCE_KEY.format(channel=self.channel)
+        cache.add(key, 0, timeout=None)
+
+        return cache.incr(key)
+
+    def test_polls_events_from_other_processes(self):
+        self.publisher.publish(self.channel, {"type": "bid", "data": {}})
+        self.backend.publish(self.channel, {"type": "comment", "data": {}})
+        self.hub.dispatched.clear()
+
+        self.backend.poll_once()
+
+        self.assertEqual(self.hub.dispatched, ["bid"])
+
+    def test_waits_for_an_event_still_being_stored(self):
+        self.publisher.publish(self.channel, {"type": "bid", "data": {}})
+        sequence = self.take_sequence()
+        self.publisher.publish(self.channel, {"type": "close", "data": {}})
+
+        self.backend.poll_once()
+        self.assertEqual(self.hub.dispatched, ["bid"])
+
+        cache.set(
+            events.CacheBackend.EVENT_KEY.format(
+                channel=self.channel, sequence=sequence
+            ),
+            {"origin": self.publisher.origin, "event": {"type": "comment", "data": {}}},
+        )
+        self.backend.poll_once()
+
+        self.assertEqual(self.hub.dispatched, ["bid", "comment", "close"])
+
+    def test_skips_an_event_never_stored(self):
+        self.take_sequence()
+        self.publisher.publish(self.channel, {"type": "close", "data": {}})
+
+        self.backend.poll_once()
+        self.assertEqual(self.hub.dispatched, [])
+
+        self.backend.GAP_TIMEOUT = 0
+        self.backend.poll_once()
+
+        self.assertEqual(self.hub.dispatched, ["close"])
+
+
+class ListingEventStreamTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.listing = self.create_listing()
+
+    async def test_stream_sends_bids_until_close(self):
+        url = reverse("listing_events", args=[self.listing.pk])
+        response = await self.async_client.get(url)
+        stream = aiter(response.streaming_content)
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))
+
+        channel = events.listing_channel(self.listing.pk)
+        events.hub.dispatch(channel, {"type": "bid", "data": {"price": 11}})
+        events.hub.dispatch(channel, {"type": "close", "data": {"completed": True}})
+
+        self.assertEqual(await anext(stream), b'event: bid\ndata: {"price": 11}\n\n')
+        self.assertTrue((await anext(stream)).startswith(b"event: close"))
+        self.assertEqual([chunk async for chunk in stream], [])
+
+    def test_stream_is_declined_under_wsgi(self):
+        response = self.client.get(reverse("listing_events", args=[self.listing.pk]))
+
+        self.assertEqual(response.status_code, 204)
+
+    def test_listing_page_follows_events_only_with_async_views(self):
+        url = reverse("view_listing", args=[self.listing.pk])
+        events_url = reverse("listing_events", args=[self.listing.pk])
+
+        self.assertNotContains(self.client.get(url), events_url)
+
+        with self.settings(AUCTIONS_ASYNC_VIEWS=True):
+            self.assertContains(self.client.get(url), events_url)
+
+    def test_accepted_bid_is_published(self):
+        published = []
+        backend = events.get_backend()
+        original, backend.publish = backend.publish, lambda *args: published.append(
+            args
+        )
+        self.addCleanup(setattr, backend, "publish", original)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bidding.place_bid(self.listing.pk, self.bidder, 15)
+
+        self.assertEqual(published[0][0], events.listing_channel(self.listing.pk))
+        self.assertEqual(published[0][1]["data"]["price"], 11)
+
+
+class AsyncReadViewTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_async_views(True)
+        self.addCleanup(self.use_async_views, False)
+
+        self.listing = self.create_listing(title="Rocking horse")
+        Comment.objects.create(listing=self.listing, user=self.bidder, text="Neigh")
+
+    def use_async_views(self, enabled):
+        with self.settings(AUCTIONS_ASYNC_VIEWS=enabled):
+            importlib.reload(urls)
+            importlib.reload(root_urls)
+            clear_url_caches()
+
+    async def test_pages_are_served_by_async_views(self):
+        self.assertTrue(asyncio.iscoroutinefunction(resolve("/").func))
+
+        response = await self.async_client.get(reverse("index"))
+        self.assertContains(response, "Rocking horse")
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+
+        response = await self.async_client.get(reverse("index"))
+        self.assertEqual(response["X-Page-Cache"], "HIT")
+
+        url = reverse("view_category", args=[self.category.pk])
+        self.assertContains(await self.async_client.get(url), "Rocking horse")
+
+    async def test_view_listing_shows_comments(self):
+        await self.async_client.aforce_login(self.bidder)
+        url = reverse("view_listing", args=[self.listing.pk])
+
+        response = await self.async_client.get(url)
+
+        self.assertContains(response, "Neigh")
+        self.assertContains(response, "Watch this item?")
+
+        response = await self.async_client.get(
+            url, headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    async def test_queries_in_async_views_are_timed(self):
+        response = await self.async_client.get(
+            reverse("view_listing", args=[self.listing.pk])
+        )
+
+        queries = re.search(
+            r'sql;dur=[\d.]+;desc="(\d+) queries"', response["Server-Timing"]
+        )
+        self.assertGreater(int(queries.group(1)), 0)
+
+    async def test_watchlist_shows_watched_listings(self):
+        await self.listing.watchers.aadd(self.bidder)
+        await self.async_client.aforce_login(self.bidder)
+
+        response = await self.async_client.get(reverse("view_watchlist"))
+        self.assertContains(response, "Rocking horse")
+
+    async def test_missing_category_redirects_with_error(self):
+        await self.async_client.aforce_login(self.bidder)
+        url = reverse("view_category", args=[999])
+
+        response = await self.async_client.get(url, follow=True)
+
+        self.assertContains(response, "The provided category does not exist!")
+
+
+class SearchTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.lamp = self.create_listing(title="Brass lamp", description="Bright")
+        self.desk = self.create_listing(title="Oak desk", description="With a lamp")
+        self.closed = self.create_listing(title="Broken lamp", active=False)
+
+    def results(self, query, **kwargs):
+        return list(search.search_listings(query, **kwargs))
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.assertEqual(self.results("lamp"), [self.lamp, self.desk])
+
+    def test_category_filter(self):
+        other = Category.objects.create(
+            name="Office", icon="bi bi-briefcase", description="", hex_color_code="000"
+        )
+        Listing.objects.filter(pk=self.desk.pk).update(category=other)
+
+        self.assertEqual(self.results("lamp", category_id=other.pk), [self.desk])
+
+    def test_index_follows_updates_and_deletes(self):
+        Listing.objects.filter(pk=self.lamp.pk).update(title="Brass candlestick")
+        self.assertEqual(self.results("candle"), [self.lamp])
+        self.assertEqual(self.results("lamp"), [self.desk])
+
+        self.desk.delete()
+        self.assertEqual(self.results("lamp"), [])
+
+    def test_operators_in_queries_are_searched_as_words(self):
+        self.assertEqual(
+            search.match_expression('lamp" OR (desk'), '"lamp" "OR" "desk"*'
+        )
+        self.assertEqual(self.results('"brass" NEAR('), [])
+        self.assertEqual(self.results("  "), [])
+
+    def test_results_page_by_offset(self):
+        for i in range(3):
+            self.create_listing(title=f"Lamp {i}")
+
+        first = search.search_listings("lamp", per_page=2)
+        second = search.search_listings("lamp", cursor=first.next_cursor, per_page=2)
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(set(first) | set(second)), 4)
+
+    def test_rebuild_restores_the_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {search.FTS_TABLE}({search.FTS_TABLE}) "
+                "VALUES ('delete-all')"
+            )
+        self.assertEqual(self.results("lamp"), [])
+
+        call_command("rebuild_search_index", "--optimize", stdout=StringIO())
+
+        self.assertEqual(self.results("lamp"), [self.lamp, self.desk])
+
+    def test_search_view(self):
+        response = self.client.get(reverse("search"), {"q": "lamp"})
+
+        self.assertContains(response, "Brass lamp")
+        self.assertNotContains(response, "Broken lamp")
+
+
+class CommentThreadTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.listing = self.create_listing()
+        self.url = reverse("view_listing", args=[self.listing.pk])
+
+    def add_comments(self, count):
+        Comment.objects.bulk_create(
+            Comment(listing=self.listing, user=self.bidder, text=f"Comment {i}")
+            for i in range(count)
+        )
+
+    def test_queries_do_not_grow_with_comments(self):
+        self.add_comments(3)
+        self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+
+        self.add_comments(30)
+
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url)
+
+        self.assertEqual(len(few), len(many))
+
+    def test_newest_comments_shown_oldest_first(self):
+        self.add_comments(COMMENT_PAGE_SIZE + 5)
+
+        response = self.client.get(self.url)
+        content = response.content.decode()
+
+        self.assertEqual(len(response.context["comments"]), COMMENT_PAGE_SIZE)
+        self.assertNotIn("Comment 4<", content)
+        self.assertLess(content.index("Comment 5<"), content.index("Comment 24<"))
+        self.assertContains(response, "comment-pager")
+
+    def test_older_comments_fragment(self):
+        self.add_comments(COMMENT_PAGE_SIZE + 5)
+        cursor = self.client.get(self.url).context["comments"].next_cursor
+
+        response = self.client.get(
+            reverse("listing_comments", args=[self.listing.pk]), {"cursor": cursor}
+        )
+
+        self.assertEqual(len(response.context["comments"]), 5)
+        self.assertContains(response, "Comment 0<")
+        self.assertNotContains(response, "Comment 5<")
+        self.assertNotContains(response, "comment-pager")
+
+    def test_nt_plus_accepts_datetimes(self):
+        now = timezone.now()
+        recent = Template('{% load berube-tags %}{{ when|nt_plus:"%Y" }}')
+
+        self.assertEqual(recent.render(Context({"when": now})), "now")
+        self.assertEqual(
+            recent.render(Context({"when": now - timedelta(days=400)})),
+            str((now - timedelta(days=400)).year),
+        )
+
+
+class WatchlistTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.listings = [self.create_listing(title=f"Item {i}") for i in range(4)]
+        self.ids = [listing.pk for listing in self.listings]
+        self.client.force_login(self.bidder)
+
+    def post(self, body):
+        return self.client.post(
+            reverse("bulk_watch"), json.dumps(body), content_type="application/json"
+        )
+
+    def test_bulk_watch_and_unwatch(self):
+        updated_at = {l.pk: l.updated_at for l in Listing.objects.all()}
+
+        response = self.post({"watch": self.ids + [999]})
+        self.assertEqual(response.json(), {"watched": self.ids, "unwatched": []})
+
+        response = self.post({"watch": self.ids[:1], "unwatch": self.ids[2:]})
+        self.assertEqual(response.json(), {"watched": [], "unwatched": self.ids[2:]})
+
+        counts = dict(Listing.objects.values_list("pk", "watcher_count"))
+        self.assertEqual(counts, {pk: int(pk in self.ids[:2]) for pk in self.ids})
+        self.assertEqual(
+            {l.pk: l.updated_at for l in Listing.objects.all()}, updated_at
+        )
+
+    def test_bulk_watch_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as one:
+            self.post({"watch": self.ids[:1]})
+
+        with CaptureQueriesContext(connection) as many:
+            self.post({"watch": self.ids[1:]})
+
+        self.assertEqual(len(one), len(many))
+
+    def test_bulk_watch_rejects_bad_requests(self):
+        self.assertEqual(self.post({"watch": ["x"]}).status_code, 400)
+        self.assertEqual(self.post([1, 2]).status_code, 400)
+
+        self.client.logout()
+        self.assertEqual(self.post({"watch": self.ids}).status_code, 401)
+
+    def test_watchlist_lists_most_recently_watched_first(self):
+        self.post({"watch": [self.ids[2]]})
+        self.post({"watch": [self.ids[0]]})
+
+        response = self.client.get(reverse("view_watchlist"))
+
+        self.assertEqual(
+            [listing.pk for listing in response.context["listings"]],
+            [self.ids[0], self.ids[2]],
+        )
+
+
+class ApiTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.listing = self.create_listing(title="Kite")
+
+    def get(self, name, *args, **headers):
+        return self.client.get(reverse(name, args=args), headers=headers)
+
+    def test_listings_are_cursor_paginated(self):
+        for i in range(PAGE_SIZE):
+            self.create_listing(title=f"Item {i}")
+
+        first = self.get("api_listings").json()
+        response = self.client.get(
+            reverse("api_listings"), {"cursor": first["next_cursor"]}
+        )
+
+        self.assertEqual(len(first["results"]), PAGE_SIZE)
+        self.assertEqual(response.json()["results"][0]["title"], "Kite")
+        self.assertEqual(
+            response.json()["results"][0]["category"],
+            {"id": self.category.pk, "name": "Toys"},
+        )
+
+    def test_listing_detail_includes_high_bid(self):
+        self.assertIsNone(self.get("api_listing", self.listing.pk).json()["high_bid"])
+
+        bidding.place_bid(self.listing.pk, self.bidder, 25)
+        data = self.get("api_listing", self.listing.pk).json()
+
+        self.assertEqual(data["current_price"], 11)
+        self.assertNotIn("proxy_max", data)
+        self.assertEqual(data["high_bid"]["user"], "bidder")
+        self.assertEqual(data["seller"], "seller")
+        self.assertEqual(self.get("api_listing", 999).status_code, 404)
+
+    def test_repeat_polls_are_not_modified_until_a_change(self):
+        for name, args in (
+            ("api_listings", ()),
+            ("api_listing", (self.listing.pk,)),
+            ("api_categories", ()),
+        ):
+            with self.subTest(name=name):
+                etag = self.get(name, *args)["ETag"]
+
+                with self.assertNumQueries(1 if name == "api_listing" else 0):
+                    response = self.get(name, *args, if_none_match=etag)
+
+                self.assertEqual(response.status_code, 304)
+
+        etag = self.get("api_listing", self.listing.pk)["ETag"]
+        self.client.force_login(self.bidder)
+        self.client.post(
+            reverse("create_bid", args=[self.listing.pk]), {"bid_amount": 30}
+        )
+
+        response = self.get("api_listing", self.listing.pk, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_listings_etag_changes_with_new_listings(self):
+        etag = self.get("api_listings")["ETag"]
+
+        self.client.force_login(self.seller)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("create_listing"),
+                {
+                    "title": "Yo-yo",
+                    "description": "Spins",
+                    "price": 5,
+                    "category": self.category.pk,
+                },
+            )
+
+        response = self.get("api_listings", if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["title"], "Yo-yo")
+
+    def test_listings_etag_changes_when_a_listing_is_saved(self):
+        etag = self.get("api_listings")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.title = "Box kite"
+            self.listing.save()
+
+        response = self.get("api_listings", if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["title"], "Box kite")
+
+    def test_etags_change_when_the_category_is_renamed(self):
+        etags = {
+            name: self.get(name, *args)["ETag"]
+            for name, args in (
+                ("api_listings", ()),
+                ("api_listing", (self.listing.pk,)),
+            )
+        }
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Games"
+            self.category.save()
+
+        for name, args in (("api_listings", ()), ("api_listing", (self.listing.pk,))):
+            with self.subTest(name=name):
+                response = self.get(name, *args, if_none_match=etags[name])
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, "Games")
+
+
+class ConditionalListingTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.listing = self.create_listing(title="Kite")
+        self.url = reverse("view_listing", args=[self.listing.pk])
+
+    def get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.get()
+        self.assertIn("Cookie", response["Vary"])
+        self.assertIn("private", response["Cache-Control"])
+
+        with self.assertNumQueries(1):
+            response = self.get(if_none_match=response["ETag"])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        last_modified = self.get()["Last-Modified"]
+        response = self.get(if_modified_since=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_bids_comments_and_watches_change_the_etag(self):
+        self.client.force_login(self.bidder)
+        changes = [
+            lambda: bidding.place_bid(self.listing.pk, self.bidder, 20),
+            lambda: Comment.objects.create(
+                listing=self.listing, user=self.seller, text="Windy"
+            ),
+            lambda: self.client.get(reverse("watch", args=[self.listing.pk])),
+        ]
+
+        for change in changes:
+            etag = self.get()["ETag"]
+            change()
+
+            # Consume any flash message left by the change
+            self.get()
+            response = self.get(if_none_match=etag)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+
+    def test_etag_varies_by_user(self):
+        etag = self.get()["ETag"]
+        self.client.force_login(self.bidder)
+
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Last-Modified", response)
+
+        etag = response["ETag"]
+        self.client.force_login(self.seller)
+        self.assertEqual(self.get(if_none_match=etag).status_code, 200)
+
+    def test_pages_with_flash_messages_are_not_validated(self):
+        self.client.force_login(self.bidder)
+        response = self.client.post(
+            reverse("create_bid", args=[self.listing.pk]),
+            {"bid_amount": 20},
+            follow=True,
+        )
+
+        self.assertNotIn("ETag", response)
+
+
+class AuctionExpiryTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.ended = [
+            self.create_listing(title=f"Ended {i}", ends_at=now - timedelta(minutes=i))
+            for i in range(5)
+        ]
+        self.running = self.create_listing(ends_at=now + timedelta(days=1))
+        self.open_ended = self.create_listing()
+
+    def end_after_bid(self, listing, amount):
+        bidding.place_bid(listing.pk, self.bidder, amount)
+        Listing.objects.filter(pk=listing.pk).update(ends_at=timezone.now())
+
+    def test_closes_ended_auctions_in_batches(self):
+        sold = self.create_listing(ends_at=timezone.now() + timedelta(minutes=1))
+        self.end_after_bid(sold, 20)
+
+        self.assertEqual(expiry.close_expired(batch_size=2), 6)
+
+        self.assertFalse(Listing.objects.filter(title__startswith="Ended", active=True))
+        self.assertFalse(Listing.objects.filter(completed=True).exclude(pk=sold.pk))
+        self.assertTrue(Listing.objects.get(pk=sold.pk).completed)
+        self.assertTrue(Listing.objects.get(pk=self.running.pk).active)
+        self.assertTrue(Listing.objects.get(pk=self.open_ended.pk).active)
+        self.assertEqual(expiry.close_expired(), 0)
+
+    def test_batch_takes_one_update_through_the_index(self):
+        with CaptureQueriesContext(connection) as context:
+            expiry.close_batch()
+
+        statements = [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith(("SELECT", "UPDATE"))
+        ]
+        # Selecting the due listings, closing them and reading back those closed
+        self.assertEqual(len(statements), 3)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {statements[0]}")
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+
+        self.assertIn("listing_active_ends_idx", plan)
+
+    def test_only_listings_the_update_closed_are_reported(self):
+        cancelled = self.ended[0]
+        pending = [cancelled.pk]
+
+        def cancel_first(execute, sql, params, many, context):
+            # The owner cancels a listing after it was selected to close
+            if sql.startswith("UPDATE") and pending:
+                Listing.objects.filter(pk=pending.pop()).update(active=False)
+
+            return execute(sql, params, many, context)
+
+        def ended_count():
+            series = metrics.registry.collect().get("auctions_listings_closed_total")
+
+            return (series or {}).get(
+                ("auctions_listings_closed_total", (("reason", "ended"),)), 0
+            )
+
+        published = []
+        backend = events.get_backend()
+        original, backend.publish = backend.publish, lambda *args: published.append(
+            args[0]
+        )
+        self.addCleanup(setattr, backend, "publish", original)
+        before = ended_count()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with connection.execute_wrapper(cancel_first):
+                self.assertEqual(expiry.close_batch(), 4)
+
+        self.assertEqual(len(published), 4)
+        self.assertNotIn(events.listing_channel(cancelled.pk), published)
+        self.assertEqual(ended_count() - before, 4)
+
+    def test_closing_purges_cached_pages(self):
+        self.client.get(reverse("index"))
+        expiry.close_expired()
+
+        response = self.client.get(reverse("index"))
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+        self.assertNotContains(response, "Ended 0")
+
+    def test_command(self):
+        out = StringIO()
+        call_command("close_expired_auctions", stdout=out)
+
+        self.assertIn("Closed 5 ended auctions.", out.getvalue())
+
+    def test_listing_form_sets_end_time(self):
+        self.client.force_login(self.seller)
+        self.client.post(
+            reverse("create_listing"),
+            {
+                "title": "Kite",
+                "description": "Flies",
+                "price": 5,
+                "category": self.category.pk,
+                "duration": 3,
+            },
+        )
+
+        ends_at = Listing.objects.get(title="Kite").ends_at
+        self.assertAlmostEqual(
+            ends_at, timezone.now() + timedelta(days=3), delta=timedelta(minutes=1)
+        )
+
+
+class BidExportTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_category = Category.objects.create(
+            name="Books",
+            icon="bi bi-book",
+            description="Books",
+            hex_color_code="000000",
+        )
+        self.toy = self.create_listing(title="Kite")
+        self.book = self.create_listing(title="Atlas", category=self.other_category)
+        bidding.place_bid(self.toy.pk, self.bidder, 20)
+        bidding.place_bid(self.book.pk, self.bidder, 30)
+        Listing.objects.filter(pk=self.toy.pk).update(active=False, completed=True)
+
+    def export(self, *args):
+        out = StringIO()
+        call_command("export_bids", *args, stdout=out, stderr=StringIO())
+
+        return out.getvalue()
+
+    def test_csv_export_filtered_by_category(self):
+        rows = list(csv.DictReader(StringIO(self.export("--category", "books"))))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["listing_title"], "Atlas")
+        self.assertEqual(rows[0]["bidder"], "bidder")
+        self.assertEqual(rows[0]["seller"], "seller")
+        self.assertEqual(rows[0]["category"], "Books")
+
+    def test_jsonl_sales_export(self):
+        lines = self.export("--format", "jsonl", "--sales").splitlines()
+
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["listing_title"], "Kite")
+
+    def test_date_range(self):
+        tomorrow = (timezone.now() + timedelta(days=1)).date().isoformat()
+
+        self.assertEqual(len(self.export("--until", tomorrow).splitlines()), 3)
+        self.assertEqual(len(self.export("--since", tomorrow).splitlines()), 1)
+
+    def test_rows_are_read_in_chunks(self):
+        chunks = list(exports.stream(exports.bid_rows(), "jsonl", chunk_size=1))
+
+        self.assertEqual(len(chunks), 2)
+
+    def test_endpoint_is_staff_only(self):
+        url = reverse("export_bids")
+        self.client.force_login(self.bidder)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.bidder.is_staff = True
+        self.bidder.save()
+        response = self.client.get(url, {"format": "jsonl", "category": "Toys"})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["price"] for line in lines], [11])
+
+        response = self.client.get(url, {"category": "Garden"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_reads_bids_through_the_created_at_index(self):
+        sql = str(exports.bid_rows().query)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+
+        self.assertIn("bid_created_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class ListingImportTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.settings_override = override_settings(MEDIA_ROOT=self.directory)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.images = os.path.join(self.directory, "catalogue")
+        os.mkdir(self.images)
+        Image.new("RGB", (40, 40), "red").save(os.path.join(self.images, "kite.png"))
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+
+        with open(path, "w", newline="") as catalogue:
+            catalogue.write(content)
+
+        return path
+
+    def run_import(self, path, *args):
+        out = StringIO()
+        call_command(
+            "import_listings",
+            path,
+            "--seller",
+            "seller",
+            "--images",
+            self.images,
+            *args,
+            stdout=out,
+            stderr=StringIO(),
+        )
+
+        return out.getvalue()
+
+    def test_csv_import_rejects_bad_rows_to_side_file(self):
+        path = self.write(
+            "catalogue.csv",
+            "title,description,category,price,image,duration\n"
+            "Kite,Flies,toys,15,kite.png,3\n"
+            "Yo-yo,Spins,Toys,5,,\n"
+            "Rake,Rakes,Garden,5,,\n"
+            "Ball,Bounces,Toys,0,,\n"
+            "Drum,Loud,Toys,5,drum.png,\n",
+        )
+
+        output = self.run_import(path, "--batch-size", "1")
+
+        self.assertIn("Imported 2 listings", output)
+        self.assertIn("Rejected 3 rows", output)
+
+        kite = Listing.objects.get(title="Kite")
+        self.assertEqual((kite.user, kite.category), (self.seller, self.category))
+        self.assertEqual(kite.current_price, 15)
+        self.assertTrue(kite.image.name.startswith("images/kite"))
+        self.assertIsNotNone(kite.ends_at)
+        self.assertEqual(Job.objects.get().payload, {"listing_id": kite.pk})
+        self.assertEqual(search.search_listings("kite").items, [kite])
+
+        with open(os.path.join(self.directory, "catalogue.rejected.csv")) as rejects:
+            rows = list(csv.DictReader(rejects))
+
+        self.assertEqual([row["line"] for row in rows], ["4", "5", "6"])
+        self.assertEqual(rows[0]["error"], "Unknown category: Garden")
+        self.assertIn("price", rows[1]["error"])
+        self.assertEqual(rows[2]["error"], "Image not found: drum.png")
+
+    def test_rejects_images_which_are_not_images(self):
+        with open(os.path.join(self.images, "notes.png"), "w") as notes:
+            notes.write("Not a picture")
+
+        importer = imports.ListingImporter(self.seller, image_dir=self.images)
+        rejected = []
+        row = {
+            "title": "Kite",
+            "description": "Flies",
+            "category": "Toys",
+            "price": 15,
+            "image": "notes.png",
+        }
+
+        result = importer.run([(2, row)], reject=lambda *args: rejected.append(args))
+
+        self.assertEqual((result.imported, result.rejected), (0, 1))
+        self.assertTrue(rejected[0][2].startswith("image: Upload a valid image."))
+        self.assertFalse(default_storage.exists("images/notes.png"))
+        self.assertFalse(Job.objects.exists())
+
+    def test_jsonl_import(self):
+        path = self.write(
+            "catalogue.jsonl",
+            '{"title": "Kite", "description": "Flies", "category": "Toys", "price": 15}\n'
+            "not json\n",
+        )
+
+        output = self.run_import(path)
+
+        self.assertIn("Imported 1 listings", output)
+        self.assertIn("Rejected 1 rows", output)
+
+        with open(os.path.join(self.directory, "catalogue.rejected.jsonl")) as rejects:
+            self.assertEqual(
+                json.loads(rejects.read()), {"line": 2, "error": "Not a valid row"}
+            )
+
+    def test_inserts_take_one_query_per_batch(self):
+        rows = [
+            (
+                number,
+                {
+                    "title": f"Item {number}",
+                    "description": "An item",
+                    "category": "Toys",
+                    "price": 5,
+                },
+            )
+            for number in range(10)
+        ]
+        importer = imports.ListingImporter(self.seller, batch_size=5)
+
+        # Savepoint, insert and release per batch
+        with self.assertNumQueries(6):
+            result = importer.run(rows)
+
+        self.assertEqual(result.imported, 10)
+
+
+class LoadDataTests(AuctionTestCase):
+    SIZES = load_data.Sizes(
+        users=20, categories=3, listings=40, bids=600, comments=50, watches=60
+    )
+
+    def generate(self, seed=1):
+        load_data.Generator(self.SIZES, seed).run()
+
+    def test_generates_requested_activity(self):
+        call_command(
+            "generate_load_data",
+            "--users=20",
+            "--categories=3",
+            "--listings=40",
+            "--bids=600",
+            "--comments=50",
+            "--watches=60",
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+
+        listings = Listing.objects.exclude(user=self.seller)
+        self.assertEqual(listings.count(), 40)
+        self.assertEqual(Bid.objects.count(), 600)
+        self.assertEqual(Comment.objects.count(), 50)
+        self.assertEqual(Listing.watchers.through.objects.count(), 60)
+        # Skewed towards a few hot listings
+        counts = sorted(listings.values_list("bid_count", flat=True), reverse=True)
+        self.assertGreater(sum(counts[:4]), 300)
+        self.assertFalse(Bid.objects.filter(user=F("listing__user")).exists())
+        self.assertTrue(list(search.search_listings("vintage")))
+
+    def test_counters_match_the_generated_rows(self):
+        self.generate()
+        fields = [
+            "current_price",
+            "high_bid",
+            "proxy_bidder",
+            "proxy_max",
+            "bid_count",
+            "comment_count",
+            "watcher_count",
+        ]
+        generated = list(Listing.objects.order_by("pk").values_list(*fields))
+
+        rebuild_listing_counters()
+
+        self.assertEqual(
+            list(Listing.objects.order_by("pk").values_list(*fields)), generated
+        )
+        self.assertFalse(
+            Listing.objects.filter(active=False, bid_count__gt=0, completed=False)
+        )
+
+    def test_same_seed_generates_same_data(self):
+        def snapshot(listings):
+            return [
+                (listing.title, listing.price, listing.current_price, listing.bid_count)
+                for listing in listings
+            ]
+
+        self.generate(seed=1)
+        first = snapshot(Listing.objects.order_by("pk"))
+        self.generate(seed=1)
+        second = snapshot(Listing.objects.order_by("pk")[len(first) :])
+        self.generate(seed=2)
+        third = snapshot(Listing.objects.order_by("pk")[2 * len(first) :])
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+
+
+class RequestTimingTests(AuctionTestCase):
+    def test_server_timing_reports_queries_render_and_view(self):
+        listing = self.create_listing()
+        self.client.force_login(self.bidder)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("view_listing", args=[listing.pk]))
+
+        timing = dict(
+            re.match(r"(\w+);dur=([\d.]+)", metric.strip()).groups()
+            for metric in response["Server-Timing"].split(",")
+        )
+        self.assertEqual(set(timing), {"sql", "render", "view"})
+        self.assertIn(f'desc="{len(queries)} queries"', response["Server-Timing"])
+        self.assertGreater(float(timing["render"]), 0)
+        self.assertGreaterEqual(float(timing["view"]), float(timing["render"]))
+
+    @override_settings(AUCTIONS_SERVER_TIMING=False)
+    def test_header_can_be_disabled(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse("index")))
+
+    @override_settings(AUCTIONS_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_statements(self):
+        self.client.force_login(self.bidder)
+
+        with self.assertLogs("auctions.instrumentation", "WARNING") as logs:
+            self.client.get(reverse("index"))
+
+        self.assertIn("Slow request GET /:", logs.output[0])
+        self.assertIn('FROM "auctions_listing"', logs.output[0])
+
+    def test_statements_are_grouped_by_shape(self):
+        timings = instrumentation.RequestTimings()
+        timings.add_query('SELECT * FROM "bid" WHERE "id" IN (%s, %s)', 0.001)
+        timings.add_query('SELECT * FROM "bid" WHERE "id" IN (%s, %s, %s)', 0.002)
+        timings.add_query("SELECT * FROM \"user\" WHERE name = 'a' LIMIT 21", 0.001)
+
+        self.assertEqual(
+            timings.top_statements(),
+            [
+                ('SELECT * FROM "bid" WHERE "id" IN (...)', 2, 0.003),
+                ('SELECT * FROM "user" WHERE name = ? LIMIT ?', 1, 0.001),
+            ],
+        )
+
+
+class MetricsTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.registry = metrics.Registry(metrics.InProcessBackend())
+
+    def test_exposition_in_prometheus_text_format(self):
+        bids = metrics.Counter(
+            "bids_total", "Bids", labels=("outcome",), registry=self.registry
+        )
+        metrics.Counter("comments_total", "Comments", registry=self.registry)
+        queued = metrics.Gauge("queued", "Queued jobs", registry=self.registry)
+        latency = metrics.Histogram(
+            "view_seconds",
+            "Latency",
+            (0.1, 1),
+            labels=("view",),
+            registry=self.registry,
+        )
+
+        bids.inc(outcome="accepted")
+        bids.inc(2, outcome="outbid")
+        queued.set(3)
+        queued.dec()
+        latency.observe(0.05, view="index")
+        latency.observe(0.5, view="index")
+        latency.observe(7, view="index")
+
+        self.assertEqual(
+            self.registry.exposition(),
+            "# HELP bids_total Bids\n"
+            "# TYPE bids_total counter\n"
+            'bids_total{outcome="accepted"} 1\n'
+            'bids_total{outcome="outbid"} 2\n'
+            "# HELP comments_total Comments\n"
+            "# TYPE comments_total counter\n"
+            "comments_total 0\n"
+            "# HELP queued Queued jobs\n"
+            "# TYPE queued gauge\n"
+            "queued 2\n"
+            "# HELP view_seconds Latency\n"
+            "# TYPE view_seconds histogram\n"
+            'view_seconds_bucket{view="index",le="0.1"} 1\n'
+            'view_seconds_bucket{view="index",le="1"} 2\n'
+            'view_seconds_bucket{view="index",le="+Inf"} 3\n'
+            'view_seconds_sum{view="index"} 7.55\n'
+            'view_seconds_count{view="index"} 3\n',
+        )
+
+        with self.assertRaises(ValueError):
+            bids.inc()
+
+    def test_file_backend_sums_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry = metrics.Registry(metrics.FileBackend(directory))
+        bids = metrics.Counter("bids_total", "Bids", registry=registry)
+        busy = metrics.Gauge("busy", "Busy workers", registry=registry)
+
+        def worker():
+            bids.inc(2)
+            busy.inc()
+
+        # A worker which has exited, its counts remain but not its gauges
+        process = multiprocessing.get_context("fork").Process(target=worker)
+        process.start()
+        process.join()
+
+        bids.inc()
+        busy.inc()
+        # Entries past the initial size of the file
+        for number in range(2000):
+            metrics.Counter(f"filler_{number}", "", registry=registry).inc()
+
+        self.assertEqual(len(os.listdir(directory)), 2)
+        self.assertIn("bids_total 3\n", registry.exposition())
+        self.assertIn("busy 1\n", registry.exposition())
+        self.assertIn("filler_1999 1\n", registry.exposition())
+
+    def test_views_are_counted_and_exposed_to_staff(self):
+        listing = self.create_listing()
+        self.client.force_login(self.bidder)
+        self.client.post(reverse("create_bid", args=[listing.pk]), {"bid_amount": 20})
+        self.client.post(
+            reverse("create_comment", args=[listing.pk]), {"comment": "Hi"}
+        )
+
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 302)
+
+        self.bidder.is_staff = True
+        self.bidder.save()
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(
+            response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8"
+        )
+        text = response.content.decode()
+        self.assertRegex(text, r'auctions_bids_total\{outcome="accepted"\} [1-9]')
+        self.assertRegex(text, r"auctions_comments_total [1-9]")
+        self.assertRegex(
+            text, r'auctions_view_seconds_count\{view="create_bid"\} [1-9]'
+        )
+        self.assertIn("auctions_requests_in_progress 1\n", text)
+
+
+class ViewBenchmarkGateTests(SimpleTestCase):
+    def result(self, p50=10.0, p95=20.0, queries=3):
+        return {
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p95,
+            "queries": queries,
+            "sql_ms": 1.0,
+        }
+
+    def test_summarize(self):
+        summary = view_benchmark.summarize(
+            [0.001 * number for number in range(1, 101)],
+            [2, 3, 2],
+            [0.001, 0.002, 0.003],
+            [200, 302, 200],
+        )
+
+        self.assertEqual(summary["requests"], 100)
+        self.assertAlmostEqual(summary["p50_ms"], 50.5)
+        self.assertAlmostEqual(summary["p95_ms"], 95.95)
+        self.assertEqual(summary["queries"], 3)
+        self.assertEqual(summary["sql_ms"], 2.0)
+        self.assertEqual(summary["statuses"], {"200": 2, "302": 1})
+
+    def test_budgets_merge_over_the_default(self):
+        budgets = {
+            "default": {"p95_ms": 50, "queries": 10},
+            "login": {"p95_ms": 1000},
+            "index": {"queries": 2},
+        }
+        results = {
+            "login": self.result(p95=400, queries=4),
+            "index": self.result(p95=60, queries=3),
+        }
+
+        self.assertEqual(
+            view_benchmark.budget_failures(results, budgets),
+            [
+                "index: p95_ms 60 over budget of 50",
+                "index: queries 3 over budget of 2",
+            ],
+        )
+
+    def test_latency_regresses_past_the_tolerance_and_noise_floor(self):
+        baseline = {"index": self.result(p50=10.0, p95=20.0), "tiny": self.result()}
+        baseline["tiny"].update(p50_ms=0.4, p95_ms=0.5)
+        results = {
+            "index": self.result(p50=12.4, p95=25.5),
+            # Three times slower, but under NOISE_MS slower
+            "tiny": self.result(),
+        }
+        results["tiny"].update(p50_ms=1.2, p95_ms=1.5)
+
+        self.assertEqual(
+            view_benchmark.regressions(results, baseline, tolerance=0.25),
+            ["index: p95_ms 25.5, up from 20.0"],
+        )
+
+    def test_any_extra_query_regresses(self):
+        baseline = {"index": self.result(queries=3)}
+
+        self.assertEqual(
+            view_benchmark.regressions(
+                {"index": self.result(queries=4)}, baseline, 0.25
+            ),
+            ["index: 4 queries, up from 3"],
+        )
+        self.assertEqual(
+            view_benchmark.regressions({"new": self.result()}, baseline, 0.25), []
+        )
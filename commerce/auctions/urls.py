@@ -2,24 +2,55 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path
 
-from . import views
+from . import api, views
+
+# The read-only pages have async versions for ASGI deployments
+if settings.AUCTIONS_ASYNC_VIEWS:
+    from . import async_views as read_views
+else:
+    read_views = views
 
 urlpatterns = [
-    path("", views.index, name="index"),
+    path("", read_views.index, name="index"),
+    path("cards", read_views.listing_cards, name="listing_cards"),
     path("login", views.login_view, name="login"),
     path("logout", views.logout_view, name="logout"),
     path("register", views.register, name="register"),
     path("create", views.create_listing, name="create_listing"),
-    path("listing/<int:listing_id>", views.view_listing, name="view_listing"),
+    path("listing/<int:listing_id>", read_views.view_listing, name="view_listing"),
+    path(
+        "listing/<int:listing_id>/comments",
+        views.listing_comments,
+        name="listing_comments",
+    ),
+    path(
+        "listing/<int:listing_id>/events",
+        views.listing_events,
+        name="listing_events",
+    ),
     path("bid/<int:listing_id>", views.create_bid, name="create_bid"),
     path("comment/<int:listing_id>", views.create_comment, name="create_comment"),
     path("cancel/<int:listing_id>", views.cancel_listing, name="cancel_listing"),
     path("accept/<int:listing_id>", views.accept_bid, name="accept_bid"),
-    path("categories", views.categories, name="categories"),
-    path("category/<int:category_id>", views.view_category, name="view_category"),
+    path("categories", read_views.categories, name="categories"),
+    path("category/<int:category_id>", read_views.view_category, name="view_category"),
+    path(
+        "category/<int:category_id>/cards",
+        read_views.category_cards,
+        name="category_cards",
+    ),
+    path("search", views.search_listings, name="search"),
+    path("search/cards", views.search_cards, name="search_cards"),
     path("watch/<int:listing_id>", views.watch, name="watch"),
-    path("watchlist/", views.view_watchlist, name="view_watchlist"),
+    path("watches", views.bulk_watch, name="bulk_watch"),
+    path("watchlist/", read_views.view_watchlist, name="view_watchlist"),
     path("lsitings/", views.view_user_listings, name="view_user_listings"),
+    path("cache/stats", views.cache_stats, name="cache_stats"),
+    path("metrics", views.view_metrics, name="metrics"),
+    path("export/bids", views.export_bids, name="export_bids"),
+    path("api/v1/listings", api.listings, name="api_listings"),
+    path("api/v1/listings/<int:listing_id>", api.listing, name="api_listing"),
+    path("api/v1/categories", api.categories, name="api_categories"),
 ]
 
 # Add URL for serving media files
@@ -1,15 +1,39 @@
+import asyncio
+import json
+
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import (
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import render
 from django.urls import reverse
 from django.views.decorators.http import require_POST
 
+from . import bidding, events, exports, metrics, search, tasks, watchlist
+from .caching import (
+    cache_anonymous_page,
+    category_registry,
+    category_scope,
+    conditional_listing_page,
+    index_scope,
+    page_cache_stats,
+    purge_category_pages,
+    purge_listing_pages,
+)
 from .forms import CreateListingForm
 from .models import Bid, Category, Comment, Listing, User
+from .pagination import COMMENT_PAGE_SIZE, paginate
+from .queries import card_listings
 
 
 def login_view(request):
@@ -83,9 +107,18 @@ def register(request):
         return render(request, "auctions/register.html")
 
 
-def index(request):
+def active_listings(category_id=None):
     listings = Listing.objects.filter(active=True)
-    categories = Category.objects.order_by("name").all()
+
+    if category_id is not None:
+        listings = listings.filter(category__pk=category_id)
+
+    return card_listings(listings)
+
+
+@cache_anonymous_page(index_scope)
+def index(request):
+    listings = paginate(active_listings(), request.GET.get("cursor"))
 
     return render(
         request,
@@ -93,33 +126,46 @@ def index(request):
         {
             "title": "Current Listings",
             "listings": listings,
-            "categories": categories,
+            "page": listings,
+            "fragment_url": reverse("listing_cards"),
             "default_image": settings.MEDIA_URL + "/images/default.jpg",
         },
     )
 
 
-def categories(request):
-    categories = Category.objects.order_by("name").all()
+@cache_anonymous_page(index_scope)
+def listing_cards(request):
+    # Render a page of the current listings as a bare card fragment
+    listings = paginate(active_listings(), request.GET.get("cursor"))
+
+    return render(
+        request,
+        "auctions/partial_card_items.html",
+        {
+            "listings": listings,
+            "page": listings,
+            "fragment_url": reverse("listing_cards"),
+            "default_image": settings.MEDIA_URL + "/images/default.jpg",
+        },
+    )
 
+
+def categories(request):
     return render(
         request,
         "auctions/categories.html",
         {
-            "categories": categories,
             "current_category": None,
         },
     )
 
 
+@cache_anonymous_page(category_scope)
 def view_category(request, category_id):
-    listings = Listing.objects.filter(category__pk=category_id).filter(active=True)
-    categories = Category.objects.order_by("name").all()
-
     # Retrieve correct category name
-    category_name = categories.filter(pk=category_id).first()
+    category = category_registry.get(category_id)
 
-    if not category_name:
+    if not category:
         messages.error(
             request,
             "<strong>Error:</strong>  The provided category does not exist!",
@@ -127,14 +173,87 @@ def view_category(request, category_id):
 
         return HttpResponseRedirect(reverse("categories"))
 
+    listings = paginate(active_listings(category_id), request.GET.get("cursor"))
+    fragment_url = reverse("category_cards", kwargs={"category_id": category_id})
+
     return render(
         request,
         "auctions/categories.html",
         {
-            "title": category_name,
+            "title": category,
             "listings": listings,
-            "categories": categories,
+            "page": listings,
+            "fragment_url": fragment_url,
+            "current_category": category_id,
+            "default_image": settings.MEDIA_URL + "/images/default.jpg",
+        },
+    )
+
+
+@cache_anonymous_page(category_scope)
+def category_cards(request, category_id):
+    # Render a page of a category's listings as a bare card fragment
+    listings = paginate(active_listings(category_id), request.GET.get("cursor"))
+    fragment_url = reverse("category_cards", kwargs={"category_id": category_id})
+
+    return render(
+        request,
+        "auctions/partial_card_items.html",
+        {
+            "listings": listings,
+            "page": listings,
+            "fragment_url": fragment_url,
+            "default_image": settings.MEDIA_URL + "/images/default.jpg",
+        },
+    )
+
+
+def search_parameters(request):
+    # Read the search words and optional category filter from the query string
+    query = request.GET.get("q", "").strip()
+
+    try:
+        category_id = int(request.GET.get("category", ""))
+    except ValueError:
+        category_id = None
+
+    if category_registry.get(category_id) is None:
+        category_id = None
+
+    return query, category_id
+
+
+def search_listings(request):
+    query, category_id = search_parameters(request)
+    listings = search.search_listings(query, category_id, request.GET.get("cursor"))
+
+    return render(
+        request,
+        "auctions/search.html",
+        {
+            "title": f'Results for "{query}"' if query else "Search",
+            "query": query,
             "current_category": category_id,
+            "listings": listings,
+            "page": listings,
+            "fragment_url": reverse("search_cards"),
+            "default_image": settings.MEDIA_URL + "/images/default.jpg",
+        },
+    )
+
+
+def search_cards(request):
+    # Render a page of search results as a bare card fragment
+    query, category_id = search_parameters(request)
+    listings = search.search_listings(query, category_id, request.GET.get("cursor"))
+
+    return render(
+        request,
+        "auctions/partial_card_items.html",
+        {
+            "listings": listings,
+            "page": listings,
+            "fragment_url": reverse("search_cards"),
             "default_image": settings.MEDIA_URL + "/images/default.jpg",
         },
     )
@@ -148,6 +267,7 @@ def create_listing(request):
             new_listing = form.save(commit=False)
             new_listing.user = request.user
             new_listing.save()
+            metrics.LISTINGS_CREATED.inc()
 
             return HttpResponseRedirect(
                 reverse("view_listing", kwargs={"listing_id": new_listing.pk})
@@ -165,12 +285,18 @@ def create_listing(request):
     return render(request, "auctions/create_listing.html", {"form": form})
 
 
+@conditional_listing_page
 def view_listing(request, listing_id):
     # Retrieve existing listing to ensure this is a valid listing to bid on
     try:
-        listing = Listing.objects.get(pk=listing_id)
-        high_bid = listing.bids.order_by("price").last()  # type: ignore
+        listing = Listing.objects.select_related("user", "high_bid__user").get(
+            pk=listing_id
+        )
+        high_bid = listing.high_bid
         watching = listing.watchers.filter(id=request.user.id).first()
+        comments = paginate(
+            listing.comments.select_related("user"), per_page=COMMENT_PAGE_SIZE
+        )
 
     except Listing.DoesNotExist:
         messages.error(
@@ -186,57 +312,125 @@ def view_listing(request, listing_id):
             "listing": listing,
             "high_bid": high_bid,
             "watching": watching,
+            "comments": comments,
+            "max_bid": bidding.proxy_max_for(listing, request.user),
             "default_image": settings.MEDIA_URL + "/images/default.jpg",
+            "live_updates": settings.AUCTIONS_ASYNC_VIEWS,
         },
     )
 
 
+def listing_comments(request, listing_id):
+    # Render a page of older comments as a bare fragment for the comment thread
+    comments = paginate(
+        Comment.objects.filter(listing_id=listing_id).select_related("user"),
+        request.GET.get("cursor"),
+        per_page=COMMENT_PAGE_SIZE,
+    )
+
+    return render(
+        request,
+        "auctions/partial_comments.html",
+        {"comments": comments, "listing_id": listing_id},
+    )
+
+
+async def listing_events(request, listing_id):
+    # Stream new bids, comments and the close of a listing as Server-Sent Events
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would collect the whole stream before sending any of it,
+        # so tell the browser's EventSource not to reconnect instead
+        return HttpResponse(status=204)
+
+    active = await Listing.objects.filter(pk=listing_id, active=True).aexists()
+    backend = events.get_backend()
+    backend.start()
+
+    async def stream():
+        if not active:
+            yield events.format_event({"type": "close", "data": {}})
+            return
+
+        async with events.hub.subscribe(events.listing_channel(listing_id)) as queue:
+            yield f"retry: {events.RETRY_MS}\n\n"
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), timeout=events.KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                yield events.format_event(event)
+
+                if event["type"] == "close":
+                    return
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+
+    return response
+
+
 @login_required  # type: ignore
 @require_POST
 def create_bid(request, listing_id):
-    # Retrieve existing listing to endure this is a valid listing to bid on
-    listing = Listing.objects.filter(pk=listing_id).exclude(active=False).first()
+    try:
+        bid_amount = int(request.POST["bid_amount"])
+    except (KeyError, ValueError):
+        bid_amount = 0
 
-    if not listing:
+    # TODO Should we also auto-watch the item here?
+    result = bidding.place_bid(listing_id, request.user, bid_amount)
+    metrics.BIDS.inc(outcome=result.reason)
+
+    if result.reason == bidding.LISTING_CLOSED:
         messages.error(
             request,
             "<strong>Error:</strong>  The provided auction listing does not exist or is no longer active!",
         )
         return HttpResponseRedirect(reverse("index"))
 
-    if listing.user == request.user:
+    if result.reason == bidding.AUCTION_ENDED:
         messages.error(
             request,
-            "<strong>Error:</strong>  You aren't able to bid on your own items.",
+            "<strong>Error:</strong>  Bidding on this auction has ended.",
         )
-        return HttpResponseRedirect(
-            reverse("view_listing", kwargs={"listing_id": listing_id})
+    elif result.reason == bidding.OWN_LISTING:
+        messages.error(
+            request,
+            "<strong>Error:</strong>  You aren't able to bid on your own items.",
         )
-
-    # Retrieve any existing high bid and ensure that new bid is higher if one does exist
-    high_bid = Bid.objects.filter(listing__id=listing_id).order_by("price").last()
-    bid_amount = int(request.POST["bid_amount"])
-
-    if high_bid and bid_amount <= high_bid.price:
+    elif result.reason == bidding.TOO_LOW:
         messages.error(
             request,
-            f"<strong>Error:</strong>  Your bid needs to be at least { high_bid.price + 1 }!",
+            f"<strong>Error:</strong>  Your bid needs to be at least { result.minimum_bid }!",
         )
-        return HttpResponseRedirect(
-            reverse("view_listing", kwargs={"listing_id": listing_id})
+    elif result.reason == bidding.INVALID_AMOUNT:
+        messages.error(
+            request,
+            f"<strong>Error:</strong>  Your bid must be a whole dollar amount between { bidding.MIN_BID } and { bidding.MAX_BID }.",
         )
+    elif result.reason == bidding.MAX_RAISED:
+        messages.success(request, f"Your maximum bid is now ${ bid_amount }.")
+    else:
+        purge_listing_pages(listing_id)
+        tasks.notify_new_high_bid.enqueue(bid_id=result.bid.pk)
+
+        if result.reason == bidding.OUTBID:
+            messages.error(
+                request,
+                f"<strong>Error:</strong>  Another bidder's maximum beat yours, the current bid is now ${ result.current_price }.",
+            )
+        else:
+            messages.success(
+                request,
+                f"<strong>Congratulations!</strong>  You are the new high bidder! We will bid for you up to ${ bid_amount }.",
+            )
 
-    # Create and save the new bid object
-    # TODO Should we also auto-watch the item here?
-    new_bid = Bid()
-    new_bid.listing = listing
-    new_bid.price = bid_amount
-    new_bid.user = request.user
-    new_bid.save()
-
-    messages.success(
-        request, "<strong>Congratulations!</strong>  You are the new high bidder!"
-    )
     return HttpResponseRedirect(
         reverse("view_listing", kwargs={"listing_id": listing_id})
     )
@@ -266,11 +460,28 @@ def create_comment(request, listing_id):
             reverse("view_listing", kwargs={"listing_id": listing_id})
         )
 
-    new_comment = Comment()
-    new_comment.listing = listing
-    new_comment.text = comment
-    new_comment.user = request.user
-    new_comment.save()
+    with transaction.atomic():
+        new_comment = Comment()
+        new_comment.listing = listing
+        new_comment.text = comment
+        new_comment.user = request.user
+        new_comment.save()
+
+        Listing.objects.filter(pk=listing_id).update(
+            comment_count=F("comment_count") + 1
+        )
+        events.publish(
+            events.listing_channel(listing_id),
+            "comment",
+            {
+                "user": request.user.username,
+                "text": new_comment.text,
+                "created_at": new_comment.created_at.isoformat(),
+            },
+        )
+
+    purge_category_pages(listing.category_id)
+    metrics.COMMENTS.inc()
 
     messages.success(request, "Your message has been posted.")
     return HttpResponseRedirect(
@@ -302,9 +513,7 @@ def cancel_listing(request, listing_id):
 
         errors = True
 
-    bid_count = listing.bids.count()  # type: ignore
-
-    if bid_count:
+    if listing.bid_count:
         messages.error(
             request,
             "<strong>Error:</strong>  You are not able to cancel a listing with bids.",
@@ -314,7 +523,11 @@ def cancel_listing(request, listing_id):
 
     if not errors:
         listing.active = False
-        listing.save()
+        listing.save(update_fields=["active", "updated_at"])
+        metrics.LISTINGS_CLOSED.inc(reason="cancelled")
+        events.publish(
+            events.listing_channel(listing.pk), "close", {"completed": False}
+        )
 
         messages.success(request, "Your listing has been cancelled.")
 
@@ -345,10 +558,8 @@ def accept_bid(request, listing_id):
 
         errors = True
 
-    # Retrieve any existing high bid to ensure one exists and it is higher than the listing price
-    high_bid = Bid.objects.filter(listing__id=listing_id).order_by("price").last()
-
-    if not high_bid or high_bid.price <= listing.price:
+    # Ensure a high bid exists and it is higher than the listing price
+    if not listing.high_bid_id or listing.current_price <= listing.price:
         messages.error(
             request,
             "<strong>Error:</strong>  There must be bids on this listing and those bids must exceed the lsiting price.",
@@ -359,7 +570,9 @@ def accept_bid(request, listing_id):
     if not errors:
         listing.active = False
         listing.completed = True
-        listing.save()
+        listing.save(update_fields=["active", "completed", "updated_at"])
+        metrics.LISTINGS_CLOSED.inc(reason="sold")
+        events.publish(events.listing_channel(listing.pk), "close", {"completed": True})
 
         messages.success(
             request, "<strong>Congratulations!</strong>  You have accepted an offer!"
@@ -373,7 +586,7 @@ def accept_bid(request, listing_id):
 @login_required  # type: ignore
 def watch(request, listing_id):
     # Retrieve existing listing to endure this is a valid listing to comment on
-    listing = Listing.objects.filter(pk=listing_id).first()
+    listing = Listing.objects.filter(pk=listing_id).only("pk").first()
 
     if not listing:
         messages.error(
@@ -382,30 +595,50 @@ def watch(request, listing_id):
         )
         return HttpResponseRedirect(reverse("index"))
 
-    # Get watch status
-    watching = listing.watchers.filter(id=request.user.id).first()
+    # Toggle watch status
+    if watchlist.unwatch(request.user, [listing_id]):
+        messages.success(request, "You are no longer watching this item.")
+    else:
+        watchlist.watch(request.user, [listing_id])
+        messages.success(request, "You are now watching this item.")
 
-    if not watching:
-        listing.watchers.add(request.user)
+    return HttpResponseRedirect(
+        reverse("view_listing", kwargs={"listing_id": listing_id})
+    )
 
-        messages.success(request, "You are now watching this item.")
-    else:
-        listing.watchers.remove(request.user)
 
-        messages.success(request, "You are no longer watching this item.")
+@require_POST
+def bulk_watch(request):
+    # Add and remove many watches from a JSON body of the form
+    # {"watch": [ids], "unwatch": [ids]}, responding with the ids that changed
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
 
-    listing.save()
+    try:
+        body = json.loads(request.body)
+        to_watch = [int(pk) for pk in body.get("watch", [])]
+        to_unwatch = [int(pk) for pk in body.get("unwatch", [])]
+    except (AttributeError, TypeError, ValueError):
+        return JsonResponse({"error": "Invalid request body."}, status=400)
+
+    if len(to_watch) + len(to_unwatch) > watchlist.MAX_BULK_WATCHES:
+        return JsonResponse(
+            {"error": f"At most {watchlist.MAX_BULK_WATCHES} listings per request."},
+            status=400,
+        )
 
-    return HttpResponseRedirect(
-        reverse("view_listing", kwargs={"listing_id": listing_id})
+    return JsonResponse(
+        {
+            "watched": watchlist.watch(request.user, to_watch),
+            "unwatched": watchlist.unwatch(request.user, to_unwatch),
+        }
     )
 
 
 @login_required  # type: ignore
 def view_watchlist(request):
-    # Create a list of listings watched by the current user
-    watched_listings = request.user.watching.all()
-    categories = Category.objects.order_by("name").all()
+    # Listings watched by the current user, most recently watched first
+    watched_listings = watchlist.watched_listings(request.user)
 
     return render(
         request,
@@ -413,7 +646,6 @@ def view_watchlist(request):
         {
             "title": "Watched Listings",
             "listings": watched_listings,
-            "categories": categories,
             "default_image": settings.MEDIA_URL + "/images/default.jpg",
         },
     )
@@ -422,8 +654,9 @@ def view_watchlist(request):
 @login_required  # type: ignore
 def view_user_listings(request):
     # Collect a list of all listings created by the current user
-    listings = Listing.objects.filter(user=request.user)
-    categories = Category.objects.order_by("name").all()
+    listings = card_listings(
+        Listing.objects.filter(user=request.user).order_by("-created_at", "-id")
+    )
 
     return render(
         request,
@@ -431,7 +664,47 @@ def view_user_listings(request):
         {
             "title": "Your Listings",
             "listings": listings,
-            "categories": categories,
             "default_image": settings.MEDIA_URL + "/images/default.jpg",
         },
     )
+
+
+@staff_member_required
+def cache_stats(request):
+    return JsonResponse({"page_cache": page_cache_stats()})
+
+
+@staff_member_required
+def view_metrics(request):
+    # Every metric, summed over the worker processes, for Prometheus to scrape
+    return HttpResponse(
+        metrics.registry.exposition(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@staff_member_required
+def export_bids(request):
+    # Stream the bid history as CSV or JSONL, filtered like `manage.py export_bids`
+    export_format = request.GET.get("format", "csv")
+
+    try:
+        if export_format not in exports.FORMATS:
+            raise ValueError(f"Unknown export format: {export_format}")
+
+        filters = exports.parse_filters(
+            request.GET.get("since"),
+            request.GET.get("until"),
+            request.GET.get("category"),
+        )
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    rows = exports.bid_rows(sales_only=request.GET.get("sales") == "1", **filters)
+    response = StreamingHttpResponse(
+        exports.stream(rows, export_format),
+        content_type=exports.CONTENT_TYPES[export_format],
+    )
+    response["Content-Disposition"] = f'attachment; filename="bids.{export_format}"'
+
+    return response
@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+from .caching import purge_listing_pages
+from .models import Listing
+from .queries import card_listings
+
+Watch = Listing.watchers.through
+
+# Listings accepted per bulk watch or unwatch request
+MAX_BULK_WATCHES = 500
+
+
+def watched_listings(user):
+    """Card rows of the listings a user watches, most recently watched first
+
+    The watch row's id orders the listings, read with a correlated subquery so
+    the page still takes a single query.
+    """
+    watch_id = Watch.objects.filter(listing=OuterRef("pk"), user=user).values("pk")
+
+    return card_listings(
+        Listing.objects.filter(watchers=user)
+        .annotate(watch_id=Subquery(watch_id[:1]))
+        .order_by("-watch_id")
+    )
+
+
+def watch(user, listing_ids):
+    """Add listings to a user's watchlist
+
+    Watches are written with one bulk_create() on the through table, and the
+    watcher counters of the listings that changed with one UPDATE.  The listing
+    rows are not otherwise saved.
+
+    Args:
+        user (User): Watcher
+        listing_ids (iterable): Listings to watch, unknown ids are ignored
+
+    Returns:
+        list: Ids of the listings which were not already watched
+    """
+    listing_ids = set(listing_ids)
+
+    with transaction.atomic():
+        existing = set(
+            Listing.objects.filter(pk__in=listing_ids).values_list("pk", flat=True)
+        )
+        watched = set(
+            Watch.objects.filter(user=user, listing_id__in=existing).values_list(
+                "listing_id", flat=True
+            )
+        )
+        added = sorted(existing - watched)
+
+        Watch.objects.bulk_create(
+            [Watch(user=user, listing_id=listing_id) for listing_id in added]
+        )
+        Listing.objects.filter(pk__in=added).update(
+            watcher_count=F("watcher_count") + 1
+        )
+
+    if added:
+        purge_listing_pages(*added)
+
+    return added
+
+
+def unwatch(user, listing_ids):
+    """Remove listings from a user's watchlist
+
+    Returns:
+        list: Ids of the listings which were being watched
+    """
+    with transaction.atomic():
+        watches = Watch.objects.filter(user=user, listing_id__in=set(listing_ids))
+        removed = sorted(watches.values_list("listing_id", flat=True))
+
+        watches.delete()
+        Listing.objects.filter(pk__in=removed).update(
+            watcher_count=F("watcher_count") - 1
+        )
+
+    if removed:
+        purge_listing_pages(*removed)
+
+    return removed
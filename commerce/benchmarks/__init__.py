@@ -0,0 +1,48 @@
+"""Standalone benchmarks for the auctions app
+
+Each benchmark is a module run from the project directory, for example
+`python -m benchmarks.bids --help`.  They run against a scratch SQLite database
+rather than the development database unless one is given explicitly.
+"""
+
+import os
+import tempfile
+
+
+def setup(database=None):
+    """Configure Django against a scratch database and migrate it
+
+    Args:
+        database (str): SQLite file to use (default: a new temporary file)
+
+    Returns:
+        str: Path to the SQLite database in use
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "commerce.settings")
+
+    import django
+    from django.conf import settings
+
+    if database is None:
+        handle, database = tempfile.mkstemp(prefix="auctions-bench-", suffix=".sqlite3")
+        os.close(handle)
+
+    settings.DATABASES["default"]["NAME"] = database
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+
+    return database
+
+
+def cleanup(database):
+    """Remove a scratch database created by setup() along with its WAL files"""
+    from django.db import connections
+
+    connections.close_all()
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
@@ -0,0 +1,352 @@
+"""Read view throughput under WSGI, ASGI with sync views and ASGI with async views
+
+A logged-in user (so the anonymous page cache is bypassed) requests a mix of the
+index, categories, a category, a listing and their watchlist at a fixed
+concurrency.  Each mode runs in its own process, as AUCTIONS_ASYNC_VIEWS is read
+when the URLs are loaded:
+
+* wsgi:       the WSGI handler called from a pool of threads, like a threaded
+              WSGI server
+* asgi-sync:  the ASGI handler with the sync views, which Django runs in its
+              thread adapter
+* asgi-async: the ASGI handler with the views from auctions/async_views.py
+
+Requests are made in-process, without a server or sockets, so the figures
+compare the handlers and views rather than any particular server.
+
+Usage: python -m benchmarks.asgi [--concurrency 64] [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from io import BytesIO
+
+from . import cleanup, setup
+
+MODES = ("wsgi", "asgi-sync", "asgi-async")
+
+WARMUP_REQUESTS = 20
+
+
+def seed(listings, seed_value):
+    """Fill the database and return a session cookie for the benchmark user"""
+    from django.test import Client
+
+    from auctions.counters import rebuild_listing_counters
+    from auctions.models import Category, Comment, Listing, User
+
+    rng = random.Random(seed_value)
+    seller = User.objects.create_user("bench-seller")
+    viewer = User.objects.create_user("bench-viewer")
+    categories = Category.objects.bulk_create(
+        Category(
+            name=f"Category {i}",
+            icon="bi bi-speedometer",
+            description="",
+            hex_color_code="000000",
+        )
+        for i in range(5)
+    )
+    created = Listing.objects.bulk_create(
+        Listing(
+            title=f"Listing {i}",
+            description="A benchmark listing",
+            price=price,
+            current_price=price,
+            user=seller,
+            category=rng.choice(categories),
+        )
+        for i, price in ((i, rng.randint(1, 500)) for i in range(listings))
+    )
+    Comment.objects.bulk_create(
+        Comment(listing=listing, user=viewer, text=f"Comment {i}")
+        for listing in created
+        for i in range(rng.randint(0, 5))
+    )
+    Listing.watchers.through.objects.bulk_create(
+        Listing.watchers.through(listing_id=listing.pk, user_id=viewer.pk)
+        for listing in rng.sample(created, min(20, len(created)))
+    )
+    rebuild_listing_counters()
+
+    client = Client()
+    client.force_login(viewer)
+
+    return client.cookies.output(attrs=[], header="", sep=";").strip()
+
+
+def request_paths(count, seed_value):
+    from auctions.models import Category, Listing
+
+    rng = random.Random(seed_value)
+    category_ids = list(Category.objects.values_list("pk", flat=True))
+    listing_ids = list(Listing.objects.values_list("pk", flat=True))
+    pages = [
+        lambda: "/",
+        lambda: "/categories",
+        lambda: f"/category/{rng.choice(category_ids)}",
+        lambda: f"/listing/{rng.choice(listing_ids)}",
+        lambda: "/watchlist/",
+    ]
+
+    return [pages[i % len(pages)]() for i in range(count)]
+
+
+def wsgi_environ(path, cookie):
+    return {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "localhost",
+        "HTTP_COOKIE": cookie,
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+
+
+def run_wsgi(paths, cookie, concurrency):
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+    pending = iter(paths)
+    lock = threading.Lock()
+    latencies, errors = [], []
+
+    def request(path):
+        statuses = []
+        started = time.perf_counter()
+        result = application(
+            wsgi_environ(path, cookie),
+            lambda status, headers, exc_info=None: statuses.append(status),
+        )
+
+        try:
+            b"".join(result)
+        finally:
+            result.close()
+
+        return time.perf_counter() - started, int(statuses[0].split()[0])
+
+    def worker():
+        while True:
+            with lock:
+                path = next(pending, None)
+
+            if path is None:
+                return
+
+            latency, status = request(path)
+
+            with lock:
+                latencies.append(latency)
+                if status != 200:
+                    errors.append(f"{status} {path}")
+
+    for path in paths[:WARMUP_REQUESTS]:
+        request(path)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return time.perf_counter() - started, latencies, errors
+
+
+def asgi_scope(path, cookie):
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"cookie", cookie.encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 80),
+    }
+
+
+async def run_asgi(paths, cookie, concurrency):
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+    pending = iter(paths)
+    latencies, errors = [], []
+
+    async def request(path):
+        received = False
+        statuses = []
+
+        async def receive():
+            nonlocal received
+
+            if not received:
+                received = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            # The client never disconnects, the handler cancels this wait
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        started = time.perf_counter()
+        await application(asgi_scope(path, cookie), receive, send)
+
+        return time.perf_counter() - started, statuses[0]
+
+    async def worker():
+        for path in pending:
+            latency, status = await request(path)
+            latencies.append(latency)
+
+            if status != 200:
+                errors.append(f"{status} {path}")
+
+    for path in paths[:WARMUP_REQUESTS]:
+        await request(path)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    return time.perf_counter() - started, latencies, errors
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a sorted list"""
+    return values[min(len(values) - 1, round(percent / 100 * (len(values) - 1)))]
+
+
+def measure(mode, database, cookie, requests, concurrency, seed_value):
+    """Run one mode in this process and return its results"""
+    setup(database)
+
+    from django.conf import settings
+
+    # Keep DEBUG's query log and host checks from skewing the figures
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["localhost"]
+
+    paths = request_paths(requests, seed_value)
+
+    if mode == "wsgi":
+        elapsed, latencies, errors = run_wsgi(paths, cookie, concurrency)
+    else:
+        elapsed, latencies, errors = asyncio.run(run_asgi(paths, cookie, concurrency))
+
+    latencies.sort()
+
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "errors": errors[:5],
+        "error_count": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--listings", type=int, default=200)
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma separated")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database", help="SQLite file (default: temporary)")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--cookie", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        result = measure(
+            args.mode,
+            args.database,
+            args.cookie,
+            args.requests,
+            args.concurrency,
+            args.seed,
+        )
+        print(json.dumps(result))
+        return
+
+    database = setup(args.database)
+    cookie = seed(args.listings, args.seed)
+
+    from django.db import connections
+
+    connections.close_all()
+
+    print(f"database:    {database}")
+    print(f"concurrency: {args.concurrency}, {args.requests} requests per mode\n")
+    print(f"{'mode':<12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+
+    failed = False
+
+    for mode in args.modes.split(","):
+        env = dict(os.environ, AUCTIONS_ASYNC_VIEWS="1" if mode == "asgi-async" else "")
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.asgi",
+                "--mode",
+                mode,
+                "--database",
+                database,
+                "--cookie",
+                cookie,
+                "--requests",
+                str(args.requests),
+                "--concurrency",
+                str(args.concurrency),
+                "--seed",
+                str(args.seed),
+            ],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        failed = failed or bool(result["error_count"])
+
+        print(
+            f"{mode:<12}{result['rps']:>10.0f}{result['p50']:>10.1f}"
+            f"{result['p99']:>10.1f}{result['error_count']:>8}"
+        )
+
+        for error in result["errors"]:
+            print(f"  {error}")
+
+    if args.database is None:
+        cleanup(database)
+
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Contended bid placement benchmark
+
+Several threads bid on a small set of listings at once, each bidding one dollar
+over the last price it saw so that most attempts race each other.  Afterwards
+every listing is checked for the bid engine's invariants:
+
+* accepted bids strictly increase in price in the order they were recorded
+* the listing's current price and high bid match its highest bid
+* the listing's bid counter matches the number of bid rows
+* the leading proxy bidder holds the high bid, with a maximum at or above it
+
+Usage: python -m benchmarks.bids [--threads 8] [--listings 4] [--attempts 500]
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from . import cleanup, setup
+
+
+def bidder(user, listing_ids, attempts, seed, totals, lock):
+    from django.db import connection
+
+    from auctions.bidding import place_bid
+    from auctions.models import Listing
+
+    rng = random.Random(seed)
+    accepted = rejected = 0
+
+    try:
+        for _ in range(attempts):
+            listing_id = rng.choice(listing_ids)
+            seen = (
+                Listing.objects.filter(pk=listing_id)
+                .values_list("current_price", flat=True)
+                .get()
+            )
+
+            if place_bid(listing_id, user, seen + 1).accepted:
+                accepted += 1
+            else:
+                rejected += 1
+    finally:
+        connection.close()
+
+    with lock:
+        totals["accepted"] += accepted
+        totals["rejected"] += rejected
+
+
+def check_invariants(listing_ids):
+    from auctions.models import Listing
+
+    violations = []
+
+    for listing in Listing.objects.filter(pk__in=listing_ids):
+        prices = list(listing.bids.order_by("pk").values_list("price", flat=True))
+
+        if any(later <= earlier for earlier, later in zip(prices, prices[1:])):
+            violations.append(f"{listing.pk}: bids out of order or tied")
+        if prices and listing.current_price != prices[-1]:
+            violations.append(f"{listing.pk}: current price is not the high bid")
+        if prices and listing.high_bid.price != prices[-1]:
+            violations.append(f"{listing.pk}: high bid is not the highest bid")
+        if prices and listing.proxy_bidder_id != listing.high_bid.user_id:
+            violations.append(f"{listing.pk}: proxy bidder is not the high bidder")
+        if prices and listing.proxy_max < listing.current_price:
+            violations.append(f"{listing.pk}: proxy maximum is below the price")
+        if listing.bid_count != len(prices):
+            violations.append(f"{listing.pk}: bid count does not match bids")
+
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--listings", type=int, default=4)
+    parser.add_argument("--attempts", type=int, default=500, help="Bids per thread")
+    parser.add_argument("--database", help="SQLite file (default: temporary)")
+    args = parser.parse_args()
+
+    database = setup(args.database)
+
+    from django.db import connection
+
+    from auctions.models import Category, Listing, User
+
+    seller = User.objects.create_user("bench-seller")
+    category = Category.objects.create(
+        name="Benchmark",
+        icon="bi bi-speedometer",
+        description="",
+        hex_color_code="000000",
+    )
+    listing_ids = [
+        Listing.objects.create(
+            title=f"Listing {i}",
+            description="",
+            price=1,
+            user=seller,
+            category=category,
+        ).pk
+        for i in range(args.listings)
+    ]
+    bidders = [
+        User.objects.create_user(f"bench-bidder-{i}") for i in range(args.threads)
+    ]
+    journal_mode = connection.cursor().execute("PRAGMA journal_mode").fetchone()[0]
+    connection.close()
+
+    totals = {"accepted": 0, "rejected": 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(
+            target=bidder, args=(user, listing_ids, args.attempts, i, totals, lock)
+        )
+        for i, user in enumerate(bidders)
+    ]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    violations = check_invariants(listing_ids)
+    attempts = totals["accepted"] + totals["rejected"]
+
+    print(f"database:   {database} (journal_mode={journal_mode})")
+    print(f"threads:    {args.threads} bidding on {args.listings} listings")
+    print(
+        f"attempts:   {attempts} in {elapsed:.2f}s ({attempts / elapsed:.0f} bids/sec)"
+    )
+    print(f"accepted:   {totals['accepted']} ({totals['accepted'] / elapsed:.0f}/sec)")
+    print(f"rejected:   {totals['rejected']}")
+    print(f"violations: {len(violations)}")
+
+    for violation in violations:
+        print(f"  {violation}")
+
+    if args.database is None:
+        cleanup(database)
+
+    raise SystemExit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Auction expiry benchmark with a large number of auctions ending together
+
+Fills a scratch database with auctions that all end within the same minute,
+some of them with bids above their opening price, alongside a set of running
+auctions.  It then closes the ended auctions with `expiry.close_expired()`
+while a thread keeps bidding on the running ones, and reports the closing
+throughput and how long bids waited behind the batches.
+
+Usage: python -m benchmarks.expiry [--listings 300000] [--batch-size 1000]
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from datetime import timedelta
+
+from . import cleanup, setup
+
+LOAD_BATCH_SIZE = 10000
+
+
+def load(count, running, sold_share, rng):
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from auctions.models import Category, Listing, User
+
+    seller = User.objects.create_user("bench-seller")
+    bidder = User.objects.create_user("bench-bidder")
+    category = Category.objects.create(
+        name="Category", icon="bi bi-speedometer", description="", hex_color_code="0"
+    )
+    minute = timezone.now().replace(second=0, microsecond=0) - timedelta(minutes=1)
+
+    def listings(size, ends_at):
+        for _ in range(size):
+            price = rng.randint(1, 1000)
+            yield Listing(
+                title="Item",
+                description="An item",
+                price=price,
+                current_price=price,
+                user=seller,
+                category=category,
+                ends_at=ends_at(),
+            )
+
+    for offset in range(0, count, LOAD_BATCH_SIZE):
+        with transaction.atomic():
+            Listing.objects.bulk_create(
+                listings(
+                    min(LOAD_BATCH_SIZE, count - offset),
+                    lambda: minute + timedelta(seconds=rng.random() * 60),
+                )
+            )
+
+    Listing.objects.bulk_create(
+        listings(running, lambda: timezone.now() + timedelta(days=1))
+    )
+
+    # Bid on a share of the ended auctions, as if the bids came in before the end
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO auctions_bid (listing_id, user_id, price, created_at)
+            SELECT id, %s, price + 1, %s FROM auctions_listing
+            WHERE ends_at < %s AND abs(random() %% 1000) < %s
+            """,
+            [bidder.pk, minute, timezone.now(), int(sold_share * 1000)],
+        )
+        cursor.execute("""
+            UPDATE auctions_listing
+            SET high_bid_id = bid.id, current_price = bid.price, bid_count = 1
+            FROM auctions_bid AS bid WHERE bid.listing_id = auctions_listing.id
+            """)
+
+    return bidder, list(
+        Listing.objects.filter(ends_at__gt=timezone.now()).values_list("pk", flat=True)
+    )
+
+
+def bid_continuously(bidder, listing_ids, stop, latencies):
+    from django.db import connection
+
+    from auctions.bidding import place_bid
+    from auctions.models import Listing
+
+    rng = random.Random(0)
+
+    try:
+        while not stop.is_set():
+            listing_id = rng.choice(listing_ids)
+            price = Listing.objects.values_list("current_price", flat=True).get(
+                pk=listing_id
+            )
+            started = time.perf_counter()
+            place_bid(listing_id, bidder, price + 1)
+            latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=300000)
+    parser.add_argument("--running", type=int, default=1000)
+    parser.add_argument("--sold", type=float, default=0.3, help="Share with bids")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database", help="SQLite file (default: temporary)")
+    args = parser.parse_args()
+
+    database = setup(args.database)
+    rng = random.Random(args.seed)
+
+    from auctions import expiry
+    from auctions.models import Listing
+
+    started = time.perf_counter()
+    bidder, running = load(args.listings, args.running, args.sold, rng)
+    print(f"database:  {database}")
+    print(f"listings:  {args.listings} loaded in {time.perf_counter() - started:.1f}s")
+
+    stop, latencies = threading.Event(), []
+    thread = threading.Thread(
+        target=bid_continuously, args=(bidder, running, stop, latencies)
+    )
+    thread.start()
+
+    started = time.perf_counter()
+    closed = expiry.close_expired(batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    thread.join()
+
+    sold = Listing.objects.filter(completed=True).count()
+    print(f"closed:    {closed} in {elapsed:.1f}s ({closed / elapsed:,.0f}/s)")
+    print(f"sold:      {sold}")
+    print(f"unsold:    {closed - sold}")
+
+    if latencies:
+        latencies.sort()
+        print(
+            f"bids:      {len(latencies)} during closing, "
+            f"p50 {statistics.median(latencies):.1f}ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99)]:.1f}ms, "
+            f"max {latencies[-1]:.1f}ms"
+        )
+
+    if args.database is None:
+        cleanup(database)
+
+
+if __name__ == "__main__":
+    main()
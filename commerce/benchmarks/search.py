@@ -0,0 +1,166 @@
+"""Full-text search benchmark against a large listing table
+
+Fills a scratch database with listings whose titles and descriptions are drawn
+from a skewed vocabulary, so that some words match a large share of listings
+and others only a handful.  It then times searches through the FTS5 index
+against the equivalent `icontains` scan, for common, rare, multi-word and
+prefix queries.
+
+The index triggers are dropped while loading and the index rebuilt in one pass
+afterwards, which is also how `manage.py rebuild_search_index` behaves, so the
+rebuild time is reported too.
+
+Usage: python -m benchmarks.search [--listings 1000000] [--queries 50]
+"""
+
+import argparse
+import random
+import statistics
+import time
+from itertools import accumulate
+
+from . import cleanup, setup
+
+BATCH_SIZE = 10000
+
+
+def vocabulary(rng, size=5000):
+    """Pronounceable made-up words, most frequent first"""
+    consonants, vowels = "bcdfghklmnprstvz", "aeiou"
+    words = set()
+
+    while len(words) < size:
+        words.add(
+            "".join(
+                rng.choice(consonants) + rng.choice(vowels)
+                for _ in range(rng.randint(2, 4))
+            )
+        )
+
+    return sorted(words)
+
+
+def load(count, words, rng):
+    from django.db import connection, transaction
+
+    from auctions import search
+    from auctions.models import Category, Listing, User
+
+    seller = User.objects.create_user("bench-seller")
+    categories = Category.objects.bulk_create(
+        Category(
+            name=f"Category {i}",
+            icon="bi bi-speedometer",
+            description="",
+            hex_color_code="000000",
+        )
+        for i in range(10)
+    )
+
+    # Word frequencies follow Zipf's law, as in real text
+    weights = list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+
+    with connection.cursor() as cursor:
+        for suffix in ("insert", "delete", "update"):
+            cursor.execute(f"DROP TRIGGER {search.FTS_TABLE}_{suffix}")
+
+    started = time.perf_counter()
+
+    for offset in range(0, count, BATCH_SIZE):
+        with transaction.atomic():
+            Listing.objects.bulk_create(
+                Listing(
+                    title=" ".join(
+                        rng.choices(words, cum_weights=weights, k=rng.randint(3, 6))
+                    ),
+                    description=" ".join(
+                        rng.choices(words, cum_weights=weights, k=rng.randint(20, 40))
+                    ),
+                    price=price,
+                    current_price=price,
+                    active=rng.random() < 0.8,
+                    user=seller,
+                    category=rng.choice(categories),
+                )
+                for price in (
+                    rng.randint(1, 1000) for _ in range(min(BATCH_SIZE, count - offset))
+                )
+            )
+
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    search.rebuild(optimize=True)
+
+    return categories, loaded, time.perf_counter() - started
+
+
+def queries(words, rng, count):
+    """Common, rare, two word, prefix and unmatched searches, in equal measure"""
+    common, rare = words[:20], words[-2000:]
+    kinds = {
+        "common": lambda: rng.choice(common),
+        "rare": lambda: rng.choice(rare),
+        "two words": lambda: f"{rng.choice(common)} {rng.choice(words[:500])}",
+        "prefix": lambda: rng.choice(words[:500])[:3],
+        "no match": lambda: f"xyzzy{rng.randint(0, 999)}",
+    }
+
+    return {kind: [make() for _ in range(count)] for kind, make in kinds.items()}
+
+
+def timed(function, arguments):
+    timings = []
+
+    for argument in arguments:
+        started = time.perf_counter()
+        function(argument)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return statistics.median(timings), max(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=50, help="Per query kind")
+    parser.add_argument(
+        "--scan-queries",
+        type=int,
+        default=3,
+        help="Per query kind for the much slower icontains comparison",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database", help="SQLite file (default: temporary)")
+    args = parser.parse_args()
+
+    database = setup(args.database)
+    rng = random.Random(args.seed)
+    words = vocabulary(rng)
+
+    from auctions import search
+
+    categories, loaded, rebuilt = load(args.listings, words, rng)
+
+    print(f"database:  {database}")
+    print(f"listings:  {args.listings} loaded in {loaded:.1f}s")
+    print(f"rebuild:   {rebuilt:.1f}s\n")
+    print(f"{'query':<24}{'fts p50':>10}{'fts max':>10}{'scan p50':>10}  ms")
+
+    for kind, terms in queries(words, rng, args.queries).items():
+        fts = timed(search.search_listings, terms)
+        scan = timed(
+            lambda term: search._fallback_ids(term, None, search.PAGE_SIZE + 1, 0),
+            terms[: args.scan_queries],
+        )
+        print(f"{kind:<24}{fts[0]:>10.1f}{fts[1]:>10.1f}{scan[0]:>10.1f}")
+
+        category_id = rng.choice(categories).pk
+        fts = timed(lambda term: search.search_listings(term, category_id), terms)
+        print(f"{kind + ' in category':<24}{fts[0]:>10.1f}{fts[1]:>10.1f}")
+
+    if args.database is None:
+        cleanup(database)
+
+
+if __name__ == "__main__":
+    main()
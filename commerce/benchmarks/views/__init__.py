@@ -0,0 +1,159 @@
+"""Latency and query benchmark of every auctions view
+
+Each URL in `auctions/urls.py` has a scenario in `scenarios.py` which drives it
+with Django's test client against a dataset from `generate_load_data`, signed
+in as whoever the page is for.  Every scenario is requested a number of times
+after a warm-up, recording the latency of each request along with the number
+of SQL statements it ran and the time spent in them.
+
+The results are saved as JSON and compared against a baseline from an earlier
+run, when there is one, and against the budgets in `budgets.json`.  The run
+exits with an error when a budget is exceeded or a view has regressed on its
+baseline beyond the tolerance, so it can gate a change.
+
+Usage: python -m benchmarks.views [--requests 50] [--only index view_listing]
+       [--baseline PATH] [--save-baseline] [--output PATH]
+"""
+
+import json
+import os
+import statistics
+
+BUDGETS = os.path.join(os.path.dirname(__file__), "budgets.json")
+
+# Statistics kept per scenario, which budgets can limit
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "queries", "sql_ms")
+
+# Latencies compared against the baseline.  The p99 of a few dozen requests is
+# close to their maximum, too noisy to compare between runs.
+COMPARED = ("p50_ms", "p95_ms")
+
+# Latency changes smaller than this are noise, whatever their share
+NOISE_MS = 1.0
+
+
+def summarize(latencies, queries, sql_times, statuses):
+    """Reduce the measurements of one scenario's requests
+
+    Args:
+        latencies (list): Seconds taken by each request
+        queries (list): SQL statements run by each request
+        sql_times (list): Seconds spent in SQL by each request
+        statuses (list): Status code of each response
+
+    Returns:
+        dict: Percentiles of the latency in milliseconds, the most queries any
+            request ran, the median SQL time and the count of each status
+    """
+    cuts = statistics.quantiles([1000 * value for value in latencies], n=100)
+
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(cuts[49], 2),
+        "p95_ms": round(cuts[94], 2),
+        "p99_ms": round(cuts[98], 2),
+        "queries": max(queries),
+        "sql_ms": round(1000 * statistics.median(sql_times), 2),
+        "statuses": {
+            str(status): statuses.count(status) for status in sorted(set(statuses))
+        },
+    }
+
+
+def load_json(path):
+    with open(path) as stream:
+        return json.load(stream)
+
+
+def save_json(path, data):
+    directory = os.path.dirname(path)
+
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, "w") as stream:
+        json.dump(data, stream, indent=2, sort_keys=True)
+        stream.write("\n")
+
+
+def budget_failures(results, budgets):
+    """Scenarios over their budget
+
+    A scenario's budget is the "default" entry updated with its own entry, so a
+    budget only needs to list the metrics it tightens or loosens.
+
+    Returns:
+        list: Messages describing each metric over budget
+    """
+    failures = []
+
+    for name, result in results.items():
+        budget = {**budgets.get("default", {}), **budgets.get(name, {})}
+
+        for metric in METRICS:
+            if metric in budget and result[metric] > budget[metric]:
+                failures.append(
+                    f"{name}: {metric} {result[metric]} over budget of {budget[metric]}"
+                )
+
+    return failures
+
+
+def regressions(results, baseline, tolerance):
+    """Scenarios slower than their baseline or running more queries
+
+    Latency regresses when a percentile grows by more than the tolerance, a
+    share of the baseline, and by more than NOISE_MS.  Any extra query is a
+    regression, as query counts don't vary between runs on the same data.
+
+    Returns:
+        list: Messages describing each regression
+    """
+    failures = []
+
+    for name, result in results.items():
+        before = baseline.get(name)
+
+        if before is None:
+            continue
+
+        if result["queries"] > before["queries"]:
+            failures.append(
+                f"{name}: {result['queries']} queries, up from {before['queries']}"
+            )
+
+        for metric in COMPARED:
+            limit = max(before[metric] * (1 + tolerance), before[metric] + NOISE_MS)
+
+            if result[metric] > limit:
+                failures.append(
+                    f"{name}: {metric} {result[metric]}, up from {before[metric]}"
+                )
+
+    return failures
+
+
+def report(results, baseline):
+    """Table of the results, with the change from the baseline if there is one"""
+    lines = [
+        f"{'scenario':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'queries':>8} {'sql ms':>8}  statuses"
+    ]
+
+    for name, result in results.items():
+        line = (
+            f"{name:<26} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+            f"{result['p99_ms']:>9.2f} {result['queries']:>8} "
+            f"{result['sql_ms']:>8.2f}  "
+            + " ".join(f"{code}x{count}" for code, count in result["statuses"].items())
+        )
+        before = baseline.get(name)
+
+        if before:
+            change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+            queries = result["queries"] - before["queries"]
+            line += f"  (p95 {change:+.0%}, queries {queries:+d})"
+
+        lines.append(line)
+
+    return "\n".join(lines)
@@ -0,0 +1,178 @@
+import argparse
+import os
+import sys
+import time
+
+from .. import cleanup, setup
+from . import (
+    BUDGETS,
+    __doc__ as description,
+    budget_failures,
+    load_json,
+    regressions,
+    report,
+    save_json,
+    summarize,
+)
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def measure(scenario, fixtures, requests, warmup):
+    """Make a scenario's requests, timing them and the SQL they run
+
+    Returns:
+        tuple: The summary of the measured requests, and the status codes
+            which were not the one expected
+    """
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    latencies, queries, sql_times, statuses, unexpected = [], [], [], [], []
+    sql = {"queries": 0, "time": 0.0}
+
+    def record(execute, statement, params, many, context):
+        started = time.perf_counter()
+
+        try:
+            return execute(statement, params, many, context)
+        finally:
+            sql["queries"] += 1
+            sql["time"] += time.perf_counter() - started
+
+    for number in range(warmup + requests):
+        request = scenario.func(client, fixtures, number)
+        sql.update(queries=0, time=0.0)
+
+        with connection.execute_wrapper(record):
+            started = time.perf_counter()
+            response = request()
+            elapsed = time.perf_counter() - started
+
+        if response.status_code != scenario.status:
+            unexpected.append(response.status_code)
+
+        if number >= warmup:
+            latencies.append(elapsed)
+            queries.append(sql["queries"])
+            sql_times.append(sql["time"])
+            statuses.append(response.status_code)
+
+    return summarize(latencies, queries, sql_times, statuses), unexpected
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=description.splitlines()[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--requests", type=int, default=50, help="Per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests")
+    parser.add_argument("--only", nargs="+", metavar="SCENARIO")
+    parser.add_argument("--listings", type=int, default=10000)
+    parser.add_argument("--bids", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--database", help="SQLite file, generated into if it has no listings"
+    )
+    parser.add_argument("--output", default="view-benchmark.json")
+    parser.add_argument("--budgets", default=BUDGETS)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Save the results as baseline"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Share a latency may grow over its baseline before failing",
+    )
+    args = parser.parse_args()
+
+    database = setup(args.database)
+
+    from django.conf import settings
+
+    from auctions import load_data
+    from auctions.models import Listing
+
+    from . import scenarios
+
+    # Measure the views as deployed, not with DEBUG's query log
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    # The results show the slow views, without logging each slow request
+    settings.AUCTIONS_SLOW_REQUEST_MS = None
+
+    uncovered = scenarios.uncovered_urls()
+
+    if uncovered:
+        sys.exit(f"URLs without a scenario in scenarios.py: {', '.join(uncovered)}")
+
+    if not Listing.objects.exists():
+        started = time.perf_counter()
+        sizes = load_data.Sizes(listings=args.listings, bids=args.bids)
+        load_data.Generator(sizes, args.seed).run()
+        print(
+            f"generated: {sizes.listings} listings, {sizes.bids} bids "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+    print(f"database:  {database}")
+
+    fixtures = scenarios.prepare(args.warmup + args.requests)
+    selected = {
+        name: scenario
+        for name, scenario in scenarios.all_scenarios().items()
+        if not args.only or name in args.only
+    }
+    results, failures = {}, []
+
+    for name, scenario in selected.items():
+        results[name], unexpected = measure(
+            scenario, fixtures, args.requests, args.warmup
+        )
+
+        if unexpected:
+            failures.append(
+                f"{name}: expected status {scenario.status}, "
+                f"got {', '.join(str(code) for code in sorted(set(unexpected)))}"
+            )
+
+    baseline = {}
+
+    if os.path.exists(args.baseline):
+        baseline = load_json(args.baseline)["results"]
+
+    print()
+    print(report(results, baseline))
+
+    output = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "requests": args.requests,
+        "listings": Listing.objects.count(),
+        "results": results,
+    }
+    save_json(args.output, output)
+    print(f"\nsaved:     {args.output}")
+
+    if args.save_baseline:
+        save_json(args.baseline, output)
+        print(f"baseline:  {args.baseline}")
+
+    failures += budget_failures(results, load_json(args.budgets))
+    failures += regressions(results, baseline, args.tolerance)
+
+    if args.database is None:
+        cleanup(database)
+
+    if failures:
+        print("\nFAILED")
+        print("\n".join(f"  {failure}" for failure in failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
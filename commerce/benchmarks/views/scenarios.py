@@ -0,0 +1,369 @@
+"""Requests made by the view benchmark, one scenario or more per URL
+
+A scenario is a function given a test client, the fixtures and the number of
+the request being made.  It does whatever setup the request needs, such as
+signing in, and returns the request as a callable for the runner to time, so
+the setup isn't measured.  Imported only once Django is set up.
+"""
+
+import json
+import secrets
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import partial
+
+from django.contrib.auth import SESSION_KEY
+from django.db.models import Count, F, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from auctions import load_data
+from auctions.models import Category, Listing, User
+from auctions.urls import urlpatterns
+
+# URLs without a scenario, with the reason
+SKIPPED = {
+    "listing_events": "Streams events until the client disconnects",
+}
+
+_registry = {}
+
+
+@dataclass
+class Scenario:
+    name: str
+    url_name: str
+    func: callable
+    # Expected status code of the response
+    status: int
+
+
+def scenario(url_name, name=None, status=200):
+    """Register a scenario for a URL, named after it unless it has a variant"""
+
+    def decorator(func):
+        _registry[name or url_name] = Scenario(name or url_name, url_name, func, status)
+
+        return func
+
+    return decorator
+
+
+def all_scenarios():
+    return dict(_registry)
+
+
+def uncovered_urls():
+    """Names of URLs with neither a scenario nor a reason to skip them"""
+    covered = {scenario.url_name for scenario in _registry.values()} | set(SKIPPED)
+
+    return [
+        pattern.name
+        for pattern in urlpatterns
+        if pattern.name and pattern.name not in covered
+    ]
+
+
+def sign_in(client, user):
+    """Sign the client in as a user, unless it already is"""
+    if client.session.get(SESSION_KEY) != str(user.pk):
+        client.force_login(user)
+
+
+@dataclass
+class Fixtures:
+    """Rows of the generated dataset the scenarios request"""
+
+    # Open listing with the most bids, with its seller and category
+    hot_listing: Listing
+    # Open listing without bids
+    cold_listing: Listing
+    category: Category
+    # Two users taking turns to bid on the hot listing
+    bidders: list
+    # User watching the most listings
+    watcher: User
+    staff: User
+    # Open listings without bids, one cancelled per request
+    cancellable: list
+    # Open listings with bids above their price, one sold per request
+    acceptable: list
+    query: str = "vintage"
+
+
+def prepare(requests):
+    """Pick the fixtures, with enough listings to close one per request
+
+    Args:
+        requests (int): Requests each scenario will make, warm-up included
+    """
+    # Still open when the run ends
+    open_listings = Listing.objects.filter(active=True).filter(
+        Q(ends_at__isnull=True) | Q(ends_at__gt=timezone.now() + timedelta(days=1))
+    )
+    hot_listing = open_listings.order_by("-bid_count").first()
+    cold_listings = open_listings.filter(bid_count=0).order_by("pk")
+    staff, _ = User.objects.get_or_create(
+        username="bench-staff", defaults={"is_staff": True}
+    )
+
+    return Fixtures(
+        hot_listing=hot_listing,
+        cold_listing=cold_listings.first(),
+        category=hot_listing.category,
+        bidders=list(
+            User.objects.exclude(pk__in=[hot_listing.user_id, staff.pk]).order_by("pk")[
+                :2
+            ]
+        ),
+        watcher=User.objects.annotate(watches=Count("watching"))
+        .order_by("-watches")
+        .first(),
+        staff=staff,
+        cancellable=list(cold_listings[1 : requests + 1]),
+        acceptable=list(
+            open_listings.filter(current_price__gt=F("price"))
+            .exclude(pk=hot_listing.pk)
+            .order_by("pk")[:requests]
+        ),
+    )
+
+
+@scenario("index")
+def index(client, fixtures, number):
+    return partial(client.get, reverse("index"))
+
+
+@scenario("index", name="index_signed_in")
+def index_signed_in(client, fixtures, number):
+    sign_in(client, fixtures.bidders[0])
+
+    return partial(client.get, reverse("index"))
+
+
+@scenario("listing_cards")
+def listing_cards(client, fixtures, number):
+    return partial(client.get, reverse("listing_cards"))
+
+
+@scenario("login", status=302)
+def login(client, fixtures, number):
+    # Includes hashing the password, which is most of the cost
+    client.logout()
+
+    return partial(
+        client.post,
+        reverse("login"),
+        {"username": fixtures.bidders[0].username, "password": load_data.PASSWORD},
+    )
+
+
+@scenario("logout", status=302)
+def logout(client, fixtures, number):
+    client.force_login(fixtures.bidders[0])
+
+    return partial(client.get, reverse("logout"))
+
+
+@scenario("register", status=302)
+def register(client, fixtures, number):
+    client.logout()
+    username = f"bench-{number}-{secrets.token_hex(4)}"
+
+    return partial(
+        client.post,
+        reverse("register"),
+        {
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "password",
+            "confirmation": "password",
+        },
+    )
+
+
+@scenario("create_listing", status=302)
+def create_listing(client, fixtures, number):
+    sign_in(client, fixtures.bidders[0])
+
+    return partial(
+        client.post,
+        reverse("create_listing"),
+        {
+            "title": f"Benchmark item {number}",
+            "description": "Listed by the view benchmark",
+            "category": fixtures.category.pk,
+            "price": 10,
+            "duration": 7,
+        },
+    )
+
+
+@scenario("view_listing")
+def view_listing(client, fixtures, number):
+    sign_in(client, fixtures.bidders[0])
+
+    return partial(client.get, reverse("view_listing", args=[fixtures.hot_listing.pk]))
+
+
+@scenario("view_listing", name="view_listing_anonymous")
+def view_listing_anonymous(client, fixtures, number):
+    return partial(client.get, reverse("view_listing", args=[fixtures.cold_listing.pk]))
+
+
+@scenario("listing_comments")
+def listing_comments(client, fixtures, number):
+    return partial(
+        client.get, reverse("listing_comments", args=[fixtures.hot_listing.pk])
+    )
+
+
+@scenario("create_bid", status=302)
+def create_bid(client, fixtures, number):
+    # Bidders take turns outbidding each other's maximum
+    sign_in(client, fixtures.bidders[number % 2])
+    listing = fixtures.hot_listing
+    price = Listing.objects.values_list("proxy_max", "current_price").get(pk=listing.pk)
+
+    return partial(
+        client.post,
+        reverse("create_bid", args=[listing.pk]),
+        {"bid_amount": max(value or 0 for value in price) + 2},
+    )
+
+
+@scenario("create_comment", status=302)
+def create_comment(client, fixtures, number):
+    sign_in(client, fixtures.bidders[0])
+
+    return partial(
+        client.post,
+        reverse("create_comment", args=[fixtures.hot_listing.pk]),
+        {"comment": f"Benchmark comment {number}"},
+    )
+
+
+@scenario("cancel_listing", status=302)
+def cancel_listing(client, fixtures, number):
+    listing = fixtures.cancellable[number % len(fixtures.cancellable)]
+    sign_in(client, listing.user)
+
+    return partial(client.get, reverse("cancel_listing", args=[listing.pk]))
+
+
+@scenario("accept_bid", status=302)
+def accept_bid(client, fixtures, number):
+    listing = fixtures.acceptable[number % len(fixtures.acceptable)]
+    sign_in(client, listing.user)
+
+    return partial(client.get, reverse("accept_bid", args=[listing.pk]))
+
+
+@scenario("categories")
+def categories(client, fixtures, number):
+    return partial(client.get, reverse("categories"))
+
+
+@scenario("view_category")
+def view_category(client, fixtures, number):
+    return partial(client.get, reverse("view_category", args=[fixtures.category.pk]))
+
+
+@scenario("category_cards")
+def category_cards(client, fixtures, number):
+    return partial(client.get, reverse("category_cards", args=[fixtures.category.pk]))
+
+
+@scenario("search")
+def search(client, fixtures, number):
+    return partial(client.get, reverse("search"), {"q": fixtures.query})
+
+
+@scenario("search_cards")
+def search_cards(client, fixtures, number):
+    return partial(client.get, reverse("search_cards"), {"q": fixtures.query})
+
+
+@scenario("watch", status=302)
+def watch(client, fixtures, number):
+    # Toggles, so requests alternate between watching and unwatching
+    sign_in(client, fixtures.bidders[0])
+
+    return partial(client.get, reverse("watch", args=[fixtures.hot_listing.pk]))
+
+
+@scenario("bulk_watch")
+def bulk_watch(client, fixtures, number):
+    sign_in(client, fixtures.bidders[1])
+    listing_ids = [listing.pk for listing in fixtures.acceptable[:20]]
+    body = {"watch": listing_ids} if number % 2 else {"unwatch": listing_ids}
+
+    return partial(
+        client.post,
+        reverse("bulk_watch"),
+        json.dumps(body),
+        content_type="application/json",
+    )
+
+
+@scenario("view_watchlist")
+def view_watchlist(client, fixtures, number):
+    sign_in(client, fixtures.watcher)
+
+    return partial(client.get, reverse("view_watchlist"))
+
+
+@scenario("view_user_listings")
+def view_user_listings(client, fixtures, number):
+    sign_in(client, fixtures.hot_listing.user)
+
+    return partial(client.get, reverse("view_user_listings"))
+
+
+@scenario("cache_stats")
+def cache_stats(client, fixtures, number):
+    sign_in(client, fixtures.staff)
+
+    return partial(client.get, reverse("cache_stats"))
+
+
+@scenario("metrics")
+def metrics(client, fixtures, number):
+    sign_in(client, fixtures.staff)
+
+    return partial(client.get, reverse("metrics"))
+
+
+@scenario("export_bids")
+def export_bids(client, fixtures, number):
+    # A day of bids in one category, read through to the end of the stream
+    sign_in(client, fixtures.staff)
+    since = (timezone.now() - timedelta(days=1)).date().isoformat()
+    request = partial(
+        client.get,
+        reverse("export_bids"),
+        {"category": fixtures.category.pk, "since": since},
+    )
+
+    def export():
+        response = request()
+        b"".join(response.streaming_content)
+
+        return response
+
+    return export
+
+
+@scenario("api_listings")
+def api_listings(client, fixtures, number):
+    return partial(client.get, reverse("api_listings"))
+
+
+@scenario("api_listing")
+def api_listing(client, fixtures, number):
+    return partial(client.get, reverse("api_listing", args=[fixtures.hot_listing.pk]))
+
+
+@scenario("api_categories")
+def api_categories(client, fixtures, number):
+    return partial(client.get, reverse("api_categories"))
@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the middleware too
+    "auctions.instrumentation.request_timing_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -58,7 +60,8 @@ ROOT_URLCONF = "commerce.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Django templates, timed for the request instrumentation
+        "BACKEND": "auctions.instrumentation.TimedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -67,6 +70,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "auctions.context_processors.categories",
             ],
         },
     },
@@ -82,11 +86,33 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        "OPTIONS": {
+            # WAL lets readers continue while a bid is being written, and
+            # IMMEDIATE transactions take the write lock up front so concurrent
+            # writers queue on the busy timeout instead of failing to upgrade
+            "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;",
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
     }
 }
 
 AUTH_USER_MODEL = "auctions.User"
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# The local memory cache is private to each process.  Deployments running more
+# than one worker should point this at a shared backend (Redis or Memcached) so
+# that cache invalidation reaches every worker.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "auctions",
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -137,6 +163,48 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media/")
 
 LOGIN_URL = "auctions:login"
 
+### Live listing updates
+
+# Backend sharing bid/comment events with streaming responses.  The in-process
+# backend only reaches connections served by the publishing process; use
+# "auctions.events.CacheBackend" with a shared cache when running several workers.
+# Listing pages only open the event stream when AUCTIONS_ASYNC_VIEWS is enabled:
+# a WSGI worker can't send any of a stream until it ends, so under WSGI the
+# stream answers 204 No Content, which stops browsers reconnecting.
+AUCTIONS_EVENTS_BACKEND = "auctions.events.InProcessBackend"
+
+### Async views
+
+# Route the read-only pages to auctions/async_views.py.  Only worthwhile when
+# served through commerce/asgi.py; under WSGI each async view pays for an event
+# loop per request.  Also turns on the live bid and comment updates of listing
+# pages, which need ASGI to stream.
+AUCTIONS_ASYNC_VIEWS = os.environ.get("AUCTIONS_ASYNC_VIEWS", "") == "1"
+
+### Request instrumentation
+
+# Report the SQL, template render and view time of each request in a
+# Server-Timing header
+AUCTIONS_SERVER_TIMING = True
+
+# Log requests taking at least this many milliseconds, with their costliest SQL
+# statements, to the "auctions.instrumentation" logger (None to disable)
+AUCTIONS_SLOW_REQUEST_MS = 500
+
+### Metrics
+
+# Where metric values are kept.  The in-process backend only counts the process
+# serving the metrics page; use "auctions.metrics.FileBackend" when running
+# several workers, which share their values through files in AUCTIONS_METRICS_DIR
+AUCTIONS_METRICS_BACKEND = "auctions.metrics.InProcessBackend"
+AUCTIONS_METRICS_DIR = os.path.join(BASE_DIR, "metrics")
+
+### Email settings
+
+# Print outgoing email (e.g. bid notifications) to the console during development
+EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+DEFAULT_FROM_EMAIL = "Auctionz! <noreply@auctionz.example>"
+
 ### Map Django message tags to Bootstrap alert levels
 
 MESSAGE_TAGS = {